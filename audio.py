@@ -0,0 +1,88 @@
+from functools import lru_cache
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+TONE_HZ = 440
+VOLUME = 0.25
+# length of the looped buffer; a whole number of periods so the loop is seamless
+TONE_PERIODS = 44
+
+# mixer sample format (as reported by pygame.mixer.get_init) -> numpy dtype
+SAMPLE_TYPES = {
+    8: np.uint8,
+    -8: np.int8,
+    16: np.uint16,
+    -16: np.int16,
+    32: np.float32,
+}
+
+
+@lru_cache(maxsize=None)
+def square_wave(sample_rate: int, channels: int, sample_format: int) -> np.ndarray:
+    """One loopable buffer of the beep tone in the mixer's sample format."""
+    period = max(2, round(sample_rate / TONE_HZ))
+    one_period = np.full(period, -VOLUME)
+    one_period[: period // 2] = VOLUME
+
+    sample_type = SAMPLE_TYPES[sample_format]
+    if sample_format != 32:
+        bits = abs(sample_format)
+        one_period = one_period * ((1 << (bits - 1)) - 1)
+        if sample_format > 0:
+            # unsigned formats are centred on half the range
+            one_period += 1 << (bits - 1)
+
+    wave = np.tile(one_period.astype(sample_type), TONE_PERIODS)
+    if channels > 1:
+        wave = np.repeat(wave[:, None], channels, axis=1)
+    return np.ascontiguousarray(wave)
+
+
+class Beeper:
+    """The CHIP-8 buzzer: a pre-generated square wave looped while the sound timer runs.
+
+    pygame's mixer is only initialised the first time the buzzer sounds, so
+    silent ROMs and headless runs never pay for audio, and a machine without
+    an audio device just stays quiet.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.sound = None
+        self.playing = False
+
+    def set_playing(self, playing: bool):
+        """Start or stop the tone; only a change from the current state costs anything."""
+        if playing == self.playing:
+            return
+        self.playing = playing
+
+        if playing:
+            if self.sound is None and not self.load():
+                return
+            self.sound.play(loops=-1)
+        elif self.sound is not None:
+            self.sound.stop()
+
+    def load(self) -> bool:
+        if not self.enabled:
+            return False
+
+        import pygame
+
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1, buffer=512)
+            sample_rate, sample_format, channels = pygame.mixer.get_init()
+            self.sound = pygame.sndarray.make_sound(
+                square_wave(sample_rate, channels, sample_format)
+            )
+        except (pygame.error, KeyError):
+            # no audio device or an unusual sample format; stay silent from now on
+            self.enabled = False
+            return False
+        return True
+
+    def stop(self):
+        self.set_playing(False)
@@ -0,0 +1,618 @@
+"""Run many independent CHIP-8 machines at once, one vectorised step at a time.
+
+Every machine's memory, registers, stack and screen live in NumPy arrays
+with the machine as the first axis. A step fetches all the opcodes with one
+gather, sorts the machines by instruction group and runs each group as a
+handful of masked array operations, so the interpreter's per-instruction
+overhead is paid once per step for the whole batch. Meant for fuzzing and
+parameter sweeps:
+
+    python batch_emulator.py game.ch8 --instances 4096 --frames 600 --random-keys
+
+The semantics are ``Emulator``'s, quirks included (the carry lives in
+``carry_flag``, 8XYE, FX55/FX65 set I to x + 1, DXY0 only in high
+resolution), so ``to_emulator`` can hand any machine over to the regular
+core. Differences: only the 4 KiB memory is supported (no XO-CHIP
+F000 NNNN), the stack holds ``STACK_DEPTH`` entries, and unknown opcodes
+are silently ignored. A machine that would raise in ``Emulator`` stops
+instead; ``errors`` says why and the others keep running.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from constants import (
+    BIG_FONT_SET,
+    BIG_FONT_START_ADDRESS,
+    FLAG_REGISTER_COUNT,
+    FONT_SET,
+    FONT_START_ADDRESS,
+    HIRES_SCREEN_HEIGHT,
+    HIRES_SCREEN_WIDTH,
+    MEMORY_SIZE,
+    PROGRAM_START_ADDRESS,
+    REGISTER_COUNT,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+)
+
+# return addresses each machine can hold; calling deeper stops the machine
+STACK_DEPTH = 64
+
+# screens are packed 8 pixels to a byte, the leftmost in the high bit
+ROW_BYTES = HIRES_SCREEN_WIDTH // 8
+SCREEN_BYTES = HIRES_SCREEN_HEIGHT * ROW_BYTES
+
+SPRITE_ROWS = np.arange(16)
+REGISTER_INDEXES = np.arange(REGISTER_COUNT)
+
+
+class BatchEmulator:
+    """``count`` CHIP-8 machines stepped in lockstep.
+
+    State arrays (first axis is the machine) may be read and written
+    directly between steps: ``memory``, ``variable_register``,
+    ``index_register``, ``program_counter``, ``stack``/``stack_pointer``,
+    ``delay_timer``, ``sound_timer``, ``carry_flag``, ``flag_registers``,
+    ``key_states`` and ``screen``. ``screen`` holds 64 rows of 16 bytes, 8
+    pixels to a byte; a machine in low resolution only uses the top-left 32
+    rows of 8 bytes and the rest stays clear.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        set_vx_to_vy=False,
+        seeds: Optional[Sequence] = None,
+    ) -> None:
+        if seeds is not None and len(seeds) != count:
+            raise ValueError("Need one seed per machine.")
+
+        self.count = count
+        self.set_vx_to_vy = set_vx_to_vy
+        self.memory = np.zeros((count, MEMORY_SIZE), dtype=np.uint8)
+        self.variable_register = np.zeros((count, REGISTER_COUNT), dtype=np.uint8)
+        self.flag_registers = np.zeros((count, FLAG_REGISTER_COUNT), dtype=np.uint8)
+        self.index_register = np.zeros(count, dtype=np.int32)
+        self.program_counter = np.full(count, PROGRAM_START_ADDRESS, dtype=np.int32)
+        self.stack = np.zeros((count, STACK_DEPTH), dtype=np.int32)
+        self.stack_pointer = np.zeros(count, dtype=np.int32)
+        self.delay_timer = np.zeros(count, dtype=np.uint8)
+        self.sound_timer = np.zeros(count, dtype=np.uint8)
+        self.carry_flag = np.zeros(count, dtype=np.uint8)
+        self.key_states = np.zeros((count, 16), dtype=np.uint8)  # 1 is pressed state
+        self.screen = np.zeros((count, HIRES_SCREEN_HEIGHT, ROW_BYTES), dtype=np.uint8)
+        self.high_resolution = np.zeros(count, dtype=bool)
+        self.screen_width = np.full(count, SCREEN_WIDTH, dtype=np.int32)
+        self.screen_height = np.full(count, SCREEN_HEIGHT, dtype=np.int32)
+        self.draw_flag = np.zeros(count, dtype=bool)
+        # machines still running, and why the others stopped
+        self.running = np.ones(count, dtype=bool)
+        self.errors: List[Optional[str]] = [None] * count
+        self.machine_indexes = np.arange(count)
+        # CXNN draws from each machine's own generator, seeded like Emulator(seed=...)
+        self.rngs = [random.Random(seed) for seed in ([None] * count if seeds is None else seeds)]
+        self.load_fonts()
+
+        self.instructions_per_frame = 30
+        self.cycles = 0
+        self.frame_count = 0
+
+        # indexed by the high nibble of the opcode
+        self.group_handlers = [
+            self.op_0nnn,
+            self.op_1nnn,
+            self.op_2nnn,
+            self.op_3xnn,
+            self.op_4xnn,
+            self.op_5xy0,
+            self.op_6xnn,
+            self.op_7xnn,
+            self.op_8xyn,
+            self.op_9xy0,
+            self.op_annn,
+            self.op_bnnn,
+            self.op_cxnn,
+            self.op_dxyn,
+            self.op_exnn,
+            self.op_fxnn,
+        ]
+
+    def load_fonts(self):
+        self.memory[:, FONT_START_ADDRESS : FONT_START_ADDRESS + len(FONT_SET)] = FONT_SET
+        self.memory[:, BIG_FONT_START_ADDRESS : BIG_FONT_START_ADDRESS + len(BIG_FONT_SET)] = BIG_FONT_SET
+
+    def load_rom(self, program_data: bytes, machines=None):
+        """Load a ROM image into every machine, or only the ``machines`` given."""
+        if len(program_data) + PROGRAM_START_ADDRESS > MEMORY_SIZE:
+            raise ValueError("Program is too large to fit in memory.")
+        end = PROGRAM_START_ADDRESS + len(program_data)
+        selected = slice(None) if machines is None else machines
+        self.memory[selected, PROGRAM_START_ADDRESS:end] = np.frombuffer(program_data, dtype=np.uint8)
+
+    def load_program(self, filename: str, machines=None):
+        with open(filename, "rb") as file:
+            self.load_rom(file.read(), machines)
+
+    def set_key(self, machine: int, key: int, pressed: bool):
+        self.key_states[machine, key] = 1 if pressed else 0
+
+    def step(self, count: int = 1):
+        """Execute ``count`` instructions on every running machine, without the timers."""
+        self.cycles += count
+        for _ in range(count):
+            self.cycle()
+
+    def run_frames(self, count: int = 1):
+        """Run ``count`` 60 Hz frames: one instruction batch plus a timer tick each."""
+        for _ in range(count):
+            self.step(self.instructions_per_frame)
+            self.tick_timers()
+
+    def tick_timers(self):
+        self.frame_count += 1
+        running = self.running
+        for timer in (self.delay_timer, self.sound_timer):
+            timer[running & (timer > 0)] -= 1
+
+    def stop(self, machines: np.ndarray, error: str):
+        """Stop ``machines`` where ``Emulator`` would have raised ``error``."""
+        self.running[machines] = False
+        for machine in machines.tolist():
+            self.errors[machine] = error
+
+    def stop_where(self, machines: np.ndarray, failed: np.ndarray, error: str) -> np.ndarray:
+        """Stop the ``failed`` subset of ``machines``; return a mask of the rest."""
+        if failed.any():
+            self.stop(machines[failed], error)
+        return ~failed
+
+    def cycle(self):
+        """Fetch every running machine's instruction and execute them group by group."""
+        all_running = self.running.all()
+        if all_running:
+            machines = self.machine_indexes
+            program_counter = self.program_counter
+        else:
+            machines = np.flatnonzero(self.running)
+            program_counter = self.program_counter[machines]
+        outside = program_counter >= MEMORY_SIZE - 1
+        if outside.any():
+            self.stop(machines[outside], "IndexError: program counter outside memory")
+            all_running = False
+            machines = machines[~outside]
+            program_counter = program_counter[~outside]
+        if not len(machines):
+            return
+
+        memory = self.memory.reshape(-1)
+        addresses = machines * MEMORY_SIZE + program_counter
+        opcodes = (memory[addresses].astype(np.int32) << 8) | memory[addresses + 1]
+        if all_running:
+            self.program_counter += 2
+        else:
+            self.program_counter[machines] = program_counter + 2
+
+        groups = (opcodes >> 12).astype(np.uint8)
+        first = groups[0]
+        if (groups == first).all():
+            # every machine is on the same kind of instruction, the common
+            # case when a sweep runs one ROM
+            self.group_handlers[first](machines, opcodes)
+            return
+
+        order = np.argsort(groups, kind="stable")
+        start = 0
+        for group, end in enumerate(np.cumsum(np.bincount(groups, minlength=16)).tolist()):
+            if end > start:
+                chosen = order[start:end]
+                self.group_handlers[group](machines[chosen], opcodes[chosen])
+            start = end
+
+    def skip_where(self, machines: np.ndarray, condition: np.ndarray):
+        self.program_counter[machines[condition]] += 2
+
+    def set_resolution(self, machines: np.ndarray, high: bool):
+        self.high_resolution[machines] = high
+        self.screen_width[machines] = HIRES_SCREEN_WIDTH if high else SCREEN_WIDTH
+        self.screen_height[machines] = HIRES_SCREEN_HEIGHT if high else SCREEN_HEIGHT
+        self.screen[machines] = 0
+        self.draw_flag[machines] = True
+
+    # 00E0, 00EE, 00FB-00FF, 00CN, 00DN
+    def op_0nnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        for opcode in np.unique(opcodes).tolist():
+            selected = machines[opcodes == opcode]
+            if opcode == 0x00E0:
+                # like Emulator, clearing does not set the draw flag
+                self.screen[selected] = 0
+            elif opcode == 0x00EE:
+                selected = selected[self.stack_pointer[selected] > 0]
+                self.stack_pointer[selected] -= 1
+                self.program_counter[selected] = self.stack[selected, self.stack_pointer[selected]]
+            elif opcode == 0x00FD:
+                self.program_counter[selected] -= 2
+            elif opcode == 0x00FE:
+                self.set_resolution(selected, False)
+            elif opcode == 0x00FF:
+                self.set_resolution(selected, True)
+            elif opcode in (0x00FB, 0x00FC) or opcode & 0xFFE0 == 0x00C0:
+                self.scroll(selected, opcode)
+
+    def scroll(self, machines: np.ndarray, opcode: int):
+        n = opcode & 0xF
+        for high in (False, True):
+            selected = machines[self.high_resolution[machines] == high]
+            if not len(selected):
+                continue
+            height = HIRES_SCREEN_HEIGHT if high else SCREEN_HEIGHT
+            width = HIRES_SCREEN_WIDTH if high else SCREEN_WIDTH
+            screen = np.unpackbits(self.screen[selected, :height, : width // 8], axis=2)
+            scrolled = np.zeros_like(screen)
+            if opcode == 0x00FB:
+                scrolled[:, :, 4:] = screen[:, :, :-4]
+            elif opcode == 0x00FC:
+                scrolled[:, :, :-4] = screen[:, :, 4:]
+            elif opcode & 0xFFF0 == 0x00C0:
+                scrolled[:, n:] = screen[:, : height - n]
+            else:
+                scrolled[:, : height - n] = screen[:, n:]
+            self.screen[selected, :height, : width // 8] = np.packbits(scrolled, axis=2)
+        self.draw_flag[machines] = True
+
+    def op_1nnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        self.program_counter[machines] = opcodes & 0x0FFF
+
+    def op_2nnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        stack_pointer = self.stack_pointer[machines]
+        kept = self.stop_where(machines, stack_pointer >= STACK_DEPTH, "IndexError: stack overflow")
+        machines, stack_pointer, opcodes = machines[kept], stack_pointer[kept], opcodes[kept]
+        self.stack[machines, stack_pointer] = self.program_counter[machines]
+        self.stack_pointer[machines] = stack_pointer + 1
+        self.program_counter[machines] = opcodes & 0x0FFF
+
+    def op_3xnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        vx = self.variable_register[machines, (opcodes >> 8) & 0xF]
+        self.skip_where(machines, vx == (opcodes & 0xFF))
+
+    def op_4xnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        vx = self.variable_register[machines, (opcodes >> 8) & 0xF]
+        self.skip_where(machines, vx != (opcodes & 0xFF))
+
+    def op_5xy0(self, machines: np.ndarray, opcodes: np.ndarray):
+        registers = self.variable_register
+        vx = registers[machines, (opcodes >> 8) & 0xF]
+        vy = registers[machines, (opcodes >> 4) & 0xF]
+        self.skip_where(machines, vx == vy)
+
+    def op_9xy0(self, machines: np.ndarray, opcodes: np.ndarray):
+        registers = self.variable_register
+        vx = registers[machines, (opcodes >> 8) & 0xF]
+        vy = registers[machines, (opcodes >> 4) & 0xF]
+        self.skip_where(machines, vx != vy)
+
+    def op_6xnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        self.variable_register[machines, (opcodes >> 8) & 0xF] = opcodes & 0xFF
+
+    def op_7xnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        x = (opcodes >> 8) & 0xF
+        self.variable_register[machines, x] = (self.variable_register[machines, x] + opcodes) & 0xFF
+
+    # 8XY0-8XY7, 8XYE; the carry goes to carry_flag as in Emulator
+    def op_8xyn(self, machines: np.ndarray, opcodes: np.ndarray):
+        registers = self.variable_register
+        all_x = (opcodes >> 8) & 0xF
+        all_y = (opcodes >> 4) & 0xF
+        all_n = opcodes & 0xF
+        for n in np.unique(all_n).tolist():
+            chosen = all_n == n
+            selected, x = machines[chosen], all_x[chosen]
+            vx = registers[selected, x].astype(np.int32)
+            vy = registers[selected, all_y[chosen]].astype(np.int32)
+            if n == 0x0:
+                result = vy
+            elif n == 0x1:
+                result = vx | vy
+            elif n == 0x2:
+                result = vx & vy
+            elif n == 0x3:
+                result = vx ^ vy
+            elif n == 0x4:
+                result = vx + vy
+                self.carry_flag[selected] = result > 0xFF
+            elif n == 0x5:
+                result = vx - vy
+                self.carry_flag[selected] = vx >= vy
+            elif n == 0x7:
+                result = vy - vx
+                self.carry_flag[selected] = vy >= vx
+            elif n == 0x6:
+                value = vy if self.set_vx_to_vy else vx
+                self.carry_flag[selected] = value & 0x01
+                result = value >> 1
+            elif n == 0xE:
+                # Emulator's precedence: vx & (0x80 >> 7)
+                self.carry_flag[selected] = vx & 0x01
+                result = vy << 1
+            else:
+                continue
+            registers[selected, x] = result & 0xFF
+
+    def op_annn(self, machines: np.ndarray, opcodes: np.ndarray):
+        self.index_register[machines] = opcodes & 0x0FFF
+
+    def op_bnnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        self.program_counter[machines] = (opcodes & 0x0FFF) + self.variable_register[machines, 0]
+
+    def op_cxnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        rngs = self.rngs
+        values = [rngs[machine].getrandbits(8) for machine in machines.tolist()]
+        self.variable_register[machines, (opcodes >> 8) & 0xF] = np.array(values, dtype=np.int32) & opcodes
+
+    # DXYN, and DXY0 16x16 in high resolution. Every sprite is drawn as up
+    # to 16 rows of 16 bits, shifted into the packed screen bytes it covers,
+    # so one gather, XOR and scatter draws the sprites of all the machines
+    def op_dxyn(self, machines: np.ndarray, opcodes: np.ndarray):
+        n = opcodes & 0xF
+        high = self.high_resolution[machines]
+        big = (n == 0) & high
+        index = self.index_register[machines]
+        # last byte the sprite reads; a sprite with no rows reads nothing
+        last = np.where(big, index + 31, index + n - 1)
+        kept = self.stop_where(machines, last >= MEMORY_SIZE, "IndexError: sprite outside memory")
+        if not kept.all():
+            machines, opcodes, n, high, big, index = (
+                machines[kept], opcodes[kept], n[kept], high[kept], big[kept], index[kept]
+            )
+
+        self.draw_flag[machines] = True
+        any_big = big.any()
+        row_count = 16 if any_big else int(n.max(initial=0))
+        if not row_count:
+            self.carry_flag[machines] = 0
+            return
+
+        # rows past a sprite's height read address 0 and are then zeroed;
+        # usually every sprite has the same height and nothing needs masking
+        sprite_rows = SPRITE_ROWS[:row_count]
+        rows = None
+        if any_big or not (n == row_count).all():
+            rows = np.where(big, 16, n)[:, None] > sprite_rows
+        if any_big:
+            addresses = index[:, None] + sprite_rows * np.where(big, 2, 1)[:, None]
+        else:
+            addresses = index[:, None] + sprite_rows
+        if rows is not None:
+            addresses *= rows
+        addresses += (machines * MEMORY_SIZE)[:, None]
+        memory = self.memory.reshape(-1)
+        words = memory[addresses].astype(np.int32) << 8
+        if any_big:
+            words[big] |= memory[addresses[big] + 1]
+        if rows is not None:
+            words *= rows
+
+        # screen sizes are powers of two, so wrapping around is a mask; they
+        # are scalars when every drawing machine is in the same resolution
+        if high.all() or not high.any():
+            width = HIRES_SCREEN_WIDTH if high[0] else SCREEN_WIDTH
+            height_mask = (HIRES_SCREEN_HEIGHT if high[0] else SCREEN_HEIGHT) - 1
+        else:
+            width = self.screen_width[machines]
+            height_mask = (self.screen_height[machines] - 1)[:, None]
+
+        # a 16-bit row starting mid-byte covers three bytes, an 8-bit one two
+        span = 3 if any_big else 2
+        registers = self.variable_register
+        shift = registers[machines, (opcodes >> 8) & 0xF] & (width - 1)
+        words <<= 8 * (span - 2)
+        words >>= (shift & 7)[:, None]
+        # the low ``span`` bytes of each big-endian word are the sprite bytes
+        sprites = words.astype(">u4").view(np.uint8).reshape(len(machines), row_count, 4)
+        row_starts = registers[machines, (opcodes >> 4) & 0xF].astype(np.intp)[:, None] + sprite_rows
+        row_starts &= height_mask
+        row_starts *= ROW_BYTES
+        row_starts += (machines * SCREEN_BYTES)[:, None]
+
+        screen = self.screen.reshape(-1)
+        column_mask = (width >> 3) - 1
+        collided = np.zeros(len(machines), dtype=bool)
+        for byte in range(span):
+            targets = row_starts + ((shift >> 3) + byte & column_mask)[:, None]
+            sprite = sprites[:, :, 4 - span + byte]
+            pixels = screen[targets]
+            collided |= (pixels & sprite).any(axis=1)
+            screen[targets] = pixels ^ sprite
+        self.carry_flag[machines] = collided
+
+    # EX9E, EXA1
+    def op_exnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        nn = opcodes & 0xFF
+        keyed = (nn == 0x9E) | (nn == 0xA1)
+        machines, opcodes, nn = machines[keyed], opcodes[keyed], nn[keyed]
+        keys = self.variable_register[machines, (opcodes >> 8) & 0xF]
+        kept = self.stop_where(machines, keys > 0xF, "IndexError: key outside the keypad")
+        machines, keys, nn = machines[kept], keys[kept], nn[kept]
+        pressed = self.key_states[machines, keys] == 1
+        self.skip_where(machines, pressed == (nn == 0x9E))
+
+    def op_fxnn(self, machines: np.ndarray, opcodes: np.ndarray):
+        all_nn = opcodes & 0xFF
+        all_x = (opcodes >> 8) & 0xF
+        registers = self.variable_register
+        for nn in np.unique(all_nn).tolist():
+            chosen = all_nn == nn
+            selected, x = machines[chosen], all_x[chosen]
+            if nn == 0x07:
+                registers[selected, x] = self.delay_timer[selected]
+            elif nn == 0x0A:
+                self.wait_for_key(selected, x)
+            elif nn == 0x15:
+                self.delay_timer[selected] = registers[selected, x]
+            elif nn == 0x18:
+                self.sound_timer[selected] = registers[selected, x]
+            elif nn == 0x1E:
+                index = self.index_register[selected] + registers[selected, x]
+                self.index_register[selected] = index & (MEMORY_SIZE - 1)
+            elif nn == 0x29:
+                self.index_register[selected] = FONT_START_ADDRESS + registers[selected, x].astype(np.int32) * 5
+            elif nn == 0x30:
+                self.index_register[selected] = BIG_FONT_START_ADDRESS + (registers[selected, x].astype(np.int32) & 0xF) * 10
+            elif nn == 0x33:
+                self.store_bcd(selected, x)
+            elif nn in (0x55, 0x65):
+                self.transfer_registers(selected, x, nn == 0x55)
+            elif nn in (0x75, 0x85):
+                used = REGISTER_INDEXES <= x[:, None]
+                owners = np.broadcast_to(selected[:, None], used.shape)[used]
+                columns = np.broadcast_to(REGISTER_INDEXES, used.shape)[used]
+                if nn == 0x75:
+                    self.flag_registers[owners, columns] = registers[owners, columns]
+                else:
+                    registers[owners, columns] = self.flag_registers[owners, columns]
+
+    # FX0A - wait for a key; V[x] gets the lowest key held
+    def wait_for_key(self, machines: np.ndarray, x: np.ndarray):
+        keys = self.key_states[machines] == 1
+        held = keys.any(axis=1)
+        self.variable_register[machines[held], x[held]] = keys[held].argmax(axis=1)
+        self.program_counter[machines[~held]] -= 2
+
+    # FX33
+    def store_bcd(self, machines: np.ndarray, x: np.ndarray):
+        index = self.index_register[machines]
+        kept = self.stop_where(machines, index + 3 > MEMORY_SIZE, "IndexError: write outside memory")
+        machines, x, index = machines[kept], x[kept], index[kept]
+        vx = self.variable_register[machines, x]
+        self.memory[machines, index] = vx // 100 % 10
+        self.memory[machines, index + 1] = vx // 10 % 10
+        self.memory[machines, index + 2] = vx % 10
+
+    # FX55 / FX65 - store or load v0 to vx at I, then I = x + 1
+    def transfer_registers(self, machines: np.ndarray, x: np.ndarray, store: bool):
+        index = self.index_register[machines]
+        kept = self.stop_where(
+            machines, index + x + 1 > MEMORY_SIZE, "IndexError: transfer outside memory"
+        )
+        machines, x, index = machines[kept], x[kept], index[kept]
+        used = REGISTER_INDEXES <= x[:, None]
+        owners = np.broadcast_to(machines[:, None], used.shape)[used]
+        columns = np.broadcast_to(REGISTER_INDEXES, used.shape)[used]
+        addresses = (index[:, None] + REGISTER_INDEXES)[used]
+        if store:
+            self.memory[owners, addresses] = self.variable_register[owners, columns]
+        else:
+            self.variable_register[owners, columns] = self.memory[owners, addresses]
+        self.index_register[machines] = x + 1
+
+    def screen_array(self, machine: int) -> np.ndarray:
+        """One machine's screen as a (screen_height, screen_width) uint8 0/1 array."""
+        packed = self.screen[machine, : self.screen_height[machine], : self.screen_width[machine] // 8]
+        return np.unpackbits(packed, axis=1)
+
+    def to_emulator(self, machine: int):
+        """A regular ``Emulator`` holding a copy of one machine's state."""
+        from emulator import Emulator
+
+        emulator = Emulator(set_vx_to_vy=self.set_vx_to_vy)
+        emulator.write_memory(0, self.memory[machine].tobytes())
+        emulator.variable_register[:] = self.variable_register[machine].tolist()
+        emulator.flag_registers[:] = self.flag_registers[machine].tolist()
+        emulator.index_register = int(self.index_register[machine])
+        emulator.program_counter = int(self.program_counter[machine])
+        emulator.stack = self.stack[machine, : self.stack_pointer[machine]].tolist()
+        emulator.delay_timer = int(self.delay_timer[machine])
+        emulator.sound_timer = int(self.sound_timer[machine])
+        emulator.carry_flag = int(self.carry_flag[machine])
+        emulator.key_states[:] = self.key_states[machine].tobytes()
+        emulator.set_resolution(bool(self.high_resolution[machine]))
+        packed = self.screen[machine, : emulator.screen_height, : emulator.screen_width // 8]
+        emulator.screen_rows = [int.from_bytes(row.tobytes(), "big") for row in packed]
+        emulator.draw_flag = bool(self.draw_flag[machine])
+        emulator.rng.setstate(self.rngs[machine].getstate())
+        emulator.cycles = self.cycles
+        emulator.frame_count = self.frame_count
+        return emulator
+
+    def load_emulator(self, machine: int, emulator):
+        """Copy an ``Emulator``'s state into one machine, which starts running again."""
+        if len(emulator.memory) != MEMORY_SIZE:
+            raise ValueError("BatchEmulator only supports the 4 KiB memory.")
+        if len(emulator.stack) > STACK_DEPTH:
+            raise ValueError(f"Stack deeper than {STACK_DEPTH} entries.")
+
+        self.memory[machine] = np.frombuffer(emulator.memory, dtype=np.uint8)
+        self.variable_register[machine] = emulator.variable_register
+        self.flag_registers[machine] = emulator.flag_registers
+        self.index_register[machine] = emulator.index_register
+        self.program_counter[machine] = emulator.program_counter
+        self.stack[machine] = 0
+        self.stack[machine, : len(emulator.stack)] = emulator.stack
+        self.stack_pointer[machine] = len(emulator.stack)
+        self.delay_timer[machine] = emulator.delay_timer
+        self.sound_timer[machine] = emulator.sound_timer
+        self.carry_flag[machine] = emulator.carry_flag
+        self.key_states[machine] = np.frombuffer(emulator.key_states, dtype=np.uint8)
+        self.set_resolution(np.array([machine]), emulator.high_resolution)
+        self.screen[machine, : emulator.screen_height, : emulator.screen_width // 8] = np.packbits(
+            emulator.screen_array, axis=1
+        )
+        self.draw_flag[machine] = emulator.draw_flag
+        self.rngs[machine].setstate(emulator.rng.getstate())
+        self.running[machine] = True
+        self.errors[machine] = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run one ROM on many machines at once.")
+    parser.add_argument("rom")
+    parser.add_argument("--instances", type=int, default=1024)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0, help="machine i is seeded with seed + i")
+    parser.add_argument(
+        "--random-keys", action="store_true", help="give every machine its own random key presses"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    batch = BatchEmulator(args.instances, seeds=[args.seed + i for i in range(args.instances)])
+    batch.load_program(args.rom)
+    keys = np.random.default_rng(args.seed)
+
+    started = time.perf_counter()
+    for _ in range(args.frames):
+        if args.random_keys:
+            batch.key_states[:] = 0
+            pressed = keys.integers(0, 32, args.instances)
+            held = pressed < 16
+            batch.key_states[np.flatnonzero(held), pressed[held]] = 1
+        batch.run_frames(1)
+    elapsed = time.perf_counter() - started
+
+    screens = {batch.screen[machine].tobytes() for machine in range(args.instances)}
+    errors = {}
+    for error in batch.errors:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    report = {
+        "instances": args.instances,
+        "frames": args.frames,
+        "seconds": round(elapsed, 3),
+        "instructions_per_second": round(args.instances * batch.cycles / elapsed),
+        "distinct_screens": len(screens),
+        "stopped": errors,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
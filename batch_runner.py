@@ -0,0 +1,104 @@
+"""Run every ROM in a folder headlessly and stream one JSON result per line.
+
+Usage: python batch_runner.py ROM_FOLDER [--frames N] [--workers N] [--timeout S]
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from emulator import Emulator
+from roms import find_roms
+
+# frames run between deadline checks; a frame is bounded work, so this keeps
+# timeouts accurate to a few milliseconds without a clock call per frame
+FRAMES_PER_CHECK = 60
+
+
+def run_rom(rom_path: str, frames: int, timeout: float, emulator_options: dict) -> dict:
+    result = {
+        "rom": rom_path,
+        "frames": 0,
+        "cycles": 0,
+        "framebuffer_sha1": None,
+        "error": None,
+    }
+    started = time.perf_counter()
+    deadline = started + timeout if timeout else None
+    emulator = Emulator(**emulator_options)
+
+    # unknown opcodes are reported with print(), keep them out of the JSON stream
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            emulator.load_program(rom_path)
+            while result["frames"] < frames:
+                batch = min(FRAMES_PER_CHECK, frames - result["frames"])
+                emulator.run_frames(batch)
+                result["frames"] += batch
+
+                if deadline is not None and time.perf_counter() > deadline:
+                    if result["frames"] < frames:
+                        result["error"] = f"timeout after {timeout}s"
+                    break
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+    result["cycles"] = emulator.cycles
+    result["framebuffer_sha1"] = hashlib.sha1(emulator.get_framebuffer()).hexdigest()
+    result["seconds"] = round(time.perf_counter() - started, 6)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a folder of CHIP-8 ROMs headlessly.")
+    parser.add_argument("folder", help="folder to scan for .ch8 files")
+    parser.add_argument("--frames", type=int, default=600, help="frames to run per ROM")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=0, help="per-ROM time limit in seconds (0 = none)"
+    )
+    parser.add_argument("--recursive", action="store_true", help="scan subfolders too")
+    parser.add_argument(
+        "--translate-blocks", action="store_true", help="use the block translator"
+    )
+    parser.add_argument("--set-vx-to-vy", action="store_true", help="8XY6 shift quirk")
+    parser.add_argument(
+        "--extended-memory", action="store_true", help="XO-CHIP 64 KiB memory and F000 NNNN"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    emulator_options = {
+        "set_vx_to_vy": args.set_vx_to_vy,
+        "translate_blocks": args.translate_blocks,
+        "extended_memory": args.extended_memory,
+    }
+    roms = sorted(str(rom) for rom in find_roms(args.folder, recursive=args.recursive))
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(run_rom, rom, args.frames, args.timeout, emulator_options)
+            for rom in roms
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result["error"]:
+                failures += 1
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Interpreter and renderer benchmarks.
+
+Prints (or writes) a JSON report of instructions/sec and ms/frame per
+benchmark, and can compare it against a previous report:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List
+
+from batch_emulator import BatchEmulator
+from constants import BIG_FONT_START_ADDRESS, FONT_START_ADDRESS
+from emulator import Emulator
+
+ENGINES = {
+    "interpreter": {},
+    "translator": {"translate_blocks": True},
+}
+
+# machines in the BatchEmulator benchmarks; a batch frame costs about as
+# much as this many interpreted ones, so they run a tenth of the frames
+BATCH_SIZE = 1024
+BATCH_FRAME_DIVISOR = 10
+
+# each microbenchmark repeats its body this many times before jumping back,
+# so the loop's own 1NNN barely shows up in the numbers
+BODY_REPEAT = 64
+
+
+def assemble(instructions: List[int]) -> bytes:
+    return b"".join(instruction.to_bytes(2, "big") for instruction in instructions)
+
+
+def loop(setup: List[int], body: List[int]) -> bytes:
+    """Run ``setup`` once, then repeat ``body`` forever."""
+    loop_start = 0x200 + 2 * len(setup)
+    return assemble(setup + body * BODY_REPEAT + [0x1000 | loop_start])
+
+
+# opcode family -> program that executes (almost) only that family
+MICRO_PROGRAMS: Dict[str, bytes] = {
+    "00E0 clear": loop([], [0x00E0]),
+    "2NNN/00EE call": assemble([0x2206, 0x1200, 0x0000, 0x00EE]),
+    "3XNN-9XY0 skip": loop([0x6001], [0x3000, 0x4001, 0x5010, 0x9000]),
+    "6XNN/7XNN load": loop([], [0x6012, 0x7103]),
+    "8XYN alu": loop(
+        [0x6107, 0x6203],
+        [0x8010, 0x8011, 0x8012, 0x8013, 0x8014, 0x8015, 0x8016, 0x8017, 0x801E],
+    ),
+    "ANNN/FX1E index": loop([], [0xA300, 0xF01E]),
+    "CXNN random": loop([], [0xC0FF]),
+    "DXYN draw": loop([0xA000 | FONT_START_ADDRESS], [0xD015]),
+    # no key is down, so EXA1 always skips the 6000 after it
+    "EX9E/EXA1 keys": loop([], [0xE09E, 0xE0A1, 0x6000]),
+    "FX07-FX29 timers/font": loop([], [0xF007, 0xF015, 0xF018, 0xF029]),
+    "FX33-FX65 memory": loop([0x60FF], [0xAE00, 0xF033, 0xAE00, 0xF355, 0xAE00, 0xF365]),
+}
+
+# whole-frame workloads
+FRAME_PROGRAMS: Dict[str, bytes] = {
+    # arithmetic and compare loop, no drawing
+    "alu loop": loop([0x6001], [0x7102, 0x8014, 0x8125, 0x8231, 0x3F01, 0x8343]),
+    # every instruction draws or moves a sprite
+    "sprite storm": loop(
+        [0xA000 | FONT_START_ADDRESS],
+        [0xD015, 0x7005, 0xD125, 0x7103, 0xF029],
+    ),
+    # BCD conversion and register dumps into memory
+    "bcd/memory": loop(
+        [0x6005],
+        [0x7007, 0xAE00, 0xF033, 0xAE00, 0xF265, 0xAE10, 0xF555],
+    ),
+    # draw, then busy-wait on the delay timer (FX07 / 3X00 / 1NNN) for 4 frames
+    "delay wait": assemble([0x6004, 0xF015, 0xF107, 0x3100, 0x1204, 0xD015, 0x1200]),
+    # the sprite storm in 128x64, with 16x16 (DXY0) and big font sprites
+    "hires sprite storm": loop(
+        [0x00FF, 0xA000 | BIG_FONT_START_ADDRESS],
+        [0xD01A, 0x7005, 0xD120, 0x7103, 0xF030],
+    ),
+}
+
+# render benchmark name -> frame program left on screen
+RENDER_PROGRAMS = {
+    "display": "sprite storm",
+    "display-hires": "hires sprite storm",
+}
+
+
+def best_of(repeat: int, function: Callable[[], float]) -> float:
+    return min(function() for _ in range(repeat))
+
+
+def bench_instructions(program: bytes, options: dict, count: int, repeat: int) -> dict:
+    def timed() -> float:
+        emulator = Emulator(**options)
+        emulator.load_rom(program)
+        start = time.perf_counter()
+        emulator.step(count)
+        return time.perf_counter() - start
+
+    seconds = best_of(repeat, timed)
+    return {"instructions_per_second": round(count / seconds)}
+
+
+def bench_frames(program: bytes, options: dict, frames: int, repeat: int) -> dict:
+    skipped = 0
+
+    def timed() -> float:
+        nonlocal skipped
+        emulator = Emulator(**options)
+        emulator.load_rom(program)
+        start = time.perf_counter()
+        emulator.run_frames(frames)
+        seconds = time.perf_counter() - start
+        skipped = emulator.idle_skipped
+        return seconds
+
+    seconds = best_of(repeat, timed)
+    # idle-loop iterations that were fast-forwarded never ran, so they do not
+    # count towards the instruction rate
+    instructions = frames * Emulator().instructions_per_frame - skipped
+    return {
+        "instructions_per_second": round(instructions / seconds),
+        "skipped_instructions": skipped,
+        "ms_per_frame": round(seconds / frames * 1000, 6),
+    }
+
+
+def bench_batch_frames(program: bytes, size: int, frames: int, repeat: int) -> dict:
+    def timed() -> float:
+        batch = BatchEmulator(size, seeds=range(size))
+        batch.load_rom(program)
+        start = time.perf_counter()
+        batch.run_frames(frames)
+        return time.perf_counter() - start
+
+    seconds = best_of(repeat, timed)
+    instructions = size * frames * Emulator().instructions_per_frame
+    return {
+        "instructions_per_second": round(instructions / seconds),
+        "ms_per_frame": round(seconds / frames * 1000, 6),
+    }
+
+
+def bench_render(program: bytes, frames: int, repeat: int) -> dict:
+    # display() needs pygame; run it against SDL's offscreen driver
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        from frontend import PygameFrontend
+    except ImportError as e:
+        return {"skipped": str(e)}
+
+    frontend = PygameFrontend()
+    frontend.emulator.load_rom(program)
+    frontend.emulator.run_frames(10)
+    frontend.setup_display()
+
+    def timed_full() -> float:
+        start = time.perf_counter()
+        for _ in range(frames):
+            # forget what is on screen so every call redraws all rows
+            frontend.presented_rows = None
+            frontend.display()
+        return time.perf_counter() - start
+
+    def timed_unchanged() -> float:
+        start = time.perf_counter()
+        for _ in range(frames):
+            frontend.display()
+        return time.perf_counter() - start
+
+    full = best_of(repeat, timed_full)
+    unchanged = best_of(repeat, timed_unchanged)
+    frontend.stop()
+    return {
+        "full": {"ms_per_frame": round(full / frames * 1000, 6)},
+        "unchanged": {"ms_per_frame": round(unchanged / frames * 1000, 6)},
+    }
+
+
+def run_benchmarks(instructions: int, frames: int, repeat: int) -> dict:
+    results = {}
+    for engine, options in ENGINES.items():
+        for name, program in MICRO_PROGRAMS.items():
+            results[f"micro/{engine}/{name}"] = bench_instructions(
+                program, options, instructions, repeat
+            )
+        for name, program in FRAME_PROGRAMS.items():
+            results[f"frame/{engine}/{name}"] = bench_frames(program, options, frames, repeat)
+
+    batch_frames = max(1, frames // BATCH_FRAME_DIVISOR)
+    for name, program in FRAME_PROGRAMS.items():
+        results[f"batch/{BATCH_SIZE}/{name}"] = bench_batch_frames(
+            program, BATCH_SIZE, batch_frames, repeat
+        )
+
+    for render_name, program_name in RENDER_PROGRAMS.items():
+        render = bench_render(FRAME_PROGRAMS[program_name], frames, repeat)
+        if "skipped" in render:
+            results[f"render/{render_name}"] = render
+        else:
+            for name, metrics in render.items():
+                results[f"render/{render_name}/{name}"] = metrics
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a description of every metric that got worse by more than ``tolerance``."""
+    regressions = []
+    for name, metrics in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+
+        throughput = metrics.get("instructions_per_second")
+        old_throughput = previous.get("instructions_per_second")
+        if throughput and old_throughput and throughput < old_throughput * (1 - tolerance):
+            regressions.append(
+                f"{name}: {throughput} instructions/s (baseline {old_throughput})"
+            )
+
+        frame_time = metrics.get("ms_per_frame")
+        old_frame_time = previous.get("ms_per_frame")
+        if frame_time and old_frame_time and frame_time > old_frame_time * (1 + tolerance):
+            regressions.append(f"{name}: {frame_time} ms/frame (baseline {old_frame_time})")
+
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CHIP-8 core and renderer.")
+    parser.add_argument("--instructions", type=int, default=100_000)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, best kept")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10, help="allowed slowdown before failing"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run_benchmarks(args.instructions, args.frames, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
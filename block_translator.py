@@ -0,0 +1,630 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from constants import BIG_FONT_START_ADDRESS, FONT_START_ADDRESS
+from idle_loops import IDLE_LOOP_SPAN, IdleLoop
+
+# most instruction slots traced into a single block; compiling costs about
+# 25 us a slot, so longer code is split into blocks that hand over to each other
+MAX_BLOCK_LENGTH = 64
+
+# times an address has to be reached by the interpreter before a block is
+# compiled there; only code that keeps running is worth compiling
+HOT_THRESHOLD = 4
+
+# finished translations by start address and machine setup, shared by every
+# emulator in the process; one is reused wherever memory holds the bytes it
+# was traced from, so resetting, reloading code that rewrote itself or
+# running the same ROM in another session skips tracing and compiling
+TRANSLATION_CACHE_SIZE = 4096
+# translations kept per start address, newest first
+TRANSLATION_VERSIONS = 8
+
+# how an instruction leaves its slot, see BlockTranslator.emit
+NEXT = "next"  # falls through
+SKIP = "skip"  # sets s, which skips the slot after it
+JUMP = "jump"  # goes on at a known address
+CALL = "call"  # pushes the return address and goes on at a known address
+RETURN = "return"  # 00EE
+EXIT = "exit"  # leaves the block with the program counter it set
+
+
+class Translation(NamedTuple):
+    """A traced block, before it is bound to an emulator."""
+
+    code: object
+    # namespace name and instruction of each handler the block calls
+    handlers: List[Tuple[str, int]]
+    # whether the block starts with an idle-loop check
+    idle: bool
+    # addresses the block read, and the same as runs of (address, bytes)
+    covered: List[int]
+    spans: List[Tuple[int, bytes]]
+    # known addresses the block can leave for
+    exits: List[int]
+
+
+translations: Dict[tuple, List[Translation]] = {}
+
+# DXYN sprite rows by (row width, x position): each of the 256 sprite bytes
+# already shifted and wrapped into place, built the first time a block
+# draws at that position
+rotated_rows: Dict[Tuple[int, int], List[int]] = {}
+
+
+def rotate_rows(width: int, shift: int) -> List[int]:
+    mask = (1 << width) - 1
+    rows = []
+    for byte in range(256):
+        sprite = byte << (width - 8)
+        rows.append(((sprite >> shift) | (sprite << (width - shift))) & mask)
+    rotated_rows[(width, shift)] = rows
+    return rows
+
+
+class BlockTranslator:
+    """Traces hot CHIP-8 code into Python generator functions.
+
+    A block follows the code from its start address through jumps, calls
+    and the returns of those calls, for up to ``MAX_BLOCK_LENGTH`` slots. A
+    skip sets a flag that guards the slot after it inside the block, so a
+    conditional jump only leaves the block on the side that jumps, and code
+    that comes back to the block's start loops inside it. Simple
+    instructions are emitted inline; the rest call the emulator's own
+    predecoded handlers, so both engines share one set of semantics.
+
+    ``block(budget)`` starts a generator that runs instructions until it
+    leaves the block or the budget is spent. When it leaves, it yields the
+    number of instructions left in the batch and is finished. When the budget
+    runs out first it yields None with the program counter pointing at its
+    next slot, and is resumed there with the next batch's budget, so frame
+    boundaries land on exactly the same instruction as in the interpreter.
+    Blocks are cached by start address and dropped whenever ``invalidate``
+    is told that memory they read was written; their translations stay in
+    ``translations`` for any emulator whose memory still matches.
+    """
+
+    def __init__(self, emulator) -> None:
+        self.emulator = emulator
+        self.blocks: Dict[int, Callable] = {}
+        self.namespaces: Dict[int, dict] = {}
+        self.extents: Dict[int, List[int]] = {}
+        self.covering: List[List[int]] = [[] for _ in range(len(emulator.memory))]
+        # 1 wherever covering is not empty, for a quick miss on memory writes
+        self.covered = bytearray(len(emulator.memory))
+        self.entry_counts = [0] * len(emulator.memory)
+        # (generator, program counter) of a block that ran out of budget
+        self.suspended: Optional[Tuple[object, int]] = None
+
+    def invalidate(self, location: int = None, length: int = 1):
+        """Drop the blocks that read any of ``length`` bytes at ``location``.
+
+        Without a location every block is dropped.
+        """
+        if location is None:
+            for namespace in self.namespaces.values():
+                namespace["block_valid"] = False
+            self.blocks.clear()
+            self.namespaces.clear()
+            self.extents.clear()
+            self.covering = [[] for _ in range(len(self.emulator.memory))]
+            self.covered = bytearray(len(self.emulator.memory))
+            self.entry_counts = [0] * len(self.emulator.memory)
+            self.suspended = None
+            return
+
+        if self.covered.find(1, location, location + length) < 0:
+            return
+        for address in range(location, location + length):
+            starts = self.covering[address]
+            while starts:
+                self.drop(starts[-1])
+
+    def drop(self, start: int):
+        # a block still running checks this after each of its memory writes
+        self.namespaces.pop(start)["block_valid"] = False
+        del self.blocks[start]
+        self.suspended = None
+        # code that keeps rewriting itself has to get hot all over again
+        # rather than being recompiled after every write
+        self.entry_counts[start] = 0
+        for address in self.extents.pop(start):
+            starts = self.covering[address]
+            starts.remove(start)
+            if not starts:
+                self.covered[address] = 0
+
+    def execute(self, count: int):
+        """Run ``count`` instructions, a block at a time where possible."""
+        emulator = self.emulator
+        blocks = self.blocks
+        entry_counts = self.entry_counts
+
+        # only addresses reached by a jump, skip or the end of a block count
+        # towards compiling a block there; resuming after a frame boundary or
+        # falling through an interpreted instruction does not, or every
+        # address a frame happens to start on would eventually get a block
+        counted_entry = False
+
+        if self.suspended is not None and count > 0:
+            running, program_counter = self.suspended
+            self.suspended = None
+            # anything may have happened between batches, but a block only
+            # ever depends on the program counter and memory it read
+            if emulator.program_counter == program_counter:
+                left = running.send(count)
+                if left is None:
+                    self.suspended = (running, emulator.program_counter)
+                    return
+                count = left
+                counted_entry = True
+
+        try:
+            while count > 0:
+                program_counter = emulator.program_counter
+                block = blocks.get(program_counter)
+                if block is not None:
+                    running = block(count)
+                    left = next(running)
+                    if left is None:
+                        self.suspended = (running, emulator.program_counter)
+                        return
+                    count = left
+                    counted_entry = True
+                    continue
+
+                if counted_entry and program_counter < len(entry_counts):
+                    entry_counts[program_counter] += 1
+                    if entry_counts[program_counter] >= HOT_THRESHOLD and self.translate(
+                        program_counter
+                    ):
+                        continue
+
+                emulator.cycle()
+                count -= 1
+                counted_entry = emulator.program_counter != program_counter + 2
+        except IdleLoop as loop:
+            # an interpreted loop head found its loop idle
+            emulator.skip_idle_loop(loop, count)
+
+    def translate(self, start: int):
+        """Compile a block at ``start``, reusing a translation of the same bytes."""
+        emulator = self.emulator
+        memory = emulator.memory
+        key = (
+            start,
+            len(memory),
+            emulator.extended_memory,
+            emulator.skip_idle_loops,
+            emulator.input_probe is None,
+        )
+        versions = translations.get(key)
+        if versions is None:
+            if len(translations) >= TRANSLATION_CACHE_SIZE:
+                translations.clear()
+            versions = translations[key] = []
+        for translation in versions:
+            if all(
+                memory[location : location + len(data)] == data
+                for location, data in translation.spans
+            ):
+                break
+        else:
+            translation = self.trace(start)
+            versions.insert(0, translation)
+            del versions[TRANSLATION_VERSIONS:]
+        return self.install(start, translation)
+
+    def trace(self, start: int) -> Translation:
+        """Follow the code from ``start`` and compile it into a block."""
+        emulator = self.emulator
+        memory = emulator.memory
+        handlers: List[Tuple[str, int]] = []
+        # bytes whose change could change the block: each instruction, and
+        # the rest of an idle loop that could start at it
+        span = IDLE_LOOP_SPAN if emulator.skip_idle_loops else 2
+        reads: List[range] = []
+        exits: List[int] = []
+
+        idle = emulator.skip_idle_loops and emulator.idle_loop_test(start) is not None
+        if idle:
+            reads.append(range(start, min(start + span, len(memory))))
+
+        body: List[str] = []
+        address = start
+        slot = 0
+        # return addresses pushed by calls inside the block
+        calls: List[int] = []
+        # the slot at address is skipped if s is set
+        guarded = False
+        loops = False
+        seen = set()
+        # where the block last went through the start of another one
+        cut = None
+        while True:
+            state = (address, tuple(calls), guarded)
+            if state == (start, (), False) and slot and not idle:
+                body.append(f"budget -= {slot}")
+                loops = True
+                break
+            if slot and not guarded and address in self.blocks:
+                cut = (address, slot, len(body), len(reads), len(exits), len(handlers), loops)
+            full = slot >= MAX_BLOCK_LENGTH
+            if full and cut is not None:
+                # leave for that block rather than at whatever slot the limit
+                # falls on, or new blocks would keep starting a slot or two
+                # further on from the old ones
+                address, slot, body_length, reads_length, exits_length, handlers_length, loops = cut
+                del body[body_length:], reads[reads_length:], exits[exits_length:]
+                del handlers[handlers_length:]
+                guarded = False
+            if (
+                full
+                or state in seen
+                or address + 1 >= len(memory)
+                or (slot and span > 2 and emulator.idle_loop_test(address) is not None)
+            ):
+                # the rest runs elsewhere: a block of its own, the interpreter
+                # or an idle-loop check
+                if guarded:
+                    reads.append(range(address, min(address + 2, len(memory))))
+                    following = address + self.width(address)
+                    body.append(f"emu.program_counter = {following} if s else {address}")
+                    exits.extend([address, following])
+                else:
+                    body.append(f"emu.program_counter = {address}")
+                    exits.append(address)
+                body.append(f"yield budget - {slot}")
+                break
+            seen.add(state)
+
+            instruction = (memory[address] << 8) | memory[address + 1]
+            following = address + self.width(address)
+            if following > len(memory):
+                # F000 without its operand; let the interpreter fail on it
+                body.extend([f"emu.program_counter = {address}", f"yield budget - {slot}"])
+                break
+            reads.append(range(address, min(max(following, address + span), len(memory))))
+
+            resume_at = f"{following} if s else {address}" if guarded else address
+            body.append(
+                f"if budget <= {slot}: "
+                f"emu.program_counter = {resume_at}; budget = {slot} + (yield)"
+            )
+
+            leave = f"yield budget - {slot + 1}"
+            lines, kind, target = self.emit(instruction, address, following, handlers, leave)
+            if kind == RETURN and calls and not guarded:
+                # returning from a call made inside the block; the stack is
+                # checked in case a resumed block finds another one
+                return_address = calls.pop()
+                body.extend(
+                    [
+                        "stack = emu.stack",
+                        f"if stack and stack[-1] == {return_address}:",
+                        "    stack.pop()",
+                        "else:",
+                        f"    emu.program_counter = stack.pop() if stack else {following}",
+                        f"    {leave}",
+                    ]
+                )
+                address = return_address
+                slot += 1
+                continue
+
+            if kind in (JUMP, CALL) and not guarded:
+                body.extend(lines)
+                if kind == CALL:
+                    calls.append(following)
+                address = target
+                slot += 1
+                continue
+
+            if kind in (JUMP, CALL, RETURN, EXIT):
+                # leaves the block, only when not skipped if guarded
+                if kind == RETURN:
+                    lines = [
+                        "stack = emu.stack",
+                        f"emu.program_counter = stack.pop() if stack else {following}",
+                    ]
+                if kind == JUMP and target == start and not calls and not idle:
+                    lines = lines + [f"budget -= {slot + 1}", "continue"]
+                    loops = True
+                else:
+                    if target is not None:
+                        lines = lines + [f"emu.program_counter = {target}"]
+                        exits.append(target)
+                    lines = lines + [leave]
+                if not guarded:
+                    body.extend(lines)
+                    break
+
+            if guarded:
+                body.extend(["if s:", "    budget += 1"])
+                if kind == SKIP:
+                    body.append("    s = False")
+                body.append("else:")
+                body.extend(["    " + line for line in lines])
+            else:
+                body.extend(lines)
+            guarded = kind == SKIP
+            address = following
+            slot += 1
+
+        lines = [
+            "def block(budget):",
+            "    emu = emulator",
+            "    V = emu.variable_register",
+            "    K = emu.key_states",
+            "    M = emu.memory",
+        ]
+        if idle:
+            lines.extend(
+                [
+                    "    if idle_test():",
+                    "        emu.skip_idle_loop(idle_loop, budget)",
+                    "        yield 0",
+                ]
+            )
+        # a block that does not loop leaves at the end of its first pass
+        lines.append("    while True:")
+        source = "\n".join(lines) + "\n        " + "\n        ".join(body)
+        code = compile(source, f"<block {start:03X}>", "exec")
+
+        covered = sorted(set().union(*reads))
+        runs: List[List[int]] = []
+        for location in covered:
+            if runs and runs[-1][1] == location:
+                runs[-1][1] = location + 1
+            else:
+                runs.append([location, location + 1])
+        spans = [(first, bytes(memory[first:end])) for first, end in runs]
+        return Translation(code, handlers, idle, covered, spans, exits)
+
+    def install(self, start: int, translation: Translation):
+        """Bind ``translation`` to this emulator as the block at ``start``."""
+        emulator = self.emulator
+        namespace = {
+            "emulator": emulator,
+            "block_valid": True,
+            "rotated_rows": rotated_rows,
+            "rotate_rows": rotate_rows,
+        }
+        for name, instruction in translation.handlers:
+            namespace[name] = emulator.decode(instruction)
+        if translation.idle:
+            memory = emulator.memory
+            period, test = emulator.idle_loop_test(start)
+            namespace["idle_test"] = test
+            namespace["idle_loop"] = IdleLoop(
+                start, period, emulator.decode((memory[start] << 8) | memory[start + 1])
+            )
+        exec(translation.code, namespace)
+        block = namespace["block"]
+
+        self.blocks[start] = block
+        self.namespaces[start] = namespace
+        self.extents[start] = translation.covered
+        covering = self.covering
+        covered = self.covered
+        for location in translation.covered:
+            covering[location].append(start)
+            covered[location] = 1
+
+        # the code a hot block leads to is about as hot; let it compile the
+        # next time the block leaves for it instead of after HOT_THRESHOLD
+        # more visits, so a long loop does not warm up one block at a time
+        entry_counts = self.entry_counts
+        for address in translation.exits:
+            if address < len(entry_counts):
+                entry_counts[address] = max(entry_counts[address], HOT_THRESHOLD - 1)
+
+        return block
+
+    def width(self, address: int) -> int:
+        """Bytes taken by the instruction at ``address``: 4 for F000 NNNN, else 2."""
+        memory = self.emulator.memory
+        if (
+            self.emulator.extended_memory
+            and address + 1 < len(memory)
+            and memory[address] == 0xF0
+            and memory[address + 1] == 0x00
+        ):
+            return 4
+        return 2
+
+    def emit(
+        self,
+        instruction: int,
+        address: int,
+        following: int,
+        handlers: List[Tuple[str, int]],
+        leave: str,
+    ) -> Tuple[List[str], str, Optional[int]]:
+        """Return the source lines for one instruction, how it leaves its
+        slot and the address it goes on at, if known.
+
+        ``following`` is the address of the next instruction and ``leave``
+        the line that leaves the block after this one. Lines that can raise
+        set the program counter first, as the interpreter would have.
+        """
+        x = (instruction & 0x0F00) >> 8
+        y = (instruction & 0x00F0) >> 4
+        n = instruction & 0x000F
+        nn = instruction & 0x00FF
+        nnn = instruction & 0x0FFF
+        group = instruction >> 12
+        emulator = self.emulator
+
+        if instruction == 0x00E0:
+            return ["emu.screen_rows = [0] * emu.screen_height"], NEXT, None
+
+        if instruction == 0x00EE:
+            return [], RETURN, None
+
+        if group == 0x1:
+            return [], JUMP, nnn
+
+        if group == 0x2:
+            return [f"emu.stack.append({following})"], CALL, nnn
+
+        if group == 0x3:
+            return [f"s = V[{x}] == {nn}"], SKIP, None
+
+        if group == 0x4:
+            return [f"s = V[{x}] != {nn}"], SKIP, None
+
+        if group == 0x5:
+            return [f"s = V[{x}] == V[{y}]"], SKIP, None
+
+        if group == 0x9:
+            return [f"s = V[{x}] != V[{y}]"], SKIP, None
+
+        if group == 0x6:
+            return [f"V[{x}] = {nn}"], NEXT, None
+
+        if group == 0x7:
+            return [f"V[{x}] = (V[{x}] + {nn}) & 0xFF"], NEXT, None
+
+        if group == 0x8 and n <= 0x3:
+            operator = ("", "|", "&", "^")[n]
+            return [f"V[{x}] {operator}= V[{y}]"], NEXT, None
+
+        if group == 0x8 and n == 0x4:
+            return [
+                f"result = V[{x}] + V[{y}]",
+                "emu.carry_flag = 1 if result > 0xFF else 0",
+                f"V[{x}] = result & 0xFF",
+            ], NEXT, None
+
+        if group == 0x8 and n in (0x5, 0x7):
+            minuend, subtrahend = ("vx", "vy") if n == 0x5 else ("vy", "vx")
+            return [
+                f"vx = V[{x}]",
+                f"vy = V[{y}]",
+                f"emu.carry_flag = 1 if {minuend} >= {subtrahend} else 0",
+                f"V[{x}] = ({minuend} - {subtrahend}) & 0xFF",
+            ], NEXT, None
+
+        if group == 0x8 and n == 0x6:
+            return [
+                "if emu.set_vx_to_vy:",
+                f"    V[{x}] = V[{y}]",
+                f"emu.carry_flag = V[{x}] & 0x01",
+                f"V[{x}] >>= 1",
+            ], NEXT, None
+
+        if group == 0x8 and n == 0xE:
+            return [
+                f"emu.carry_flag = V[{x}] & 0x80 >> 7",
+                f"V[{x}] = (V[{y}] << 1) & 0xFF",
+            ], NEXT, None
+
+        if group == 0xA:
+            return [f"emu.index_register = {nnn}"], NEXT, None
+
+        if group == 0xC:
+            return [f"V[{x}] = emu.rng.getrandbits(8) & {nn}"], NEXT, None
+
+        if group == 0xD and n:
+            # rows come from rotated_rows rather than being shifted into
+            # place one by one; a row past the end of memory raises
+            # IndexError after the rows before it were drawn, as in op_dxyn
+            return [
+                f"emu.program_counter = {following}",
+                "width = emu.screen_width",
+                f"shift = V[{x}] % width",
+                "rotated = rotated_rows.get((width, shift)) or rotate_rows(width, shift)",
+                f"top = V[{y}]",
+                "height = emu.screen_height",
+                "rows = emu.screen_rows",
+                "start = emu.index_register",
+                "emu.carry_flag = 0",
+                f"for row in range({n}):",
+                "    sprite = rotated[M[start + row]]",
+                "    screen_y = (top + row) % height",
+                "    if rows[screen_y] & sprite:",
+                "        emu.carry_flag = 1",
+                "    rows[screen_y] ^= sprite",
+                "emu.draw_flag = True",
+            ], NEXT, None
+
+        if group == 0xE and nn in (0x9E, 0xA1) and emulator.input_probe is None:
+            # VX past the keypad raises IndexError
+            pressed = 1 if nn == 0x9E else 0
+            return [f"emu.program_counter = {following}", f"s = K[V[{x}]] == {pressed}"], SKIP, None
+
+        if group == 0xF and instruction == 0xF000 and emulator.extended_memory:
+            operand = (emulator.memory[address + 2] << 8) | emulator.memory[address + 3]
+            return [f"emu.index_register = {operand}"], NEXT, None
+
+        if group == 0xF and nn == 0x07:
+            return [f"V[{x}] = emu.delay_timer"], NEXT, None
+
+        if group == 0xF and nn == 0x15:
+            return [f"emu.delay_timer = V[{x}]"], NEXT, None
+
+        if group == 0xF and nn == 0x18:
+            return [f"emu.sound_timer = V[{x}]"], NEXT, None
+
+        if group == 0xF and nn == 0x1E:
+            return [
+                f"emu.index_register = emu.index_register + V[{x}] & {emulator.address_mask}"
+            ], NEXT, None
+
+        if group == 0xF and nn == 0x29:
+            return [f"emu.index_register = {FONT_START_ADDRESS} + V[{x}] * 5"], NEXT, None
+
+        if group == 0xF and nn == 0x30:
+            return [
+                f"emu.index_register = {BIG_FONT_START_ADDRESS} + (V[{x}] & 0xF) * 10"
+            ], NEXT, None
+
+        if group == 0xF and nn in (0x33, 0x55):
+            # write_memory inline; a write may land on this block, which
+            # invalidate_cache then drops, so leave it for the next lookup
+            # to retranslate
+            length = 3 if nn == 0x33 else x + 1
+            if nn == 0x33:
+                lines = [f"vx = V[{x}]", "data = (vx // 100 % 10, vx // 10 % 10, vx % 10)"]
+            else:
+                lines = [f"data = V[: {length}]"]
+            lines += [
+                f"emu.program_counter = {following}",
+                "start = emu.index_register",
+                f"if start + {length} > {len(emulator.memory)}:",
+                "    raise IndexError",
+                f"M[start : start + {length}] = data",
+                f"emu.invalidate_cache(start, {length})",
+            ]
+            if nn == 0x55:
+                lines.append(f"emu.index_register = {length}")
+            return lines + ["if not block_valid:", f"    {leave}"], NEXT, None
+
+        if group == 0xF and nn == 0x65:
+            return [
+                "start = emu.index_register",
+                f"if start + {x + 1} > {len(emulator.memory)}:",
+                f"    emu.program_counter = {following}",
+                "    raise IndexError",
+                f"V[: {x + 1}] = M[start : start + {x + 1}]",
+                f"emu.index_register = {x + 1}",
+            ], NEXT, None
+
+        # anything else runs through the interpreter's handler, with the
+        # program counter already pointing past the instruction
+        name = f"op_{address:03x}"
+        handlers.append((name, instruction))
+        lines = [f"emu.program_counter = {following}", f"{name}()"]
+        # BNNN jumps, FX0A waits in place, 00FD halts, FX00 other than F000
+        # reads an operand it is not skipped over with
+        if (
+            group == 0xB
+            or instruction == 0x00FD
+            or (group == 0xF and nn == 0x0A)
+            or (group == 0xF and nn == 0x00 and emulator.extended_memory)
+        ):
+            return lines, EXIT, None
+        if group == 0xE and nn in (0x9E, 0xA1):
+            # the probed key skips move the program counter themselves
+            return lines + [f"s = emu.program_counter != {following}"], SKIP, None
+        return lines, NEXT, None
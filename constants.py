@@ -17,6 +17,55 @@ FONT_SET = [
     0xF0, 0x80, 0xF0, 0x80, 0xF0,  # E
     0xF0, 0x80, 0xF0, 0x80, 0x80   # F
 ]
+# SUPER-CHIP 8x10 digits, with XO-CHIP's A-F
+BIG_FONT_START_ADDRESS = 0x0A0
+BIG_FONT_SET = [
+    0xFF, 0xFF, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF,  # 0
+    0x18, 0x78, 0x78, 0x18, 0x18, 0x18, 0x18, 0x18, 0xFF, 0xFF,  # 1
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # 2
+    0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 3
+    0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0x03, 0x03,  # 4
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 5
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 6
+    0xFF, 0xFF, 0x03, 0x03, 0x06, 0x0C, 0x18, 0x18, 0x18, 0x18,  # 7
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 8
+    0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 9
+    0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3,  # A
+    0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC,  # B
+    0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C,  # C
+    0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC,  # D
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # E
+    0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0   # F
+]
 SCREEN_WIDTH = 64
 SCREEN_HEIGHT = 32
+# SUPER-CHIP / XO-CHIP high resolution mode (00FF)
+HIRES_SCREEN_WIDTH = 128
+HIRES_SCREEN_HEIGHT = 64
 PROGRAM_START_ADDRESS = 0X200
+MEMORY_SIZE = 4096
+# XO-CHIP address space, reachable through F000 NNNN
+EXTENDED_MEMORY_SIZE = 0x10000
+REGISTER_COUNT = 16
+# SUPER-CHIP RPL user flags (FX75 / FX85); XO-CHIP allows all 16
+FLAG_REGISTER_COUNT = 16
+
+# keyboard key name -> CHIP-8 key
+DEFAULT_KEYMAP = {
+    "1": 0x0,
+    "2": 0x1,
+    "3": 0x2,
+    "4": 0x3,
+    "q": 0x4,
+    "w": 0x5,
+    "e": 0x6,
+    "r": 0x7,
+    "a": 0x8,
+    "s": 0x9,
+    "d": 0xA,
+    "f": 0xB,
+    "z": 0xC,
+    "x": 0xD,
+    "c": 0xE,
+    "v": 0xF,
+}
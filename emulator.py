@@ -1,475 +1,1049 @@
-import pathlib
+import os
 import random
-
-import pygame
-
+import struct
+import time
+from functools import partial
+
+import numpy as np
+
+from block_translator import BlockTranslator
+from idle_loops import (
+    IDLE_LOOP_SPAN,
+    WAIT_DELAY_CHANGE,
+    WAIT_DELAY_EQUAL,
+    WAIT_KEY,
+    IdleLoop,
+    find_idle_loop,
+)
+from movie import Movie
+from profiler import InputLatencyProbe, Profiler
+from tracing import DEFAULT_TRACE_CAPACITY, TraceBuffer
+from scheduler import TIMER_HZ
 from constants import (
+    BIG_FONT_SET,
+    BIG_FONT_START_ADDRESS,
+    EXTENDED_MEMORY_SIZE,
+    FLAG_REGISTER_COUNT,
     FONT_START_ADDRESS,
     FONT_SET,
+    HIRES_SCREEN_HEIGHT,
+    HIRES_SCREEN_WIDTH,
+    MEMORY_SIZE,
+    REGISTER_COUNT,
     SCREEN_WIDTH,
     SCREEN_HEIGHT,
     PROGRAM_START_ADDRESS,
 )
 
+# save state layout: header, scalar registers and flags, then memory, V
+# registers, key states, flag registers, screen rows (screen_width / 8
+# bytes each) and finally the variable-length stack
+STATE_MAGIC = b"CH8S"
+STATE_VERSION = 2
+STATE_HEADER = struct.Struct(">4sB")
+STATE_SCALARS = struct.Struct(">HHBBBBBHQHBI")
+# version 1: 4 KiB memory, 64x32 screen and no flag registers
+STATE_SCALARS_V1 = struct.Struct(">HHBBBBBHQH")
+STATE_ROWS_V1 = struct.Struct(f">{SCREEN_HEIGHT}Q")
+
+# skips that step over all four bytes of F000 NNNN when memory is extended
+SKIP_HANDLERS = {"op_3xnn", "op_4xnn", "op_5xy0", "op_9xy0", "op_ex9e", "op_exa1"}
+
+# operands each handler is called with once its instruction is predecoded
+OPERANDS = {
+    "op_noop": "",
+    "op_00e0": "",
+    "op_00ee": "",
+    "op_00cn": "n",
+    "op_00dn": "n",
+    "op_00fb": "",
+    "op_00fc": "",
+    "op_00fd": "",
+    "op_00fe": "",
+    "op_00ff": "",
+    "op_f000": "",
+    "op_1nnn": "nnn",
+    "op_2nnn": "nnn",
+    "op_3xnn": "x,nn",
+    "op_4xnn": "x,nn",
+    "op_5xy0": "x,y",
+    "op_6xnn": "x,nn",
+    "op_7xnn": "x,nn",
+    "op_8xy0": "x,y",
+    "op_8xy1": "x,y",
+    "op_8xy2": "x,y",
+    "op_8xy3": "x,y",
+    "op_8xy4": "x,y",
+    "op_8xy5": "x,y",
+    "op_8xy6": "x,y",
+    "op_8xy7": "x,y",
+    "op_8xye": "x,y",
+    "op_9xy0": "x,y",
+    "op_annn": "nnn",
+    "op_bnnn": "nnn",
+    "op_cxnn": "x,nn",
+    "op_dxyn": "x,y,n",
+    "op_ex9e": "x",
+    "op_exa1": "x",
+    "op_ex9e_probed": "x",
+    "op_exa1_probed": "x",
+    "op_fx07": "x",
+    "op_fx0a": "x",
+    "op_fx0a_probed": "x",
+    "op_fx15": "x",
+    "op_fx18": "x",
+    "op_fx1e": "x",
+    "op_fx29": "x",
+    "op_fx33": "x",
+    "op_fx55": "x",
+    "op_fx65": "x",
+    "op_fx30": "x",
+    "op_fx75": "x",
+    "op_fx85": "x",
+}
 
-class Emulator:
 
-    def __init__(self, set_vx_to_vy=False) -> None:
-        self.screen = None
-        self.pixels = None
-        self.display_height = None
-        self.display_width = None
-        self.internal_surface = None
-        self.memory = [0] * 4096
-        self.variable_register = [0] * 16
+class Emulator:
+    """Headless CHIP-8 core.
+
+    Holds the machine state and executes instructions; it has no display,
+    audio or event loop of its own. ``frontend.PygameFrontend`` drives it
+    interactively, anything else can use ``step``/``run_frames`` directly.
+    """
+
+    __slots__ = (
+        "memory",
+        "variable_register",
+        "index_register",
+        "program_counter",
+        "stack",
+        "delay_timer",
+        "sound_timer",
+        "carry_flag",
+        "flag_registers",
+        "screen_rows",
+        "high_resolution",
+        "screen_width",
+        "screen_height",
+        "row_mask",
+        "draw_flag",
+        "key_states",
+        "instruction_cache",
+        "group_handlers",
+        "system_handlers",
+        "arithmetic_handlers",
+        "key_handlers",
+        "misc_handlers",
+        "translator",
+        "set_vx_to_vy",
+        "skip_idle_loops",
+        "extended_memory",
+        "address_mask",
+        "instructions_per_frame",
+        "cycles",
+        "idle_skipped",
+        "frame_count",
+        "rng",
+        "profiler",
+        "tracer",
+        "input_probe",
+        "recorder",
+    )
+
+    def __init__(
+        self,
+        set_vx_to_vy=False,
+        translate_blocks=False,
+        seed=None,
+        skip_idle_loops=True,
+        extended_memory=False,
+    ) -> None:
+        # XO-CHIP: 64 KiB of memory, I loaded through F000 NNNN
+        self.extended_memory = extended_memory
+        self.memory = bytearray(EXTENDED_MEMORY_SIZE if extended_memory else MEMORY_SIZE)
+        self.address_mask = len(self.memory) - 1
+        self.variable_register = [0] * REGISTER_COUNT
+        self.flag_registers = [0] * FLAG_REGISTER_COUNT
         self.index_register = 0
         self.program_counter = PROGRAM_START_ADDRESS
         self.stack = []
         self.delay_timer = 0
         self.sound_timer = 0
         self.carry_flag = 0
-        self.screen_array = [[0] * SCREEN_WIDTH for _ in range(SCREEN_HEIGHT)]
-        self.memory[FONT_START_ADDRESS : FONT_START_ADDRESS + len(FONT_SET)] = FONT_SET
+        self.set_resolution(False)
+        self.load_fonts()
         self.draw_flag = False
-        self.key_states = [0] * 16  # 1 is pressed state
+        self.key_states = bytearray(16)  # 1 is pressed state
+        self.instruction_cache = [None] * len(self.memory)
+        self.profiler = None
+        self.tracer = None
+        self.input_probe = None
+        self.recorder = None
+        # fast-forward busy-wait loops on the delay timer or FX0A
+        self.skip_idle_loops = skip_idle_loops
+        # CXNN draws from this, so a seeded emulator replays identically
+        self.rng = random.Random(seed)
+        self.build_dispatch_tables()
+        self.translator = BlockTranslator(self) if translate_blocks else None
 
         self.set_vx_to_vy = set_vx_to_vy
-        self.running = True
-
-        pygame.init()
-        self.beep = pygame.mixer.Sound("bleep-41488.mp3")
-        self.clock = pygame.time.Clock()
-
-    def stop(self):
-        if self.running:
-            self.running = False
+        self.instructions_per_frame = 30
+        self.cycles = 0
+        # part of cycles that idle-loop skips accounted for without running
+        self.idle_skipped = 0
+        self.frame_count = 0
+
+    def reset(self):
+        """Clear loaded content and return the machine to its power-on state."""
         self.draw_flag = False
 
-        # clear loaded content
-        self.memory = [0] * 4096
-        self.variable_register = [0] * 16
+        # cleared in place so anything holding a reference keeps seeing live state
+        self.memory[:] = bytes(len(self.memory))
+        self.variable_register[:] = [0] * REGISTER_COUNT
+        self.flag_registers[:] = [0] * FLAG_REGISTER_COUNT
         self.index_register = 0
         self.program_counter = PROGRAM_START_ADDRESS
         self.stack = []
         self.delay_timer = 0
         self.sound_timer = 0
         self.carry_flag = 0
-        self.screen_array = [[0] * SCREEN_WIDTH for _ in range(SCREEN_HEIGHT)]
-        self.key_states = [0] * 16  # 1 is pressed state
+        self.set_resolution(False)
+        self.draw_flag = False
+        self.load_fonts()
+        self.key_states[:] = bytes(16)  # 1 is pressed state
+        self.cycles = 0
+        self.idle_skipped = 0
+        self.frame_count = 0
+        self.invalidate_cache()
+
+    def load_fonts(self):
+        self.memory[FONT_START_ADDRESS : FONT_START_ADDRESS + len(FONT_SET)] = bytes(FONT_SET)
+        self.memory[BIG_FONT_START_ADDRESS : BIG_FONT_START_ADDRESS + len(BIG_FONT_SET)] = bytes(
+            BIG_FONT_SET
+        )
 
-        pygame.display.quit()
-        pygame.quit()
+    def set_resolution(self, high: bool):
+        """Switch between 64x32 and the 128x64 SUPER-CHIP mode; clears the screen."""
+        self.high_resolution = high
+        self.screen_width = HIRES_SCREEN_WIDTH if high else SCREEN_WIDTH
+        self.screen_height = HIRES_SCREEN_HEIGHT if high else SCREEN_HEIGHT
+        self.row_mask = (1 << self.screen_width) - 1
+        self.screen_rows = [0] * self.screen_height  # one int per row, MSB is x = 0
+        self.draw_flag = True
 
     def modify_memory(self, location: int, new_content: int):
-        if location <= 4096:
+        if 0 <= location < len(self.memory):
             self.memory[location] = new_content
+            self.invalidate_cache(location)
         else:
             raise IndexError
 
+    def write_memory(self, location: int, data):
+        """Copy ``data`` into memory at ``location`` in one slice assignment."""
+        end = location + len(data)
+        if location < 0 or end > len(self.memory):
+            raise IndexError
+
+        self.memory[location:end] = data
+        self.invalidate_cache(location, len(data))
+
     def modify_var_register(self, location: int, new_content: int):
-        if location <= 16:
+        if 0 <= location < REGISTER_COUNT:
             self.variable_register[location] = new_content
         else:
             raise IndexError
 
     def access_memory(self, location: int):
-        if location <= 4096:
+        if 0 <= location < len(self.memory):
             return self.memory[location]
         else:
             raise IndexError
 
     def access_var_reg(self, location: int):
-        if location <= 16:
+        if 0 <= location < REGISTER_COUNT:
             return self.variable_register[location]
         else:
             raise IndexError
 
     def load_program(self, filename: str):
         with open(filename, "rb") as file:
-            program_data = file.read()
+            size = os.fstat(file.fileno()).st_size
             # Check if program data fits in memory
-            if len(program_data) + PROGRAM_START_ADDRESS > len(self.memory):
+            if size + PROGRAM_START_ADDRESS > len(self.memory):
                 raise ValueError("Program is too large to fit in memory.")
-            # Load program data into memory starting at 0x200
-            self.memory[
-                PROGRAM_START_ADDRESS : PROGRAM_START_ADDRESS + len(program_data)
-            ] = program_data
+            # Read program data straight into memory starting at 0x200
+            with memoryview(self.memory) as view:
+                file.readinto(view[PROGRAM_START_ADDRESS : PROGRAM_START_ADDRESS + size])
+            self.invalidate_cache()
+
+    def load_rom(self, program_data: bytes):
+        """Load a ROM image that is already in memory (e.g. a generated test program)."""
+        if len(program_data) + PROGRAM_START_ADDRESS > len(self.memory):
+            raise ValueError("Program is too large to fit in memory.")
+        self.write_memory(PROGRAM_START_ADDRESS, program_data)
+
+    def step(self, count: int = 1):
+        """Execute ``count`` instructions without touching the timers."""
+        self.execute(count)
+
+    def run_frames(self, count: int = 1):
+        """Run ``count`` 60 Hz frames: one instruction batch plus a timer tick each."""
+        if self.profiler is not None:
+            self.run_profiled_frames(count)
+            return
+
+        for _ in range(count):
+            self.execute(self.instructions_per_frame)
+            self.tick_timers()
+
+    def run_profiled_frames(self, count: int):
+        profiler = self.profiler
+        for _ in range(count):
+            profiler.start_frame()
+            started = time.perf_counter()
+            self.execute(self.instructions_per_frame)
+            executed = time.perf_counter()
+            self.tick_timers()
+            profiler.add_time("execute", executed - started)
+            profiler.add_time("timers", time.perf_counter() - executed)
+            profiler.add_ticks(1)
+            profiler.end_frame()
+
+    def enable_profiling(self) -> Profiler:
+        """Attach a fresh ``Profiler``; instructions run through it until disabled."""
+        self.profiler = Profiler(len(self.memory))
+        return self.profiler
+
+    def disable_profiling(self):
+        self.profiler = None
+
+    def enable_tracing(self, capacity: int = DEFAULT_TRACE_CAPACITY) -> TraceBuffer:
+        """Record the last ``capacity`` instructions into a ``TraceBuffer`` until disabled."""
+        self.tracer = TraceBuffer(capacity)
+        self.tracer.start(self)
+        return self.tracer
+
+    def disable_tracing(self):
+        self.tracer = None
+
+    def tick_timers(self):
+        self.frame_count += 1
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+        if self.sound_timer > 0:
+            self.sound_timer -= 1
+
+    def packed_screen(self) -> bytes:
+        """The screen rows as big-endian bytes, ``screen_width // 8`` per row."""
+        row_bytes = self.screen_width // 8
+        return b"".join(row.to_bytes(row_bytes, "big") for row in self.screen_rows)
+
+    @property
+    def screen_array(self) -> np.ndarray:
+        """The screen unpacked into a (screen_height, screen_width) uint8 0/1 array."""
+        if self.screen_width == 64:
+            packed = np.array(self.screen_rows, dtype=">u8").view(np.uint8)
+        else:
+            packed = np.frombuffer(self.packed_screen(), dtype=np.uint8)
+        return np.unpackbits(packed).reshape(self.screen_height, self.screen_width)
+
+    def get_framebuffer(self) -> bytes:
+        """Return the screen as screen_height rows of screen_width 0/1 bytes."""
+        return self.screen_array.tobytes()
+
+    def set_key(self, key: int, pressed: bool):
+        state = 1 if pressed else 0
+        if self.key_states[key] != state:
+            if self.input_probe is not None:
+                self.input_probe.key_changed(key)
+            if self.recorder is not None:
+                self.recorder.key_changed(self.frame_count, key, state)
+        self.key_states[key] = state
+
+    def seed_random(self, seed):
+        """Reseed the generator CXNN draws from."""
+        self.rng.seed(seed)
+
+    def start_recording(self, seed: int = None, cpu_hz: float = None) -> Movie:
+        """Record key changes from the current state on into a ``Movie``.
+
+        Reseeds CXNN (with a fresh seed when none is given) and restarts the
+        frame count, so ``movie.play_movie`` can reproduce the session.
+        """
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed_random(seed)
+        self.frame_count = 0
+        self.recorder = Movie(
+            seed,
+            cpu_hz if cpu_hz else self.instructions_per_frame * TIMER_HZ,
+            self.save_state(),
+            len(self.memory),
+        )
+        return self.recorder
+
+    def stop_recording(self) -> Movie:
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.finish(self.frame_count)
+        self.recorder = None
+        return recorder
+
+    def enable_input_probe(self) -> InputLatencyProbe:
+        """Measure key-change-to-read latency; swaps in probed key handlers."""
+        self.input_probe = InputLatencyProbe()
+        self.build_dispatch_tables()
+        self.invalidate_cache()
+        return self.input_probe
+
+    def disable_input_probe(self):
+        self.input_probe = None
+        self.build_dispatch_tables()
+        self.invalidate_cache()
+
+    def save_state(self, file=None) -> bytes:
+        """Serialize the whole machine into a versioned binary blob.
+
+        The blob is returned and, when ``file`` is given, also written to it.
+        """
+        stack = self.stack
+        state = b"".join(
+            (
+                STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION),
+                STATE_SCALARS.pack(
+                    self.index_register,
+                    self.program_counter,
+                    self.delay_timer,
+                    self.sound_timer,
+                    self.carry_flag,
+                    self.draw_flag,
+                    self.set_vx_to_vy,
+                    self.instructions_per_frame,
+                    self.cycles,
+                    len(stack),
+                    self.high_resolution,
+                    len(self.memory),
+                ),
+                self.memory,
+                bytes(self.variable_register),
+                self.key_states,
+                bytes(self.flag_registers),
+                self.packed_screen(),
+                struct.pack(f">{len(stack)}H", *stack),
+            )
+        )
+        if file is not None:
+            file.write(state)
+        return state
+
+    def load_state(self, state):
+        """Restore a blob from ``save_state``; ``state`` is bytes-like or a binary file."""
+        if hasattr(state, "read"):
+            state = state.read()
+
+        magic, version = STATE_HEADER.unpack_from(state, 0)
+        if magic != STATE_MAGIC:
+            raise ValueError("Not a CHIP-8 save state.")
+        if version not in (1, STATE_VERSION):
+            raise ValueError(f"Unsupported save state version {version}.")
+
+        offset = STATE_HEADER.size
+        if version == 1:
+            scalars = STATE_SCALARS_V1.unpack_from(state, offset) + (False, MEMORY_SIZE)
+            offset += STATE_SCALARS_V1.size
+        else:
+            scalars = STATE_SCALARS.unpack_from(state, offset)
+            offset += STATE_SCALARS.size
+        (
+            self.index_register,
+            self.program_counter,
+            self.delay_timer,
+            self.sound_timer,
+            self.carry_flag,
+            draw_flag,
+            set_vx_to_vy,
+            self.instructions_per_frame,
+            self.cycles,
+            stack_size,
+            high_resolution,
+            memory_size,
+        ) = scalars
+        if memory_size != len(self.memory):
+            raise ValueError(
+                f"Save state has {memory_size} bytes of memory, this machine has {len(self.memory)}."
+            )
+        self.set_resolution(bool(high_resolution))
+        self.draw_flag = bool(draw_flag)
+        self.set_vx_to_vy = bool(set_vx_to_vy)
+
+        memory = state[offset : offset + memory_size]
+        offset += memory_size
+        # forks of one snapshot usually share their code, keep the decode
+        # caches when memory is unchanged
+        if memory != self.memory:
+            self.memory[:] = memory
+            self.invalidate_cache()
+
+        self.variable_register[:] = state[offset : offset + REGISTER_COUNT]
+        offset += REGISTER_COUNT
+        self.key_states[:] = state[offset : offset + len(self.key_states)]
+        offset += len(self.key_states)
+        if version == 1:
+            self.screen_rows = list(STATE_ROWS_V1.unpack_from(state, offset))
+            offset += STATE_ROWS_V1.size
+        else:
+            self.flag_registers[:] = state[offset : offset + FLAG_REGISTER_COUNT]
+            offset += FLAG_REGISTER_COUNT
+            row_bytes = self.screen_width // 8
+            for row in range(self.screen_height):
+                self.screen_rows[row] = int.from_bytes(state[offset : offset + row_bytes], "big")
+                offset += row_bytes
+        self.stack = list(struct.unpack_from(f">{stack_size}H", state, offset))
 
-    def run(self, filename: pathlib.Path):
-        self.load_program(str(filename))
-        self.setup_display()
-        pygame.display.set_caption(filename.name)
+    def fetch(self) -> int:
+        instruction = (self.memory[self.program_counter] << 8) | self.memory[
+            self.program_counter + 1
+        ]
 
-        while self.running:
-            for _ in range(30):  # TODO: make configurable
-                self.decode_and_execute(instruction=self.fetch())
+        self.program_counter += 2
 
-            if self.sound_timer > 0:
-                self.beep.play()
+        return instruction
 
-            if self.sound_timer == 0:
-                self.beep.stop()
+    def cycle(self):
+        """Fetch, decode and execute one instruction through the predecode cache."""
+        program_counter = self.program_counter
+        operation = self.instruction_cache[program_counter]
+        if operation is None:
+            instruction = (self.memory[program_counter] << 8) | self.memory[
+                program_counter + 1
+            ]
+            operation = self.decode(instruction)
+            if self.skip_idle_loops:
+                operation = self.watch_idle_loop(program_counter, operation)
+            self.instruction_cache[program_counter] = operation
+
+        self.program_counter = program_counter + 2
+        operation()
+
+    def execute(self, count: int):
+        """Run ``count`` instructions on the configured execution engine."""
+        self.cycles += count
+        if self.profiler is not None:
+            self.profiler.execute(self, count)
+            return
+
+        if self.tracer is not None:
+            self.tracer.execute(self, count)
+            return
+
+        if self.translator is not None:
+            self.translator.execute(count)
+            return
+
+        cycle = self.cycle
+        executed = 0
+        try:
+            for executed in range(count):
+                cycle()
+        except IdleLoop as loop:
+            self.skip_idle_loop(loop, count - executed)
+
+    def watch_idle_loop(self, address: int, operation):
+        """Wrap ``operation`` in an idle check if a busy-wait loop starts at ``address``."""
+        idle_loop = self.idle_loop_test(address)
+        if idle_loop is None:
+            return operation
+        period, test = idle_loop
+        return partial(self.op_idle_loop, address, period, test, operation)
+
+    def idle_loop_test(self, address: int):
+        """Return (period, test) for a busy-wait loop at ``address``, or None.
+
+        ``test()`` is true while the loop cannot exit before the timers tick
+        or a key changes.
+        """
+        idle_loop = find_idle_loop(self.memory, address)
+        if idle_loop is None:
+            return None
+
+        period, kind, nn = idle_loop
+        if kind == WAIT_DELAY_EQUAL:
+            return period, partial(self.delay_timer_differs, nn)
+        if kind == WAIT_DELAY_CHANGE:
+            return period, partial(self.delay_timer_equals, nn)
+        if kind == WAIT_KEY:
+            return period, self.no_key_pressed
+        return period, self.always_idle
+
+    def delay_timer_differs(self, nn: int) -> bool:
+        return self.delay_timer != nn
+
+    def delay_timer_equals(self, nn: int) -> bool:
+        return self.delay_timer == nn
+
+    def no_key_pressed(self) -> bool:
+        return not any(self.key_states)
+
+    @staticmethod
+    def always_idle() -> bool:
+        return True
+
+    def op_idle_loop(self, head: int, period: int, test, operation):
+        if test():
+            raise IdleLoop(head, period, operation)
+        operation()
+
+    def skip_idle_loop(self, loop: IdleLoop, remaining: int):
+        """Account for ``remaining`` instructions of ``loop`` without running them all.
+
+        After its first iteration the loop returns to the same state every
+        ``period`` instructions, so only the first iteration and the partial
+        last one need to run.
+        """
+        head = loop.head
+        period = loop.period
+        self.program_counter = head
+        steps = remaining if remaining < period else period + remaining % period
+        self.idle_skipped += remaining - steps
+        for _ in range(steps):
+            if self.program_counter == head:
+                self.program_counter = head + 2
+                loop.operation()
+            else:
+                self.cycle()
+
+    def invalidate_cache(self, location: int = None, length: int = 1):
+        """Drop predecoded instructions overlapping ``length`` bytes at ``location``.
+
+        Without a location the whole cache is dropped.
+        """
+        if location is None:
+            self.instruction_cache = [None] * len(self.memory)
+            if self.translator is not None:
+                self.translator.invalidate()
+            return
+
+        # an instruction word starting at location - 1 also covers the first
+        # byte, and an idle loop check depends on the loop's whole body
+        end = location + length
+        start = location - (IDLE_LOOP_SPAN - 1)
+        if start < 0:
+            start = 0
+        self.instruction_cache[start:end] = [None] * (end - start)
+        # most writes land on data no block was traced from
+        translator = self.translator
+        if translator is not None and translator.covered.find(1, location, end) >= 0:
+            translator.invalidate(location, length)
+
+    def decode(self, instruction: int):
+        """Return a zero-argument callable that executes ``instruction``."""
+        x = (instruction & 0x0F00) >> 8
+        y = (instruction & 0x00F0) >> 4
+        n = instruction & 0x000F
+        nn = instruction & 0x00FF
+        nnn = instruction & 0x0FFF
 
-            self.handle_inputs()
+        group = instruction >> 12
+        if group == 0x0:
+            handler = self.system_handlers.get(instruction)
+            if handler is None and instruction & 0xFFE0 == 0x00C0:
+                # 00CN / 00DN - scrolls carry their row count in the low nibble
+                handler = self.system_handlers[instruction & 0xFFF0]
+        elif group == 0x8:
+            handler = self.arithmetic_handlers.get(n, self.op_noop)
+        elif group == 0xE:
+            handler = self.key_handlers.get(nn, self.op_noop)
+        elif group == 0xF:
+            handler = self.misc_handlers.get(nn, self.op_noop)
+        else:
+            handler = self.group_handlers[group]
 
-            # TODO: not working fine
-            if self.delay_timer > 0:
-                self.delay_timer -= 1
-            if self.sound_timer > 0:
-                self.sound_timer -= 1
+        if handler is None:
+            return partial(self.op_unknown, instruction & 0xF000)
 
-            if self.draw_flag:
-                self.display()
-                self.draw_flag = False
+        operands = OPERANDS[handler.__name__]
+        if operands == "":
+            operation = handler
+        else:
+            values = {"x": x, "y": y, "n": n, "nn": nn, "nnn": nnn}
+            operation = partial(handler, *(values[name] for name in operands.split(",")))
 
-            self.clock.tick(60)
+        if self.extended_memory and handler.__name__ in SKIP_HANDLERS:
+            return partial(self.op_long_skip, operation)
+        return operation
 
-        self.stop()
+    def decode_and_execute(self, instruction: int):
+        self.decode(instruction)()
+
+    def build_dispatch_tables(self):
+        # indexed by the high nibble; groups 0, 8, E and F are resolved
+        # through the sub-tables below
+        self.group_handlers = [
+            None,
+            self.op_1nnn,
+            self.op_2nnn,
+            self.op_3xnn,
+            self.op_4xnn,
+            self.op_5xy0,
+            self.op_6xnn,
+            self.op_7xnn,
+            None,
+            self.op_9xy0,
+            self.op_annn,
+            self.op_bnnn,
+            self.op_cxnn,
+            self.op_dxyn,
+            None,
+            None,
+        ]
+        self.system_handlers = {
+            0x00C0: self.op_00cn,
+            0x00D0: self.op_00dn,
+            0x00E0: self.op_00e0,
+            0x00EE: self.op_00ee,
+            0x00FB: self.op_00fb,
+            0x00FC: self.op_00fc,
+            0x00FD: self.op_00fd,
+            0x00FE: self.op_00fe,
+            0x00FF: self.op_00ff,
+        }
+        self.arithmetic_handlers = {
+            0x0: self.op_8xy0,
+            0x1: self.op_8xy1,
+            0x2: self.op_8xy2,
+            0x3: self.op_8xy3,
+            0x4: self.op_8xy4,
+            0x5: self.op_8xy5,
+            0x6: self.op_8xy6,
+            0x7: self.op_8xy7,
+            0xE: self.op_8xye,
+        }
+        self.key_handlers = {0x9E: self.op_ex9e, 0xA1: self.op_exa1}
+        self.misc_handlers = {
+            0x07: self.op_fx07,
+            0x0A: self.op_fx0a,
+            0x15: self.op_fx15,
+            0x18: self.op_fx18,
+            0x1E: self.op_fx1e,
+            0x29: self.op_fx29,
+            0x33: self.op_fx33,
+            0x30: self.op_fx30,
+            0x55: self.op_fx55,
+            0x65: self.op_fx65,
+            0x75: self.op_fx75,
+            0x85: self.op_fx85,
+        }
+        if self.extended_memory:
+            self.misc_handlers[0x00] = self.op_f000
+
+        # key reads report to the latency probe only while one is attached,
+        # so the normal handlers carry no extra check
+        if self.input_probe is not None:
+            self.key_handlers = {0x9E: self.op_ex9e_probed, 0xA1: self.op_exa1_probed}
+            self.misc_handlers[0x0A] = self.op_fx0a_probed
+
+    def op_noop(self, *_):
+        pass
+
+    def op_unknown(self, opcode: int):
+        print(f"Unknown opcode: {opcode:04X}")
+
+    def op_long_skip(self, skip):
+        # with extended memory a skip steps over all of a following F000 NNNN
+        program_counter = self.program_counter
+        skip()
+        if (
+            self.program_counter != program_counter
+            and self.memory[program_counter] == 0xF0
+            and self.memory[program_counter + 1] == 0x00
+        ):
+            self.program_counter += 2
+
+    # 00CN - scroll the screen down n rows
+    def op_00cn(self, n: int):
+        rows = self.screen_rows
+        self.screen_rows = [0] * n + rows[: len(rows) - n]
+        self.draw_flag = True
+
+    # 00DN - scroll the screen up n rows
+    def op_00dn(self, n: int):
+        self.screen_rows = self.screen_rows[n:] + [0] * n
+        self.draw_flag = True
+
+    # 00E0 - clear screen
+    def op_00e0(self):
+        self.screen_rows = [0] * self.screen_height
+
+    # 00FB - scroll the screen right 4 pixels
+    def op_00fb(self):
+        self.screen_rows = [row >> 4 for row in self.screen_rows]
+        self.draw_flag = True
+
+    # 00FC - scroll the screen left 4 pixels
+    def op_00fc(self):
+        row_mask = self.row_mask
+        self.screen_rows = [(row << 4) & row_mask for row in self.screen_rows]
+        self.draw_flag = True
+
+    # 00FD - exit; the interpreter halts on this instruction
+    def op_00fd(self):
+        self.program_counter -= 2
+
+    # 00FE - low resolution (64x32)
+    def op_00fe(self):
+        self.set_resolution(False)
+
+    # 00FF - high resolution (128x64)
+    def op_00ff(self):
+        self.set_resolution(True)
+
+    # 00EE - return from subroutine
+    def op_00ee(self):
+        if self.stack:
+            self.program_counter = self.stack.pop()
+
+    # 1NNN - jump to nnn
+    def op_1nnn(self, nnn: int):
+        self.program_counter = nnn
+
+    # 2NNN - call subroutine
+    def op_2nnn(self, nnn: int):
+        self.stack.append(self.program_counter)
+        self.program_counter = nnn
+
+    # 3XNN - skip one instruction if the value in vx is equal to NN
+    def op_3xnn(self, x: int, nn: int):
+        if self.variable_register[x] == nn:
+            self.program_counter += 2
+
+    # 4XNN - skip one instruction if the value in vx is not equal to NN
+    def op_4xnn(self, x: int, nn: int):
+        if self.variable_register[x] != nn:
+            self.program_counter += 2
+
+    # 5XY0 - skip if vx and vy are equal
+    def op_5xy0(self, x: int, y: int):
+        if self.variable_register[x] == self.variable_register[y]:
+            self.program_counter += 2
+
+    # 9XY0 - skip if vx and vy are not equal
+    def op_9xy0(self, x: int, y: int):
+        if self.variable_register[x] != self.variable_register[y]:
+            self.program_counter += 2
+
+    # 6XNN - set register vx
+    def op_6xnn(self, x: int, nn: int):
+        self.variable_register[x] = nn
+
+    # 7XNN - add nn to vx
+    def op_7xnn(self, x: int, nn: int):
+        self.variable_register[x] = (self.variable_register[x] + nn) & 0xFF
+
+    # 8XY0 - set vx to the value of vy
+    def op_8xy0(self, x: int, y: int):
+        self.variable_register[x] = self.variable_register[y]
+
+    # 8XY1 - vx is set to the binary OR of vx and vy
+    def op_8xy1(self, x: int, y: int):
+        self.variable_register[x] |= self.variable_register[y]
+
+    # 8XY2 - vx is set to the binary AND of vx and vy
+    def op_8xy2(self, x: int, y: int):
+        self.variable_register[x] &= self.variable_register[y]
+
+    # 8XY3 - vx is set to the binary XOR of vx and vy
+    def op_8xy3(self, x: int, y: int):
+        self.variable_register[x] ^= self.variable_register[y]
+
+    # 8XY4 - vx is set to the value of vx plus vy
+    def op_8xy4(self, x: int, y: int):
+        result = self.variable_register[x] + self.variable_register[y]
+        self.carry_flag = 1 if result > 0xFF else 0
+        self.variable_register[x] = result & 0xFF
+
+    # 8XY5 - vx is set to the value of vx minus vy
+    def op_8xy5(self, x: int, y: int):
+        vx = self.variable_register[x]
+        vy = self.variable_register[y]
+        self.carry_flag = 1 if vx >= vy else 0
+        self.variable_register[x] = (vx - vy) & 0xFF
+
+    # 8XY7 - vx is set to the value of vy minus vx
+    def op_8xy7(self, x: int, y: int):
+        vx = self.variable_register[x]
+        vy = self.variable_register[y]
+        self.carry_flag = 1 if vy >= vx else 0
+        self.variable_register[x] = (vy - vx) & 0xFF
+
+    # 8XY6 - shift vy 1 bit to the right and store in vx #TODO: wrong impl
+    def op_8xy6(self, x: int, y: int):
+        if self.set_vx_to_vy:
+            self.variable_register[x] = self.variable_register[y]
+
+        self.carry_flag = self.variable_register[x] & 0x01
+        self.variable_register[x] >>= 1
+
+    # 8XYE - shift vx to the left
+    def op_8xye(self, x: int, y: int):
+        self.carry_flag = self.variable_register[x] & 0x80 >> 7
+        self.variable_register[x] = (self.variable_register[y] << 1) & 0xFF
+
+    # ANNN - set index register to i
+    def op_annn(self, nnn: int):
+        self.index_register = nnn
+
+    # BNNN - jump with offset (v0)
+    def op_bnnn(self, nnn: int):
+        self.program_counter = nnn + self.variable_register[0]
+
+    # CXNN - generate a random number
+    def op_cxnn(self, x: int, nn: int):
+        self.variable_register[x] = self.rng.getrandbits(8) & nn
+
+    # DXYN - display / draw
+    def op_dxyn(self, x: int, y: int, n: int):
+        if n == 0 and self.high_resolution:
+            self.op_dxy0(x, y)
+            return
+
+        # each sprite row is rotated into place across the full row width,
+        # which gives the same wraparound as the old per-pixel modulo; in
+        # high resolution a row is just a wider int, so drawing costs the same
+        width = self.screen_width
+        height = self.screen_height
+        row_mask = self.row_mask
+        shift = self.variable_register[x] % width
+        y_coord = self.variable_register[y]
+        rows = self.screen_rows
 
-    def fetch(self) -> int:
-        first_opcode = self.access_memory(location=self.program_counter)
-        second_opcode = self.access_memory(location=self.program_counter + 1)
-        instruction = (first_opcode << 8) | second_opcode
+        self.carry_flag = 0
 
-        self.program_counter += 2
+        for row in range(n):
+            sprite = self.memory[self.index_register + row] << (width - 8)
+            sprite = ((sprite >> shift) | (sprite << (width - shift))) & row_mask
+            screen_y = (y_coord + row) % height
 
-        return instruction
+            if rows[screen_y] & sprite:
+                self.carry_flag = 1
 
-    def decode_and_execute(self, instruction: int):
-        opcode = instruction & 0xF000
-        x = (instruction & 0xF00) >> 8
-        y = (instruction & 0x00F0) >> 4
-        n = instruction & 0x000F
-        nn = instruction & 0x00FF
-        nnn = instruction & 0x0FFF
+            rows[screen_y] ^= sprite
 
-        # clear screen
-        if instruction == 0x00E0:
-            self.screen_array = [[0] * SCREEN_WIDTH for _ in range(SCREEN_HEIGHT)]
-
-        # 1NNN - jump to nnn
-        elif opcode == 0x1000:
-            self.program_counter = nnn
-
-        # 2NNN - call subroutine
-        elif opcode == 0x2000:
-            self.stack.append(self.program_counter)
-            self.program_counter = nnn
-
-        # 3XNN - skip one instruction if the value in vx is equal to NN
-        elif opcode == 0x3000:
-            if self.access_var_reg(location=x) == nn:
-                self.program_counter += 2
-
-        # 4XNN - skip one instruction if the value in vx is not equal to NN
-        elif opcode == 0x4000:
-            if self.access_var_reg(location=x) != nn:
-                self.program_counter += 2
-
-        # 5XY0 - skip if vx and vy are equal
-        elif opcode == 0x5000:
-            if self.access_var_reg(location=x) == self.access_var_reg(location=y):
-                self.program_counter += 2
-
-        # 9XY0 - skip if vx and vy are not equal
-        elif opcode == 0x9000:
-            if self.access_var_reg(location=x) != self.access_var_reg(location=y):
-                self.program_counter += 2
-
-        # 00EE - return from subroutine
-        elif instruction == 0x00EE:
-            if self.stack:
-                self.program_counter = self.stack.pop()
-
-        # 6XNN - set register vx
-        elif opcode == 0x6000:
-            # self.variable_register[x] = nn
-            self.modify_var_register(location=x, new_content=nn)
-
-        # 7XNN - add nn to vx
-        elif opcode == 0x7000:
-            # self.variable_register[x] = (self.variable_register[x] + nn) & 0xFF
-            self.modify_var_register(
-                location=x, new_content=(self.variable_register[x] + nn) & 0xFF
-            )
+        self.draw_flag = True
+
+    # DXY0 - draw a 16x16 sprite, two bytes per row (high resolution only)
+    def op_dxy0(self, x: int, y: int):
+        width = self.screen_width
+        height = self.screen_height
+        row_mask = self.row_mask
+        shift = self.variable_register[x] % width
+        y_coord = self.variable_register[y]
+        rows = self.screen_rows
+        memory = self.memory
+        address = self.index_register
+
+        self.carry_flag = 0
+
+        for row in range(16):
+            sprite = ((memory[address] << 8) | memory[address + 1]) << (width - 16)
+            sprite = ((sprite >> shift) | (sprite << (width - shift))) & row_mask
+            screen_y = (y_coord + row) % height
+            address += 2
+
+            if rows[screen_y] & sprite:
+                self.carry_flag = 1
+
+            rows[screen_y] ^= sprite
 
-        # 8xxx instructions:
-        elif opcode == 0x8000:
-            last_nibble = instruction & 0x000F
-
-            # 8XY0 - set vx to the value of vy
-            if last_nibble == 0x0:
-                self.modify_var_register(
-                    location=x, new_content=self.access_var_reg(location=y)
-                )
-
-            # 8XY1 - vx is set to the binary OR of vx and vy
-            if last_nibble == 0x1:
-                result = self.access_var_reg(x) | self.access_var_reg(y)
-                self.modify_var_register(location=x, new_content=result)
-
-            # 8XY2 - vx is set to the binary AND of vx and vy
-            if last_nibble == 0x2:
-                result = self.access_var_reg(x) & self.access_var_reg(y)
-                self.modify_var_register(location=x, new_content=result)
-
-            # 8XY3 - vx is set to the binary OR of vx and vy
-            if last_nibble == 0x3:
-                result = self.access_var_reg(x) ^ self.access_var_reg(y)
-                self.modify_var_register(location=x, new_content=result)
-
-            # 8XY4 - vx is set to the value of vx plus vy
-            if last_nibble == 0x4:
-                result = self.access_var_reg(x) + self.access_var_reg(y)
-                self.carry_flag = 1 if result > 0xFF else 0
-                self.modify_var_register(location=x, new_content=result & 0xFF)
-
-            # 8XY5 - vx is set to the value of vx minus vy
-            if last_nibble == 0x5:
-                result = self.access_var_reg(x) - self.access_var_reg(y)
-                self.carry_flag = (
-                    1 if self.access_var_reg(x) >= self.access_var_reg(y) else 0
-                )
-                self.modify_var_register(location=x, new_content=result & 0xFF)
-
-            # 8XY7 - vx is set to the value of vy minus vx
-            if last_nibble == 0x7:
-                result = self.access_var_reg(y) - self.access_var_reg(x)
-                self.carry_flag = (
-                    1 if self.access_var_reg(y) >= self.access_var_reg(x) else 0
-                )
-                self.modify_var_register(location=x, new_content=result)
-
-            # 8XY6 - shift vy 1 bit to the right and store in vx #TODO: wrong impl
-            if last_nibble == 0x6:
-                if self.set_vx_to_vy:
-                    self.modify_var_register(
-                        location=x, new_content=self.access_var_reg(y)
-                    )
-
-                shifted_out_bit = self.access_var_reg(x) & 0x01
-                self.carry_flag = shifted_out_bit
-                self.modify_var_register(
-                    location=x, new_content=self.access_var_reg(x) >> 1
-                )
-
-            # 8XYE - shift vx to the left
-            if last_nibble == 0xE:
-                shifted_out_bit_e = self.access_var_reg(x) & 0x80 >> 7
-                self.carry_flag = shifted_out_bit_e
-
-                shifted_e = (self.access_var_reg(y) << 1) & 0xFF
-                self.modify_var_register(location=x, new_content=shifted_e)
-
-        # ANNN - set index register to i
-        elif opcode == 0xA000:
-            self.index_register = nnn
-
-        # BNNN - jump with offset (v0)
-        elif opcode == 0xB000:
-            self.program_counter = nnn + self.access_var_reg(0)
-
-        # CXNN - generate a random number
-        elif opcode == 0xC000:
-            random_num = random.randint(0, 255)
-            self.modify_var_register(location=x, new_content=random_num & nn)
-
-        # DXYN - display / draw
-        elif opcode == 0xD000:
-            x_coord = self.access_var_reg(x)
-            y_coord = self.access_var_reg(y)
-
-            self.carry_flag = 0
-
-            for row in range(n):
-                pixel = self.access_memory(self.index_register + row)
-
-                for col in range(8):
-                    if (pixel & (0x80 >> col)) != 0:
-                        screen_y = (y_coord + row) % 32
-                        screen_x = (x_coord + col) % 64
-
-                        if self.screen_array[screen_y][screen_x] == 1:
-                            self.carry_flag = 1
-
-                        self.screen_array[screen_y][screen_x] ^= 1
-
-            self.draw_flag = True
-
-        elif opcode == 0xE000:
-            last_byte = instruction & 0x00FF
-
-            # EX9E - skip if key vx is pressed
-            if last_byte == 0x9E:
-                if self.key_states[self.access_var_reg(x)] == 1:
-                    self.program_counter += 2
-
-            # EXA1 - skip if key vx is not pressed
-            if last_byte == 0xA1:
-                if self.key_states[self.access_var_reg(x)] == 0:
-                    self.program_counter += 2
-
-        elif opcode == 0xF000:
-            last_byte = instruction & 0x00FF
-
-            # FX07 - set vx to the current value of the delay timer
-            if last_byte == 0x07:
-                self.modify_var_register(location=x, new_content=self.delay_timer)
-
-            elif last_byte == 0x15:
-                self.delay_timer = self.access_var_reg(x)
-
-            elif last_byte == 0x18:
-                self.sound_timer = self.access_var_reg(x)
-
-            # FX1E - add to index
-            elif last_byte == 0x1E:
-                self.index_register = (
-                    self.index_register + self.access_var_reg(x) & 0xFFF
-                )
-
-            # FX0A - get key
-            elif last_byte == 0x0A:
-                for index, key_state in enumerate(self.key_states):
-                    if key_state == 1:
-                        self.modify_var_register(location=x, new_content=index)
-                        break
-                else:
-                    self.program_counter -= 2
-
-            # FX29 - font character
-            elif last_byte == 0x29:
-                self.index_register = FONT_START_ADDRESS + self.access_var_reg(x) * 5
-
-            # FX33
-            elif last_byte == 0x33:
-                vx = self.access_var_reg(x)
-                hundreds = (vx // 100) % 10
-                tens = (vx // 10) % 10
-                ones = vx % 10
-
-                self.modify_memory(location=self.index_register, new_content=hundreds)
-                self.modify_memory(location=self.index_register + 1, new_content=tens)
-                self.modify_memory(location=self.index_register + 2, new_content=ones)
-
-            # FX55 - store registers to memory
-            elif last_byte == 0x55:
-                for i in range(x + 1):
-                    self.modify_memory(
-                        location=self.index_register + i,
-                        new_content=self.access_var_reg(i),
-                    )
-                self.index_register = x + 1
-
-            # FX65 - load registers to memory
-            elif last_byte == 0x65:
-                for i in range(x + 1):
-                    self.modify_var_register(
-                        location=i,
-                        new_content=self.access_memory(self.index_register + i),
-                    )
-                self.index_register = x + 1
+        self.draw_flag = True
 
+    # EX9E - skip if key vx is pressed
+    def op_ex9e(self, x: int):
+        if self.key_states[self.variable_register[x]] == 1:
+            self.program_counter += 2
+
+    # EXA1 - skip if key vx is not pressed
+    def op_exa1(self, x: int):
+        if self.key_states[self.variable_register[x]] == 0:
+            self.program_counter += 2
+
+    def op_ex9e_probed(self, x: int):
+        self.input_probe.key_read(self.variable_register[x])
+        self.op_ex9e(x)
+
+    def op_exa1_probed(self, x: int):
+        self.input_probe.key_read(self.variable_register[x])
+        self.op_exa1(x)
+
+    # FX07 - set vx to the current value of the delay timer
+    def op_fx07(self, x: int):
+        self.variable_register[x] = self.delay_timer
+
+    def op_fx15(self, x: int):
+        self.delay_timer = self.variable_register[x]
+
+    def op_fx18(self, x: int):
+        self.sound_timer = self.variable_register[x]
+
+    # FX1E - add to index
+    def op_fx1e(self, x: int):
+        self.index_register = self.index_register + self.variable_register[x] & self.address_mask
+
+    # FX0A - get key
+    def op_fx0a(self, x: int):
+        for index, key_state in enumerate(self.key_states):
+            if key_state == 1:
+                self.variable_register[x] = index
+                break
         else:
-            print(f"Unknown opcode: {opcode:04X}")
-
-    def setup_display(self):
-        self.internal_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        scale_factor = 15
-        self.display_width, self.display_height = (
-            SCREEN_WIDTH * scale_factor,
-            SCREEN_HEIGHT * scale_factor,
-        )
-        self.pixels = pygame.surfarray.pixels3d(self.internal_surface)
-        self.screen = pygame.display.set_mode((self.display_width, self.display_height))
-
-    def display(self):
-        self.screen.fill((255, 255, 255))
-        for x in range(SCREEN_WIDTH):
-            for y in range(SCREEN_HEIGHT):
-                try:
-                    if self.screen_array[y][x] == 0:
-                        self.pixels[x, y] = (0, 0, 0)
-                    else:
-                        self.pixels[x, y] = (255, 255, 255)
-                except IndexError:
-                    print(f"IndexError: Tried to access ({x}, {y})")
-
-        scaled_surface = pygame.transform.scale(
-            self.internal_surface, (self.display_width, self.display_height)
-        )
-        self.screen.blit(scaled_surface, (0, 0))
-        pygame.display.flip()
-
-    def handle_inputs(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.running = False
-
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_1:
-                    self.key_states[0] = 1
-                if event.key == pygame.K_2:
-                    self.key_states[1] = 1
-                if event.key == pygame.K_3:
-                    self.key_states[2] = 1
-                if event.key == pygame.K_4:
-                    self.key_states[3] = 1
-                if event.key == pygame.K_q:
-                    self.key_states[4] = 1
-                if event.key == pygame.K_w:
-                    self.key_states[5] = 1
-                if event.key == pygame.K_e:
-                    self.key_states[6] = 1
-                if event.key == pygame.K_r:
-                    self.key_states[7] = 1
-                if event.key == pygame.K_a:
-                    self.key_states[8] = 1
-                if event.key == pygame.K_s:
-                    self.key_states[9] = 1
-                if event.key == pygame.K_d:
-                    self.key_states[10] = 1
-                if event.key == pygame.K_f:
-                    self.key_states[11] = 1
-                if event.key == pygame.K_z:
-                    self.key_states[12] = 1
-                if event.key == pygame.K_x:
-                    self.key_states[13] = 1
-                if event.key == pygame.K_c:
-                    self.key_states[14] = 1
-                if event.key == pygame.K_v:
-                    self.key_states[15] = 1
-
-            if event.type == pygame.KEYUP:
-                if event.key == pygame.K_1:
-                    self.key_states[0] = 0
-                if event.key == pygame.K_2:
-                    self.key_states[1] = 0
-                if event.key == pygame.K_3:
-                    self.key_states[2] = 0
-                if event.key == pygame.K_4:
-                    self.key_states[3] = 0
-                if event.key == pygame.K_q:
-                    self.key_states[4] = 0
-                if event.key == pygame.K_w:
-                    self.key_states[5] = 0
-                if event.key == pygame.K_e:
-                    self.key_states[6] = 0
-                if event.key == pygame.K_r:
-                    self.key_states[7] = 0
-                if event.key == pygame.K_a:
-                    self.key_states[8] = 0
-                if event.key == pygame.K_s:
-                    self.key_states[9] = 0
-                if event.key == pygame.K_d:
-                    self.key_states[10] = 0
-                if event.key == pygame.K_f:
-                    self.key_states[11] = 0
-                if event.key == pygame.K_z:
-                    self.key_states[12] = 0
-                if event.key == pygame.K_x:
-                    self.key_states[13] = 0
-                if event.key == pygame.K_c:
-                    self.key_states[14] = 0
-                if event.key == pygame.K_v:
-                    self.key_states[15] = 0
+            self.program_counter -= 2
+
+    def op_fx0a_probed(self, x: int):
+        program_counter = self.program_counter
+        self.op_fx0a(x)
+        if self.program_counter == program_counter:
+            self.input_probe.key_read(self.variable_register[x])
+
+    # FX29 - font character
+    def op_fx29(self, x: int):
+        self.index_register = FONT_START_ADDRESS + self.variable_register[x] * 5
+
+    # FX30 - large (8x10) font character
+    def op_fx30(self, x: int):
+        self.index_register = BIG_FONT_START_ADDRESS + (self.variable_register[x] & 0xF) * 10
+
+    # FX33
+    def op_fx33(self, x: int):
+        vx = self.variable_register[x]
+        hundreds = (vx // 100) % 10
+        tens = (vx // 10) % 10
+        ones = vx % 10
+
+        self.write_memory(self.index_register, (hundreds, tens, ones))
+
+    # FX55 - store registers to memory
+    def op_fx55(self, x: int):
+        self.write_memory(self.index_register, self.variable_register[: x + 1])
+        self.index_register = x + 1
+
+    # FX65 - load registers to memory
+    def op_fx65(self, x: int):
+        start = self.index_register
+        if start + x + 1 > len(self.memory):
+            raise IndexError
+
+        self.variable_register[: x + 1] = self.memory[start : start + x + 1]
+        self.index_register = x + 1
+
+    # FX75 - save v0 to vx in the flag registers
+    def op_fx75(self, x: int):
+        self.flag_registers[: x + 1] = self.variable_register[: x + 1]
+
+    # FX85 - load v0 to vx from the flag registers
+    def op_fx85(self, x: int):
+        self.variable_register[: x + 1] = self.flag_registers[: x + 1]
+
+    # F000 NNNN - load a 16-bit address into the index register (extended memory only)
+    def op_f000(self):
+        program_counter = self.program_counter
+        self.index_register = (self.memory[program_counter] << 8) | self.memory[program_counter + 1]
+        self.program_counter = program_counter + 2
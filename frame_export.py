@@ -0,0 +1,386 @@
+"""Capture emulator output to PNG sequences, animated GIFs or a raw 1-bit stream.
+
+A ``FrameExporter`` is the frame sink the run loop pushes into; it copies
+the packed screen, drops frames identical to the last one and hands the rest
+to an encoder running on its own thread through a bounded queue. When the
+encoder falls behind, new frames are dropped (and counted) rather than
+blocking emulation.
+
+    exporter = open_exporter("run.gif")
+    FrameScheduler(emulator, frame_sink=exporter).run_ticks(600)
+    exporter.close()
+
+The raw format (``.ch8v``) is a header followed by one zlib stream of
+records: frame number, row bytes, height and the packed rows XORed with the
+previous record's, so unchanged pixels cost next to nothing and hours of
+play stay at a few MB. ``read_raw`` turns it back into frames.
+"""
+import os
+import queue
+import struct
+import threading
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from rewind import xor_bytes
+from scheduler import TIMER_HZ
+
+# frames waiting for the encoder before new ones are dropped
+DEFAULT_QUEUE_SIZE = 256
+
+RAW_MAGIC = b"CH8V"
+RAW_VERSION = 1
+RAW_HEADER = struct.Struct(">4sB")
+# frame number, bytes per row, rows
+RAW_RECORD = struct.Struct(">IBB")
+# records between sync flushes, so a killed run still leaves a readable file
+RAW_SYNC_INTERVAL = 600
+
+# black and white, as in the frontends
+GIF_PALETTE = bytes((0, 0, 0, 255, 255, 255))
+# LZW codes for 2-colour images start from 2-bit pixel values (the GIF minimum)
+GIF_MIN_CODE_SIZE = 2
+GIF_CLEAR_CODE = 4
+GIF_END_CODE = 5
+GIF_MAX_CODES = 4096
+
+
+def unpack_frame(width: int, height: int, packed: bytes) -> np.ndarray:
+    """Packed 1-bit rows -> (height, width) uint8 0/1 array."""
+    return np.unpackbits(np.frombuffer(packed, dtype=np.uint8)).reshape(height, width)
+
+
+def resize_pixels(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Resize a 0/1 pixel array to (height, width) by whole-pixel repeat or stride."""
+    for axis, size in ((0, height), (1, width)):
+        current = pixels.shape[axis]
+        if size > current:
+            pixels = np.repeat(pixels, size // current, axis=axis)
+        elif size < current:
+            pixels = pixels.take(np.arange(0, current, current // size), axis=axis)
+    return pixels
+
+
+class RawEncoder:
+    """Writes the compact ``.ch8v`` 1-bit-per-pixel stream."""
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "wb")
+        self.file.write(RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION))
+        self.compressor = zlib.compressobj()
+        self.previous = None
+        self.records = 0
+
+    def write(self, frame: int, width: int, height: int, packed: bytes):
+        previous = self.previous
+        self.previous = packed
+        # XOR against the previous frame; zlib squeezes the zero runs
+        if previous is not None and len(previous) == len(packed):
+            packed = xor_bytes(packed, previous)
+
+        record = RAW_RECORD.pack(frame, width // 8, height) + packed
+        self.file.write(self.compressor.compress(record))
+        self.records += 1
+        if self.records % RAW_SYNC_INTERVAL == 0:
+            self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def close(self):
+        self.file.write(self.compressor.flush())
+        self.file.close()
+
+
+def read_raw(path: str) -> Iterator[Tuple[int, int, int, bytes]]:
+    """Yield (frame, width, height, packed rows) from a ``.ch8v`` file.
+
+    A file cut short (e.g. a killed CI job) yields every complete record.
+    """
+    with open(path, "rb") as file:
+        magic, version = RAW_HEADER.unpack(file.read(RAW_HEADER.size))
+        if magic != RAW_MAGIC:
+            raise ValueError("Not a CHIP-8 frame stream.")
+        if version != RAW_VERSION:
+            raise ValueError(f"Unsupported frame stream version {version}.")
+        decompressor = zlib.decompressobj()
+        data = b""
+        previous = None
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            data += decompressor.decompress(chunk)
+            offset = 0
+            while len(data) - offset >= RAW_RECORD.size:
+                frame, row_bytes, height = RAW_RECORD.unpack_from(data, offset)
+                end = offset + RAW_RECORD.size + row_bytes * height
+                if end > len(data):
+                    break
+                packed = data[offset + RAW_RECORD.size : end]
+                if previous is not None and len(previous) == len(packed):
+                    packed = xor_bytes(packed, previous)
+                previous = packed
+                offset = end
+                yield frame, row_bytes * 8, height, packed
+            data = data[offset:]
+
+
+class PngSequenceEncoder:
+    """Writes every frame to ``directory/frame_NNNNNNNN.png`` (1-bit grayscale)."""
+
+    def __init__(self, directory: str, scale: int = 1) -> None:
+        self.directory = directory
+        self.scale = scale
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame: int, width: int, height: int, packed: bytes):
+        if self.scale != 1:
+            pixels = resize_pixels(
+                unpack_frame(width, height, packed), width * self.scale, height * self.scale
+            )
+            height, width = pixels.shape
+            packed = np.packbits(pixels, axis=1).tobytes()
+
+        path = os.path.join(self.directory, f"frame_{frame:08d}.png")
+        with open(path, "wb") as file:
+            file.write(encode_png(width, height, packed))
+
+    def close(self):
+        pass
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return b"".join(
+        (
+            struct.pack(">I", len(data)),
+            kind,
+            data,
+            struct.pack(">I", zlib.crc32(kind + data)),
+        )
+    )
+
+
+def encode_png(width: int, height: int, packed: bytes) -> bytes:
+    """A 1-bit grayscale PNG of packed rows (MSB first, as the screen stores them)."""
+    row_bytes = (width + 7) // 8
+    # filter type 0 in front of every scanline
+    scanlines = b"".join(
+        b"\x00" + packed[row * row_bytes : (row + 1) * row_bytes] for row in range(height)
+    )
+    return b"".join(
+        (
+            b"\x89PNG\r\n\x1a\n",
+            png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)),
+            png_chunk(b"IDAT", zlib.compress(scanlines)),
+            png_chunk(b"IEND", b""),
+        )
+    )
+
+
+class GifEncoder:
+    """Writes an animated, looping GIF; each frame is shown until the next one.
+
+    After the first frame only the rectangle that changed is stored, drawn
+    over the previous frame.
+    """
+
+    def __init__(self, path: str, scale: int = 2) -> None:
+        self.file = open(path, "wb")
+        self.scale = scale
+        self.size = None
+        # a frame's delay is only known once the next one arrives
+        self.pending: Optional[Tuple[int, np.ndarray]] = None
+        # what the animation shows after the frames written so far
+        self.shown: Optional[np.ndarray] = None
+
+    def write(self, frame: int, width: int, height: int, packed: bytes):
+        pixels = unpack_frame(width, height, packed)
+        if self.size is None:
+            # later frames in another resolution are resized to the first one's size
+            self.size = (width * self.scale, height * self.scale)
+            self.write_header()
+        self.flush_pending(frame)
+        self.pending = (frame, resize_pixels(pixels, *self.size))
+
+    def write_header(self):
+        width, height = self.size
+        self.file.write(b"GIF89a")
+        # logical screen with a 2-colour global colour table
+        self.file.write(struct.pack("<HHBBB", width, height, 0x80, 0, 0))
+        self.file.write(GIF_PALETTE)
+        # NETSCAPE2.0 application extension: loop forever
+        self.file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def flush_pending(self, next_frame: int):
+        if self.pending is None:
+            return
+        frame, pixels = self.pending
+        self.pending = None
+
+        # GIF delays are in 1/100 s; rounding the absolute times keeps the
+        # error from adding up over the animation
+        delay = max(1, round(next_frame * 100 / TIMER_HZ) - round(frame * 100 / TIMER_HZ))
+
+        left, top, right, bottom = 0, 0, 1, 1
+        if self.shown is None:
+            bottom, right = pixels.shape
+        else:
+            changed = pixels != self.shown
+            rows = np.flatnonzero(changed.any(axis=1))
+            if len(rows):
+                columns = np.flatnonzero(changed.any(axis=0))
+                top, bottom = rows[0], rows[-1] + 1
+                left, right = columns[0], columns[-1] + 1
+        self.shown = pixels
+
+        # graphic control: disposal method 1 (leave the frame in place) and the delay
+        self.file.write(b"\x21\xf9\x04\x04" + struct.pack("<H", delay) + b"\x00\x00")
+        self.file.write(
+            b"\x2c" + struct.pack("<HHHHB", left, top, right - left, bottom - top, 0)
+        )
+        self.file.write(bytes((GIF_MIN_CODE_SIZE,)))
+        data = gif_lzw(pixels[top:bottom, left:right])
+        for start in range(0, len(data), 255):
+            block = data[start : start + 255]
+            self.file.write(bytes((len(block),)) + block)
+        self.file.write(b"\x00")
+
+    def close(self):
+        if self.pending is not None:
+            self.flush_pending(self.pending[0] + 1)
+        if self.size is not None:
+            self.file.write(b"\x3b")
+        self.file.close()
+
+
+def gif_lzw(pixels: np.ndarray) -> bytes:
+    """Variable-width LZW image data for 0/1 pixels, as GIF decoders expect it.
+
+    Codes start at 3 bits and widen as the code table grows; once it is full
+    (4096 codes) a clear code starts a fresh table.
+    """
+    values = pixels.reshape(-1).tolist()
+    table: Dict[int, int] = {}
+    next_code = GIF_END_CODE + 1
+    width = GIF_MIN_CODE_SIZE + 1
+    # codes are packed least significant bit first
+    accumulator = GIF_CLEAR_CODE
+    bit_count = width
+    output = bytearray()
+
+    prefix = values[0]
+    for value in values[1:]:
+        key = prefix << 8 | value
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+
+        accumulator |= prefix << bit_count
+        bit_count += width
+        if next_code < GIF_MAX_CODES:
+            table[key] = next_code
+            if next_code == 1 << width:
+                width += 1
+            next_code += 1
+        else:
+            accumulator |= GIF_CLEAR_CODE << bit_count
+            bit_count += width
+            table.clear()
+            next_code = GIF_END_CODE + 1
+            width = GIF_MIN_CODE_SIZE + 1
+        while bit_count >= 8:
+            output.append(accumulator & 0xFF)
+            accumulator >>= 8
+            bit_count -= 8
+        prefix = value
+
+    accumulator |= prefix << bit_count
+    bit_count += width
+    # the decoder adds the entry for this last code too before reading the end code
+    if next_code == 1 << width and width < 12:
+        width += 1
+    accumulator |= GIF_END_CODE << bit_count
+    bit_count += width
+    output += accumulator.to_bytes((bit_count + 7) // 8, "little")
+    return bytes(output)
+
+
+class FrameExporter:
+    """Frame sink feeding an encoder on a background thread.
+
+    ``push`` is called by the run loop after frames that drew; it costs one
+    packed copy of the screen and never blocks. Runs that are not real-time
+    (replaying a movie headlessly) can pass ``wait_when_full`` to keep every
+    frame instead. ``close`` drains the queue and finishes the file.
+    """
+
+    def __init__(
+        self, encoder, queue_size: int = DEFAULT_QUEUE_SIZE, wait_when_full: bool = False
+    ) -> None:
+        self.encoder = encoder
+        self.wait_when_full = wait_when_full
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.last_packed = None
+        self.frames = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.encode_frames, daemon=True)
+        self.thread.start()
+
+    def push(self, emulator):
+        packed = emulator.packed_screen()
+        if packed == self.last_packed:
+            self.duplicates += 1
+            return
+
+        try:
+            self.queue.put(
+                (emulator.frame_count, emulator.screen_width, emulator.screen_height, packed),
+                block=self.wait_when_full,
+            )
+        except queue.Full:
+            # the next distinct frame is still compared against the last one queued
+            self.dropped += 1
+            return
+        self.last_packed = packed
+        self.frames += 1
+
+    def encode_frames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.encoder.write(*item)
+            except Exception as e:
+                # keep draining so push never sees a full queue because of it
+                self.error = e
+
+    def close(self):
+        """Finish encoding; raises whatever the encoder failed with."""
+        self.queue.put(None)
+        self.thread.join()
+        self.encoder.close()
+        if self.error is not None:
+            raise self.error
+
+    def report(self) -> dict:
+        return {"frames": self.frames, "duplicates": self.duplicates, "dropped": self.dropped}
+
+
+def open_exporter(
+    path: str,
+    scale: int = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    wait_when_full: bool = False,
+) -> FrameExporter:
+    """Pick the encoder from ``path``: ``.gif``, ``.ch8v`` (raw), else a PNG directory."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".gif":
+        encoder = GifEncoder(path, scale=scale or 2)
+    elif extension == ".ch8v":
+        encoder = RawEncoder(path)
+    else:
+        encoder = PngSequenceEncoder(path, scale=scale or 1)
+    return FrameExporter(encoder, queue_size=queue_size, wait_when_full=wait_when_full)
@@ -0,0 +1,278 @@
+import pathlib
+import time
+from typing import Dict
+
+import numpy as np
+import pygame
+
+from audio import Beeper
+from constants import DEFAULT_KEYMAP, SCREEN_WIDTH, SCREEN_HEIGHT
+from emulator import Emulator
+from frame_export import open_exporter
+from rewind import RewindBuffer
+from scheduler import FrameScheduler
+
+PALETTE = np.array([(0, 0, 0), (255, 255, 255)], dtype=np.uint8)
+REWIND_KEY = pygame.K_BACKSPACE
+TURBO_KEY = pygame.K_TAB
+
+
+class PygameFrontend:
+    """Interactive pygame window, audio and keyboard on top of an ``Emulator``."""
+
+    def __init__(
+        self,
+        emulator: Emulator = None,
+        profile_path: str = None,
+        rewind_seconds: float = 10,
+        cpu_hz: float = None,
+        turbo_render_interval: int = 10,
+        keymap: Dict[str, int] = None,
+        input_slices: int = 1,
+        measure_input_latency: bool = False,
+        record_path: str = None,
+        export_path: str = None,
+        sound: bool = True,
+        **emulator_options,
+    ) -> None:
+        self.emulator = emulator if emulator is not None else Emulator(**emulator_options)
+        # when set, profile the session and write the report here on exit
+        self.profile_path = profile_path
+        if profile_path:
+            self.emulator.enable_profiling()
+        self.screen = None
+        self.pixels = None
+        self.display_height = None
+        self.display_width = None
+        self.internal_surface = None
+        self.scale_factor = None
+        self.presented_rows = None
+        self.running = True
+        # when set, record a movie of the session and write it here on exit;
+        # rewinding and sub-frame input would make it unreplayable, so both
+        # are off while recording
+        self.record_path = record_path
+        if record_path:
+            rewind_seconds = 0
+            input_slices = 1
+        # when set, every frame that drew is also encoded (on a background
+        # thread) to a .gif, a raw .ch8v stream or a folder of PNGs
+        self.exporter = open_exporter(export_path) if export_path else None
+        # holding backspace steps back through the last rewind_seconds of play
+        self.rewind_buffer = RewindBuffer(seconds=rewind_seconds) if rewind_seconds else None
+        self.rewinding = False
+        # input_slices > 1 also samples input between parts of each frame's
+        # instructions, so key checks see presses sooner
+        self.scheduler = FrameScheduler(
+            self.emulator,
+            cpu_hz=cpu_hz,
+            input_slices=input_slices,
+            poll_input=self.handle_inputs if input_slices > 1 else None,
+            frame_sink=self.exporter,
+        )
+        if measure_input_latency:
+            self.emulator.enable_input_probe()
+        # while turbo is on (tab held) only every turbo_render_interval-th frame is drawn
+        self.turbo = False
+        self.turbo_render_interval = turbo_render_interval
+
+        # only video and events here; the mixer starts when the buzzer first sounds
+        pygame.display.init()
+        self.keymap = self.build_keymap(keymap or DEFAULT_KEYMAP)
+        self.beeper = Beeper(enabled=sound)
+        self.clock = pygame.time.Clock()
+
+    @staticmethod
+    def build_keymap(keymap: Dict[str, int]) -> Dict[int, int]:
+        """Turn a key-name keymap into a pygame key code -> CHIP-8 key lookup table."""
+        return {pygame.key.key_code(name): key for name, key in keymap.items()}
+
+    def stop(self):
+        if self.running:
+            self.running = False
+
+        self.emulator.reset()
+        self.beeper.stop()
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.clear()
+
+        pygame.display.quit()
+        pygame.quit()
+
+    def run(self, filename: pathlib.Path):
+        emulator = self.emulator
+        emulator.load_program(str(filename))
+        self.setup_display()
+        pygame.display.set_caption(filename.name)
+        self.scheduler.reset()
+        if self.record_path:
+            emulator.start_recording(cpu_hz=self.scheduler.cpu_hz)
+
+        while self.running:
+            if self.rewinding and self.rewind_buffer is not None:
+                self.rewind_frame()
+                # game time stands still while rewinding; do not catch up on
+                # it once the key is released
+                self.scheduler.last_time = time.perf_counter()
+                self.clock.tick(60)
+            elif self.turbo:
+                self.run_frame(turbo=True)
+                # keep measuring so the scheduler does not try to catch up
+                # on the time spent in turbo once it is released
+                self.scheduler.last_time = time.perf_counter()
+                self.clock.tick()
+            else:
+                self.run_frame()
+                self.clock.tick(60)
+
+        if emulator.profiler is not None and self.profile_path:
+            emulator.profiler.dump(self.profile_path)
+
+        if emulator.recorder is not None:
+            emulator.stop_recording().save(self.record_path)
+
+        if emulator.input_probe is not None:
+            print(f"Input latency: {emulator.input_probe.report()}")
+
+        if self.exporter is not None:
+            self.exporter.close()
+            print(f"Frame export: {self.exporter.report()}")
+
+        self.stop()
+
+    def run_frame(self, turbo: bool = False):
+        emulator = self.emulator
+        profiler = emulator.profiler
+        if profiler is not None:
+            profiler.start_frame()
+
+        # turbo runs a fixed batch of 60 Hz ticks flat out and only renders
+        # the last one; otherwise the scheduler catches up with real time
+        if turbo:
+            ticks = self.turbo_render_interval
+            self.scheduler.run_ticks(ticks)
+        else:
+            ticks = self.scheduler.advance()
+
+        self.beeper.set_playing(emulator.sound_timer > 0)
+
+        # the scheduler records the "execute" and "timers" sections itself
+        if profiler is not None:
+            profiler.add_ticks(ticks)
+            started = time.perf_counter()
+
+        self.handle_inputs()
+
+        if profiler is not None:
+            handled = time.perf_counter()
+            profiler.add_time("input", handled - started)
+
+        # a pass that ran no ticks would only store the same state again
+        if self.rewind_buffer is not None and ticks:
+            self.rewind_buffer.push(emulator)
+
+        if emulator.draw_flag:
+            self.display()
+            emulator.draw_flag = False
+
+        if profiler is not None:
+            profiler.add_time("display", time.perf_counter() - handled)
+            profiler.end_frame()
+
+    def rewind_frame(self):
+        """Step one frame back in time while the rewind key is held."""
+        self.beeper.stop()
+        if self.rewind_buffer.rewind(self.emulator):
+            self.display()
+        self.handle_inputs()
+
+    def setup_display(self):
+        # the window keeps its size when a ROM switches resolution; only the
+        # internal surface follows the emulator
+        self.scale_factor = 15
+        self.display_width, self.display_height = (
+            SCREEN_WIDTH * self.scale_factor,
+            SCREEN_HEIGHT * self.scale_factor,
+        )
+        self.screen = pygame.display.set_mode((self.display_width, self.display_height))
+        self.setup_surface(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def setup_surface(self, width: int, height: int):
+        self.internal_surface = pygame.Surface((width, height))
+        self.pixels = pygame.surfarray.pixels3d(self.internal_surface)
+        self.presented_rows = None
+
+    def display(self):
+        emulator = self.emulator
+        rows = emulator.screen_rows
+        if rows == self.presented_rows:
+            # e.g. a sprite drawn twice to erase and redraw it: nothing to present
+            return
+
+        width = emulator.screen_width
+        height = emulator.screen_height
+        if self.internal_surface.get_size() != (width, height):
+            self.setup_surface(width, height)
+
+        dirty_runs = self.dirty_runs(rows)
+        self.presented_rows = list(rows)
+
+        # one palette lookup maps the 0/1 framebuffer to RGB; surfarray is
+        # indexed (x, y), hence the transpose
+        screen_array = emulator.screen_array
+        updated = []
+        for first, last in dirty_runs:
+            self.pixels[:, first:last] = PALETTE[screen_array[first:last].T]
+
+            # the display surface keeps its content between frames, so only
+            # the changed band is rescaled and blitted
+            band = pygame.Rect(0, first, width, last - first)
+            top = first * self.display_height // height
+            bottom = last * self.display_height // height
+            target = pygame.Rect(0, top, self.display_width, bottom - top)
+            pygame.transform.scale(
+                self.internal_surface.subsurface(band),
+                target.size,
+                self.screen.subsurface(target),
+            )
+            updated.append(target)
+
+        pygame.display.update(updated)
+
+    def dirty_runs(self, rows):
+        """Return (first, last) row ranges that differ from what is on screen."""
+        presented = self.presented_rows
+        height = len(rows)
+        if presented is None:
+            return [(0, height)]
+
+        runs = []
+        first = None
+        for y in range(height):
+            if rows[y] != presented[y]:
+                if first is None:
+                    first = y
+            elif first is not None:
+                runs.append((first, y))
+                first = None
+        if first is not None:
+            runs.append((first, height))
+        return runs
+
+    def handle_inputs(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+
+            if event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+                continue
+
+            pressed = event.type == pygame.KEYDOWN
+            if event.key == REWIND_KEY:
+                self.rewinding = pressed
+            elif event.key == TURBO_KEY:
+                self.turbo = pressed
+            else:
+                key = self.keymap.get(event.key)
+                if key is not None:
+                    self.emulator.set_key(key, pressed)
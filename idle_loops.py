@@ -0,0 +1,76 @@
+from typing import Optional, Tuple
+
+# bytes spanned by the longest recognised loop (FX07, 3XNN, 1NNN)
+IDLE_LOOP_SPAN = 6
+
+# loop kinds; each names what the loop is waiting for
+WAIT_DELAY_EQUAL = "delay_equal"  # FX07 / 3XNN / 1NNN: spins while DT != NN
+WAIT_DELAY_CHANGE = "delay_change"  # FX07 / 4XNN / 1NNN: spins while DT == NN
+WAIT_KEY = "key"  # FX0A: spins while no key is down
+WAIT_FOREVER = "forever"  # 1NNN jumping to itself, or 00FD (exit)
+
+
+class IdleLoop(Exception):
+    """Raised by a loop head once it sees its loop cannot exit in this batch.
+
+    Timers and keys only change between ``Emulator.execute`` calls, so a
+    loop waiting on them spins for the rest of the batch; the emulator then
+    jumps to the state it would have reached instead of running it.
+    """
+
+    def __init__(self, head: int, period: int, operation) -> None:
+        super().__init__(head)
+        self.head = head
+        self.period = period
+        self.operation = operation
+
+
+def word(memory, address: int) -> Optional[int]:
+    if address + 1 >= len(memory):
+        return None
+    return (memory[address] << 8) | memory[address + 1]
+
+
+def jumps_to(instruction: Optional[int], address: int) -> bool:
+    """Whether ``instruction`` is 1NNN jumping to ``address``.
+
+    NNN has 12 bits, so with extended memory only loops in the first 4 KiB
+    can jump to themselves; 0x1234 at 0x1234 jumps to 0x234.
+    """
+    return (
+        instruction is not None
+        and address <= 0xFFF
+        and instruction >> 12 == 0x1
+        and instruction & 0xFFF == address
+    )
+
+
+def find_idle_loop(memory, address: int) -> Optional[Tuple[int, str, int]]:
+    """Recognise a busy-wait loop starting at ``address``.
+
+    Returns (instructions per iteration, kind, operand) or None. Only loops
+    whose body has no effect beyond its first iteration qualify, so skipping
+    whole iterations leaves the machine in exactly the same state.
+    """
+    head = word(memory, address)
+    if head is None:
+        return None
+
+    if jumps_to(head, address) or head == 0x00FD:
+        return 1, WAIT_FOREVER, 0
+
+    if head & 0xF0FF == 0xF00A:
+        return 1, WAIT_KEY, 0
+
+    if head & 0xF0FF == 0xF007:
+        x = (head & 0x0F00) >> 8
+        skip = word(memory, address + 2)
+        jump = word(memory, address + 4)
+        if skip is None or not jumps_to(jump, address) or (skip & 0x0F00) >> 8 != x:
+            return None
+        if skip >> 12 == 0x3:
+            return 3, WAIT_DELAY_EQUAL, skip & 0xFF
+        if skip >> 12 == 0x4:
+            return 3, WAIT_DELAY_CHANGE, skip & 0xFF
+
+    return None
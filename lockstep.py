@@ -0,0 +1,291 @@
+"""Run two execution engines side by side and report where they first disagree.
+
+Both machines start from the same ROM (or movie), seed and key input and run
+one 60 Hz frame at a time; after each frame their architectural state is
+compared. When a frame differs, both are rewound to its start and stepped
+one instruction at a time, so the report names the exact instruction, the
+registers that differ and a trace of the reference engine leading up to it:
+
+    python lockstep.py game.ch8 --frames 3600 --engines interpreter translator
+    python lockstep.py --movie session.ch8m
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from constants import EXTENDED_MEMORY_SIZE
+from emulator import Emulator
+from scheduler import TIMER_HZ
+from tracing import TraceEntry
+
+# engine name -> Emulator options; all of these must behave identically
+ENGINES = {
+    "interpreter": {},
+    "translator": {"translate_blocks": True},
+    "no-idle-skip": {"skip_idle_loops": False},
+    "translator-no-idle-skip": {"translate_blocks": True, "skip_idle_loops": False},
+}
+
+# trace entries included in a divergence report
+REPORT_TRACE_LENGTH = 16
+
+
+class Divergence(NamedTuple):
+    frame: int
+    # instructions into the frame; instructions_per_frame means the timer tick
+    instruction: int
+    pc: int
+    opcode: int
+    # field -> (value on the first engine, value on the second)
+    differences: Dict[str, Tuple[object, object]]
+    trace: List[TraceEntry]
+
+    def to_dict(self) -> dict:
+        return {
+            "frame": self.frame,
+            "instruction": self.instruction,
+            "pc": f"{self.pc:04X}",
+            "opcode": f"{self.opcode:04X}",
+            "differences": {name: list(values) for name, values in self.differences.items()},
+            "trace": [
+                {"number": entry.number, "pc": f"{entry.pc:04X}", "opcode": f"{entry.opcode:04X}", "changes": entry.changes}
+                for entry in self.trace
+            ],
+        }
+
+
+def machine_state(emulator) -> dict:
+    """Everything a program can observe, as comparable values."""
+    return {
+        "pc": emulator.program_counter,
+        "I": emulator.index_register,
+        "V": list(emulator.variable_register),
+        "carry": emulator.carry_flag,
+        "stack": list(emulator.stack),
+        "delay_timer": emulator.delay_timer,
+        "sound_timer": emulator.sound_timer,
+        "flag_registers": list(emulator.flag_registers),
+        "high_resolution": emulator.high_resolution,
+        "screen_rows": list(emulator.screen_rows),
+        "memory": bytes(emulator.memory),
+    }
+
+
+def compare_states(a: dict, b: dict) -> Dict[str, Tuple[object, object]]:
+    """The fields that differ, narrowed down to registers, rows and addresses."""
+    differences = {}
+    for name, value in a.items():
+        other = b[name]
+        if value == other:
+            continue
+        if name == "V":
+            for register, (x, y) in enumerate(zip(value, other)):
+                if x != y:
+                    differences[f"V{register:X}"] = (x, y)
+        elif name == "screen_rows" and len(value) == len(other):
+            for row, (x, y) in enumerate(zip(value, other)):
+                if x != y:
+                    differences[f"row {row}"] = (x, y)
+        elif name == "memory" and len(value) == len(other):
+            for address, (x, y) in enumerate(zip(value, other)):
+                if x != y:
+                    differences[f"memory {address:03X}"] = (x, y)
+        else:
+            differences[name] = (value, other)
+    return differences
+
+
+def traced_registers(emulator) -> Dict[str, int]:
+    registers = {f"V{register:X}": value for register, value in enumerate(emulator.variable_register)}
+    registers["I"] = emulator.index_register
+    registers["carry"] = emulator.carry_flag
+    return registers
+
+
+def run_step(machine, step) -> Optional[str]:
+    """Run ``step`` on ``machine``; an exception it raises is part of what is compared."""
+    try:
+        step(machine)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def execute_frame(count: int):
+    def step(machine):
+        machine.execute(count)
+        machine.tick_timers()
+
+    return step
+
+
+def execute_one(machine):
+    machine.execute(1)
+
+
+def tick_timers(machine):
+    machine.tick_timers()
+
+
+class Lockstep:
+    """Two emulators fed the same input, checked against each other frame by frame."""
+
+    def __init__(self, first: Emulator, second: Emulator, cpu_hz: float = None) -> None:
+        self.machines = (first, second)
+        self.cpu_hz = cpu_hz if cpu_hz else first.instructions_per_frame * TIMER_HZ
+        self.instruction_accumulator = 0.0
+        self.frame = 0
+        # set once both machines failed the same way; there is nothing left to run
+        self.error = None
+
+    def set_key(self, key: int, pressed: bool):
+        for machine in self.machines:
+            machine.set_key(key, pressed)
+
+    def run_frame(self) -> Optional[Divergence]:
+        """Run one frame on both machines; return where they diverged, if they did."""
+        # same instruction count per frame as FrameScheduler.run_ticks
+        self.instruction_accumulator += self.cpu_hz / TIMER_HZ
+        count = int(self.instruction_accumulator)
+        self.instruction_accumulator -= count
+
+        starts = [(machine.save_state(), machine.rng.getstate()) for machine in self.machines]
+        errors = [run_step(machine, execute_frame(count)) for machine in self.machines]
+
+        divergence = None
+        first, second = self.machines
+        if errors[0] != errors[1] or machine_state(first) != machine_state(second):
+            divergence = self.find_divergence(starts, count)
+        elif errors[0] is not None:
+            self.error = errors[0]
+        self.frame += 1
+        return divergence
+
+    def find_divergence(self, starts, count: int) -> Optional[Divergence]:
+        """Replay the frame one instruction at a time to find the first difference."""
+        first, second = self.machines
+        for machine, (state, rng_state) in zip(self.machines, starts):
+            machine.load_state(state)
+            machine.rng.setstate(rng_state)
+        # the trace is built here rather than with Emulator.enable_tracing,
+        # which would take over execute and bypass the engine under test
+        trace: List[TraceEntry] = []
+        registers = traced_registers(first)
+
+        for instruction in range(count + 1):
+            pc = first.program_counter
+            # a program that ran off the end of memory has no opcode to report
+            opcode = (first.memory[pc] << 8) | first.memory[pc + 1] if pc + 1 < len(first.memory) else 0
+            step = execute_one if instruction < count else tick_timers
+            errors = [run_step(machine, step) for machine in self.machines]
+
+            if instruction < count:
+                after = traced_registers(first)
+                changes = {name: value for name, value in after.items() if registers[name] != value}
+                trace.append(TraceEntry(instruction + 1, pc, opcode, changes))
+                registers = after
+
+            differences = compare_states(machine_state(first), machine_state(second))
+            if errors[0] != errors[1]:
+                differences["error"] = tuple(errors)
+            if errors[0] is not None and not differences:
+                # both failed on the same instruction: that is agreement
+                self.error = errors[0]
+                return None
+            if differences:
+                return Divergence(
+                    self.frame,
+                    instruction,
+                    pc,
+                    opcode,
+                    differences,
+                    trace[-REPORT_TRACE_LENGTH:],
+                )
+
+        # only reachable if the engines differ in a way execute(1) hides
+        return Divergence(
+            self.frame, count, first.program_counter, 0, {"frame": (None, None)}, []
+        )
+
+
+def check(
+    first: Emulator,
+    second: Emulator,
+    frames: int,
+    key_events: Iterable[Tuple[int, int, int]] = (),
+    cpu_hz: float = None,
+) -> Tuple[Optional[Divergence], Optional[str]]:
+    """Run ``frames`` frames in lockstep; ``key_events`` are (frame, key, pressed) like a movie's.
+
+    Returns the first divergence, if any, and the error both engines stopped
+    on if the program crashed them the same way.
+    """
+    lockstep = Lockstep(first, second, cpu_hz)
+    events = sorted(key_events, key=lambda event: event[0])
+    next_event = 0
+    for frame in range(frames):
+        while next_event < len(events) and events[next_event][0] <= frame:
+            _, key, pressed = events[next_event]
+            lockstep.set_key(key, bool(pressed))
+            next_event += 1
+        divergence = lockstep.run_frame()
+        if divergence is not None or lockstep.error is not None:
+            return divergence, lockstep.error
+    return None, None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two execution engines in lockstep.")
+    parser.add_argument("rom", nargs="?", help="ROM to run (or use --movie)")
+    parser.add_argument("--movie", help="replay this movie's start state, seed and keys")
+    parser.add_argument("--frames", type=int, default=600, help="frames to run (movie: its length)")
+    parser.add_argument("--seed", type=int, default=0, help="CXNN seed for a ROM run")
+    parser.add_argument(
+        "--engines", nargs=2, choices=ENGINES, default=["interpreter", "translator"]
+    )
+    parser.add_argument(
+        "--extended-memory", action="store_true", help="64 KiB of memory (movies: as recorded)"
+    )
+    args = parser.parse_args(argv)
+    if not args.rom and not args.movie:
+        parser.error("give a ROM or --movie")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    movie = None
+    extended_memory = args.extended_memory
+    if args.movie:
+        from movie import Movie
+
+        movie = Movie.load(args.movie)
+        extended_memory = movie.memory_size == EXTENDED_MEMORY_SIZE
+    machines = [
+        Emulator(extended_memory=extended_memory, seed=args.seed, **ENGINES[engine])
+        for engine in args.engines
+    ]
+
+    if movie is not None:
+        for machine in machines:
+            machine.load_state(movie.start_state)
+            machine.seed_random(movie.seed)
+        divergence, lockstep_error = check(*machines, movie.frames, movie.events, movie.cpu_hz)
+        frames = movie.frames
+    else:
+        for machine in machines:
+            machine.load_program(args.rom)
+        divergence, lockstep_error = check(*machines, args.frames)
+        frames = args.frames
+
+    report = {"engines": args.engines, "frames": frames, "divergence": None, "error": lockstep_error}
+    if divergence is not None:
+        report["divergence"] = divergence.to_dict()
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if divergence is not None else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
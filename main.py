@@ -1,10 +1,56 @@
 import sys
+import time
 
+started = time.perf_counter()
+
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
+
+qt_imported = time.perf_counter()
+
 from ui.main_window import MainWindow
 
+ui_imported = time.perf_counter()
+
+# print a startup time breakdown and exit once the window is up
+STARTUP_TIME_FLAG = "--startup-time"
+
+
+def report_startup(app_created: float, window_created: float):
+    """Print where the time went between main.py starting and the first window.
+
+    The first event loop pass paints the window and fills the ROM list from
+    the index.
+    """
+    first_window = time.perf_counter()
+    steps = (
+        ("import PyQt6", started, qt_imported),
+        ("import ui", qt_imported, ui_imported),
+        ("QApplication()", ui_imported, app_created),
+        ("MainWindow() and show", app_created, window_created),
+        ("first event loop pass", window_created, first_window),
+    )
+    for name, start, end in steps:
+        print(f"{name:<24}{(end - start) * 1000:8.1f} ms", file=sys.stderr)
+    total = (first_window - started) * 1000
+    print(f"{'time to first window':<24}{total:8.1f} ms", file=sys.stderr)
+
+    # none of these should be needed before a ROM is started
+    loaded = [name for name in ("numpy", "pygame", "emulator") if name in sys.modules]
+    print(f"loaded at startup: {', '.join(loaded) or 'none'}", file=sys.stderr)
+    QApplication.quit()
+
 
 if __name__ == "__main__":
+    measure_startup = STARTUP_TIME_FLAG in sys.argv
+    if measure_startup:
+        sys.argv.remove(STARTUP_TIME_FLAG)
+
     app = QApplication(sys.argv)
+    app_created = time.perf_counter()
     window = MainWindow()
+    window_created = time.perf_counter()
+    if measure_startup:
+        # runs once the pending show/paint events have been processed
+        QTimer.singleShot(0, lambda: report_startup(app_created, window_created))
     sys.exit(app.exec())
@@ -0,0 +1,183 @@
+"""Key-input movies: record a session once, replay it exactly and headlessly.
+
+A movie holds the save state the recording started from, the CXNN seed, the
+clock speed, the machine's memory size and every key change tagged with the frame (60 Hz timer tick) it
+happened before. Replaying runs the same instructions and ticks in the same
+order, so the same movie gives the same result on every build:
+
+    python movie.py session.ch8m --translate-blocks
+"""
+import argparse
+import hashlib
+import json
+import struct
+import sys
+import time
+import zlib
+from typing import List, Tuple
+
+from constants import EXTENDED_MEMORY_SIZE, MEMORY_SIZE
+from scheduler import FrameScheduler
+
+MOVIE_MAGIC = b"CH8M"
+MOVIE_VERSION = 2
+# magic, version, seed, cpu_hz, frames, event count, compressed state size, memory size
+MOVIE_HEADER = struct.Struct(">4sBQdIIII")
+# version 1 had no memory size; those movies were all recorded with 4 KiB
+MOVIE_HEADER_V1 = struct.Struct(">4sBQdIII")
+# frame, then key in the low nibble and pressed in bit 4
+MOVIE_EVENT = struct.Struct(">IB")
+
+
+class Movie:
+    """A recorded session; ``Emulator.start_recording`` creates and fills one."""
+
+    def __init__(
+        self, seed: int, cpu_hz: float, start_state: bytes, memory_size: int = MEMORY_SIZE
+    ) -> None:
+        self.seed = seed
+        self.cpu_hz = cpu_hz
+        self.start_state = start_state
+        # the replaying emulator has to be built with the same memory
+        self.memory_size = memory_size
+        self.frames = 0
+        # (frame, key, pressed) in the order they happened
+        self.events: List[Tuple[int, int, int]] = []
+
+    def key_changed(self, frame: int, key: int, pressed: int):
+        self.events.append((frame, key, pressed))
+
+    def finish(self, frames: int):
+        self.frames = frames
+
+    def to_bytes(self) -> bytes:
+        state = zlib.compress(self.start_state)
+        return b"".join(
+            (
+                MOVIE_HEADER.pack(
+                    MOVIE_MAGIC,
+                    MOVIE_VERSION,
+                    self.seed,
+                    self.cpu_hz,
+                    self.frames,
+                    len(self.events),
+                    len(state),
+                    self.memory_size,
+                ),
+                state,
+                b"".join(
+                    MOVIE_EVENT.pack(frame, key | (pressed << 4))
+                    for frame, key, pressed in self.events
+                ),
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Movie":
+        magic, version = data[:4], data[4]
+        if magic != MOVIE_MAGIC:
+            raise ValueError("Not a CHIP-8 movie.")
+        if version == 1:
+            header = MOVIE_HEADER_V1.unpack_from(data, 0) + (MEMORY_SIZE,)
+            offset = MOVIE_HEADER_V1.size
+        elif version == MOVIE_VERSION:
+            header = MOVIE_HEADER.unpack_from(data, 0)
+            offset = MOVIE_HEADER.size
+        else:
+            raise ValueError(f"Unsupported movie version {version}.")
+        _, _, seed, cpu_hz, frames, event_count, state_size, memory_size = header
+
+        movie = cls(
+            seed, cpu_hz, zlib.decompress(data[offset : offset + state_size]), memory_size
+        )
+        movie.frames = frames
+        offset += state_size
+        movie.events = [
+            (frame, packed & 0xF, packed >> 4)
+            for frame, packed in MOVIE_EVENT.iter_unpack(
+                data[offset : offset + event_count * MOVIE_EVENT.size]
+            )
+        ]
+        return movie
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Movie":
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+def play_movie(emulator, movie: Movie, frame_sink=None) -> int:
+    """Replay ``movie`` on ``emulator`` as fast as it will run; returns instructions run.
+
+    Frames that drew are pushed to ``frame_sink`` when one is given.
+    """
+    emulator.load_state(movie.start_state)
+    start_cycles = emulator.cycles
+    emulator.seed_random(movie.seed)
+    emulator.frame_count = 0
+    scheduler = FrameScheduler(emulator, cpu_hz=movie.cpu_hz, frame_sink=frame_sink)
+
+    for frame, key, pressed in movie.events:
+        if frame > emulator.frame_count:
+            scheduler.run_ticks(frame - emulator.frame_count)
+        emulator.set_key(key, pressed)
+
+    if movie.frames > emulator.frame_count:
+        scheduler.run_ticks(movie.frames - emulator.frame_count)
+
+    return emulator.cycles - start_cycles
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a CHIP-8 movie headlessly.")
+    parser.add_argument("movie", help="movie file written by the frontend")
+    parser.add_argument(
+        "--translate-blocks", action="store_true", help="use the block translator"
+    )
+    parser.add_argument(
+        "--export", help="write the frames to a .gif, a raw .ch8v stream or a PNG folder"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    from emulator import Emulator
+    from frame_export import open_exporter
+
+    args = parse_args(argv)
+    movie = Movie.load(args.movie)
+    emulator = Emulator(
+        translate_blocks=args.translate_blocks,
+        extended_memory=movie.memory_size == EXTENDED_MEMORY_SIZE,
+    )
+    # a headless replay has no real time to keep up with, so keep every frame
+    exporter = open_exporter(args.export, wait_when_full=True) if args.export else None
+
+    started = time.perf_counter()
+    instructions = play_movie(emulator, movie, frame_sink=exporter)
+    seconds = time.perf_counter() - started
+    if exporter is not None:
+        exporter.close()
+
+    json.dump(
+        {
+            "frames": emulator.frame_count,
+            "instructions": instructions,
+            "seconds": round(seconds, 6),
+            "instructions_per_second": round(instructions / seconds) if seconds else 0,
+            "framebuffer_sha1": hashlib.sha1(emulator.get_framebuffer()).hexdigest(),
+            **({"export": exporter.report()} if exporter is not None else {}),
+        },
+        sys.stdout,
+        indent=2,
+    )
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
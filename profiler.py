@@ -0,0 +1,174 @@
+import json
+import time
+from typing import Dict, List
+
+from constants import MEMORY_SIZE
+from idle_loops import IdleLoop
+
+# time budget of one 60 Hz frame, in seconds
+FRAME_BUDGET = 1 / 60
+
+FRAME_SECTIONS = ("execute", "timers", "input", "display")
+
+GROUP_PATTERNS = {
+    0x1: "1NNN",
+    0x2: "2NNN",
+    0x3: "3XNN",
+    0x4: "4XNN",
+    0x5: "5XY0",
+    0x6: "6XNN",
+    0x7: "7XNN",
+    0x9: "9XY0",
+    0xA: "ANNN",
+    0xB: "BNNN",
+    0xC: "CXNN",
+    0xD: "DXYN",
+}
+
+SYSTEM_INSTRUCTIONS = (0x00E0, 0x00EE, 0x00FB, 0x00FC, 0x00FD, 0x00FE, 0x00FF)
+
+
+def opcode_family(instruction: int) -> str:
+    """Name the opcode family of ``instruction``, e.g. 0x8124 -> "8XY4"."""
+    group = instruction >> 12
+    if group == 0x0:
+        if instruction in SYSTEM_INSTRUCTIONS:
+            return f"{instruction:04X}"
+        if instruction & 0xFFE0 == 0x00C0:
+            return f"00{instruction >> 4 & 0xF:X}N"
+        return "0NNN"
+    if group == 0x8:
+        return f"8XY{instruction & 0xF:X}"
+    if group in (0xE, 0xF):
+        return f"{group:X}X{instruction & 0xFF:02X}"
+    return GROUP_PATTERNS[group]
+
+
+class Profiler:
+    """Instruction and frame-time counters for one ``Emulator``.
+
+    Enabled with ``Emulator.enable_profiling()``. While it is attached the
+    emulator runs every instruction through ``execute`` below (the block
+    translator is bypassed so each instruction can be counted); with no
+    profiler attached none of this code runs.
+    """
+
+    def __init__(self, memory_size: int = MEMORY_SIZE) -> None:
+        self.instruction_counts = [0] * 0x10000
+        self.pc_counts = [0] * memory_size
+        self.section_times: Dict[str, float] = dict.fromkeys(FRAME_SECTIONS, 0.0)
+        # wall time of each start_frame/end_frame pair, i.e. of each pass of
+        # the frontend loop, which may run any number of 60 Hz ticks
+        self.frame_times: List[float] = []
+        self.frame_started = None
+        # emulated 60 Hz ticks
+        self.ticks = 0
+        # instructions accounted for by fast-forwarding idle loops
+        self.idle_instructions = 0
+
+    def execute(self, emulator, count: int):
+        memory = emulator.memory
+        cycle = emulator.cycle
+        instruction_counts = self.instruction_counts
+        pc_counts = self.pc_counts
+
+        executed = 0
+        try:
+            for executed in range(count):
+                program_counter = emulator.program_counter
+                instruction = (memory[program_counter] << 8) | memory[program_counter + 1]
+                pc_counts[program_counter] += 1
+                instruction_counts[instruction] += 1
+                cycle()
+        except IdleLoop as loop:
+            # the loop head was counted above but never ran
+            pc_counts[loop.head] -= 1
+            instruction_counts[(memory[loop.head] << 8) | memory[loop.head + 1]] -= 1
+            self.idle_instructions += count - executed
+            emulator.skip_idle_loop(loop, count - executed)
+
+    def add_time(self, section: str, seconds: float):
+        self.section_times[section] += seconds
+
+    def add_ticks(self, count: int):
+        self.ticks += count
+
+    def start_frame(self):
+        self.frame_started = time.perf_counter()
+
+    def end_frame(self):
+        if self.frame_started is not None:
+            self.frame_times.append(time.perf_counter() - self.frame_started)
+            self.frame_started = None
+
+    def opcode_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for instruction, count in enumerate(self.instruction_counts):
+            if count:
+                family = opcode_family(instruction)
+                counts[family] = counts.get(family, 0) + count
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def hot_addresses(self, limit: int = 20) -> Dict[str, int]:
+        hottest = sorted(
+            (address for address, count in enumerate(self.pc_counts) if count),
+            key=lambda address: self.pc_counts[address],
+            reverse=True,
+        )
+        return {f"{address:03X}": self.pc_counts[address] for address in hottest[:limit]}
+
+    def report(self, hot_address_limit: int = 20) -> dict:
+        frames = len(self.frame_times)
+        return {
+            "instructions": sum(self.pc_counts) + self.idle_instructions,
+            "idle_instructions": self.idle_instructions,
+            "opcode_counts": self.opcode_counts(),
+            "hot_addresses": self.hot_addresses(hot_address_limit),
+            "frames": self.ticks,
+            "loop_iterations": frames,
+            "section_seconds": dict(self.section_times),
+            "mean_frame_ms": (sum(self.frame_times) / frames * 1000) if frames else 0.0,
+            "max_frame_ms": max(self.frame_times) * 1000 if frames else 0.0,
+            "frames_over_budget": sum(1 for t in self.frame_times if t > FRAME_BUDGET),
+        }
+
+    def dump(self, path: str, hot_address_limit: int = 20):
+        with open(path, "w") as file:
+            json.dump(self.report(hot_address_limit), file, indent=2)
+
+
+class InputLatencyProbe:
+    """Measures how long a key change takes to be seen by the running program.
+
+    ``Emulator.enable_input_probe()`` attaches it; every key change starts a
+    clock for that key and the first EX9E/EXA1/FX0A that reads the key
+    afterwards stops it.
+    """
+
+    def __init__(self) -> None:
+        self.pending: Dict[int, float] = {}
+        self.samples: List[float] = []
+
+    def key_changed(self, key: int):
+        self.pending[key] = time.perf_counter()
+
+    def key_read(self, key: int):
+        changed = self.pending.pop(key, None)
+        if changed is not None:
+            self.samples.append(time.perf_counter() - changed)
+
+    def report(self) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"samples": 0}
+
+        def percentile(fraction: float) -> float:
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+        return {
+            "samples": len(samples),
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": samples[-1] * 1000,
+        }
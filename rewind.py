@@ -0,0 +1,110 @@
+import zlib
+from typing import List, Optional, Tuple
+
+# zlib level used for frame deltas; level 1 is several times faster than the
+# default and the XOR deltas are mostly zero bytes anyway
+DELTA_COMPRESSION = 1
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    """XOR two equally long byte strings (done on big ints, which runs in C)."""
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
+
+
+class RewindBuffer:
+    """Fixed-size ring of the last few seconds of emulator save states.
+
+    Every ``keyframe_interval`` frames a full save state is kept; the frames
+    in between store a compressed XOR against that keyframe. Entries hold a
+    reference to their keyframe, so the ring never needs more than
+    ``capacity`` entries plus one keyframe per interval.
+    """
+
+    def __init__(self, seconds: float = 10, frames_per_second: int = 60, keyframe_interval: int = 60):
+        self.capacity = max(1, int(seconds * frames_per_second))
+        self.keyframe_interval = keyframe_interval
+        # each slot is (keyframe, delta); delta is None for keyframes themselves
+        self.entries: List[Optional[Tuple[bytes, Optional[bytes]]]] = [None] * self.capacity
+        self.head = 0
+        self.size = 0
+        self.keyframe = None
+        self.frames_since_keyframe = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def clear(self):
+        self.entries = [None] * self.capacity
+        self.head = 0
+        self.size = 0
+        self.keyframe = None
+        self.frames_since_keyframe = 0
+
+    def push(self, emulator):
+        """Record the emulator's current state as the newest frame."""
+        state = emulator.save_state()
+        keyframe = self.keyframe
+
+        if (
+            keyframe is None
+            or self.frames_since_keyframe >= self.keyframe_interval
+            or len(keyframe) != len(state)
+        ):
+            self.keyframe = state
+            self.frames_since_keyframe = 0
+            entry = (state, None)
+        else:
+            entry = (keyframe, zlib.compress(xor_bytes(state, keyframe), DELTA_COMPRESSION))
+
+        self.frames_since_keyframe += 1
+        self.entries[self.head] = entry
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def pop(self) -> Optional[bytes]:
+        """Remove and return the newest recorded state, or None if the buffer is empty."""
+        if not self.size:
+            return None
+
+        self.head = (self.head - 1) % self.capacity
+        self.size -= 1
+        keyframe, delta = self.entries[self.head]
+        self.entries[self.head] = None
+
+        # new frames pushed after rewinding start a fresh keyframe
+        self.keyframe = None
+        if delta is None:
+            return keyframe
+        return xor_bytes(zlib.decompress(delta), keyframe)
+
+    def rewind(self, emulator, frames: int = 1) -> bool:
+        """Step the emulator back ``frames`` frames; False once there is nothing left."""
+        state = None
+        for _ in range(frames):
+            previous = self.pop()
+            if previous is None:
+                break
+            state = previous
+
+        if state is None:
+            return False
+
+        # the keypad reflects the player's hands now, not in the snapshot; a
+        # key held back then and released since must not come back pressed
+        key_states = bytes(emulator.key_states)
+        emulator.load_state(state)
+        emulator.key_states[:] = key_states
+        return True
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by recorded states (shared keyframes counted once)."""
+        keyframes = {}
+        deltas = 0
+        for entry in self.entries:
+            if entry is not None:
+                keyframe, delta = entry
+                keyframes[id(keyframe)] = len(keyframe)
+                if delta is not None:
+                    deltas += len(delta)
+        return sum(keyframes.values()) + deltas
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import pathlib
+import sqlite3
+import struct
+import time
+from typing import Dict, Iterator, List, NamedTuple
+
+ROM_SUFFIX = ".ch8"
+
+# rows written per transaction while scanning
+SCAN_BATCH_SIZE = 256
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roms (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha1 TEXT NOT NULL,
+    quirks TEXT NOT NULL,
+    runs INTEGER NOT NULL DEFAULT 0,
+    last_run REAL,
+    last_frames INTEGER
+);
+CREATE INDEX IF NOT EXISTS roms_sha1 ON roms (sha1);
+"""
+
+
+def find_roms(folder_path, recursive: bool = False) -> Iterator[pathlib.Path]:
+    """Yield every CHIP-8 ROM in ``folder_path``, optionally descending into subfolders."""
+    folder = pathlib.Path(folder_path)
+    content = folder.rglob("*") if recursive else folder.iterdir()
+
+    for item in content:
+        if not item.is_dir():
+            if item.suffix == ROM_SUFFIX:
+                yield item
+
+
+def infer_quirks(program: bytes) -> str:
+    """Guess which compatibility quirks a ROM may depend on from the opcodes it contains."""
+    quirks = set()
+    words = len(program) // 2
+    for instruction in set(struct.unpack(f">{words}H", program[: words * 2])):
+        group = instruction >> 12
+        if group == 0x8 and instruction & 0xF in (0x6, 0xE):
+            quirks.add("shift")
+        elif group == 0xB:
+            quirks.add("jump")
+        elif group == 0xF and instruction & 0xFF in (0x55, 0x65):
+            quirks.add("load_store")
+        elif group == 0xF and instruction & 0xFF in (0x30, 0x75, 0x85):
+            quirks.add("schip")
+        elif instruction in (0x00FB, 0x00FC, 0x00FE, 0x00FF) or instruction & 0xFFF0 == 0x00C0:
+            quirks.add("schip")
+    return ",".join(sorted(quirks))
+
+
+class RomEntry(NamedTuple):
+    path: str
+    name: str
+    size: int
+    mtime: float
+    sha1: str
+    quirks: str
+    runs: int = 0
+    last_run: float = None
+    last_frames: int = None
+
+
+class RomIndex:
+    """Persistent SQLite index of ROM files: size, mtime, hash, quirks and run stats.
+
+    ``scan`` only reads and hashes files whose size or mtime changed since the
+    last scan, so listing a large, mostly unchanged library costs a directory
+    walk. A connection belongs to one thread; give each thread its own index.
+    """
+
+    def __init__(self, path: str = "rom_index.sqlite3") -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(INDEX_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def entries(self, folder_path=None) -> List[RomEntry]:
+        """Indexed ROMs (under ``folder_path`` if given), as of the last scan."""
+        query = "SELECT * FROM roms"
+        parameters = ()
+        if folder_path is not None:
+            query += " WHERE path LIKE ? ESCAPE '\\'"
+            parameters = (escape_like(folder_prefix(folder_path)) + "%",)
+        rows = self.connection.execute(query + " ORDER BY name", parameters)
+        return [RomEntry(*row) for row in rows]
+
+    def scan(self, folder_path, recursive: bool = False) -> Iterator[List[RomEntry]]:
+        """Bring the index up to date with ``folder_path``, yielding batches of entries.
+
+        Unchanged files come straight from the index; entries for files that
+        have disappeared are dropped once the walk is done.
+        """
+        known: Dict[str, RomEntry] = {entry.path: entry for entry in self.entries(folder_path)}
+        seen = set()
+        batch: List[RomEntry] = []
+        changed: List[RomEntry] = []
+
+        for rom in find_roms(folder_path, recursive=recursive):
+            path = str(rom.absolute())
+            seen.add(path)
+            stat = rom.stat()
+            entry = known.get(path)
+            if entry is None or entry.size != stat.st_size or entry.mtime != stat.st_mtime:
+                entry = self.read_entry(rom, path, stat, entry)
+                changed.append(entry)
+            batch.append(entry)
+
+            if len(batch) >= SCAN_BATCH_SIZE:
+                self.store(changed)
+                changed = []
+                yield batch
+                batch = []
+
+        self.store(changed)
+        if batch:
+            yield batch
+
+        # only prune what this walk could have seen
+        folder = folder_key(folder_path)
+        removed = [
+            (path,)
+            for path in known
+            if path not in seen and (recursive or os.path.dirname(path) == folder)
+        ]
+        with self.connection:
+            self.connection.executemany("DELETE FROM roms WHERE path = ?", removed)
+
+    @staticmethod
+    def read_entry(
+        rom: pathlib.Path, path: str, stat: os.stat_result, previous: RomEntry
+    ) -> RomEntry:
+        program = rom.read_bytes()
+        entry = RomEntry(
+            path,
+            rom.name,
+            stat.st_size,
+            stat.st_mtime,
+            hashlib.sha1(program).hexdigest(),
+            infer_quirks(program),
+        )
+        if previous is not None:
+            # an edited ROM keeps its play history
+            entry = entry._replace(
+                runs=previous.runs, last_run=previous.last_run, last_frames=previous.last_frames
+            )
+        return entry
+
+    def store(self, entries: List[RomEntry]):
+        if not entries:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO roms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", entries
+            )
+
+    def record_run(self, path, frames: int):
+        """Count a finished session of the ROM at ``path`` that ran ``frames`` frames."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE roms SET runs = runs + 1, last_run = ?, last_frames = ? WHERE path = ?",
+                (time.time(), frames, str(path)),
+            )
+
+    def duplicates(self) -> List[List[str]]:
+        """Paths of ROMs with identical contents, grouped by hash."""
+        groups: Dict[str, List[str]] = {}
+        for sha1, path in self.connection.execute(
+            "SELECT sha1, path FROM roms WHERE sha1 IN "
+            "(SELECT sha1 FROM roms GROUP BY sha1 HAVING COUNT(*) > 1) ORDER BY path"
+        ):
+            groups.setdefault(sha1, []).append(path)
+        return list(groups.values())
+
+
+def folder_key(folder_path) -> str:
+    return str(pathlib.Path(folder_path).absolute())
+
+
+def folder_prefix(folder_path) -> str:
+    return os.path.join(folder_key(folder_path), "")
+
+
+def escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,103 @@
+import time
+
+TIMER_HZ = 60
+TIMER_PERIOD = 1 / TIMER_HZ
+
+# most real time one advance() call will catch up on; after a long stall
+# (window dragged, debugger break) the game skips ahead instead of running
+# hundreds of frames flat out
+MAX_CATCH_UP = 0.25
+
+
+class FrameScheduler:
+    """Fixed-timestep clock for an ``Emulator``.
+
+    Instructions run at ``cpu_hz`` and the delay/sound timers tick at a true
+    60 Hz, both driven by real elapsed time through accumulators, so a slow
+    rendered frame no longer slows down game time. ``run_ticks`` skips the
+    clock entirely for turbo/fast-forward runs. With a ``frame_sink`` (see
+    ``frame_export``) every tick that leaves the screen drawn is pushed to it.
+    """
+
+    def __init__(
+        self,
+        emulator,
+        cpu_hz: float = None,
+        input_slices: int = 1,
+        poll_input=None,
+        frame_sink=None,
+    ) -> None:
+        self.emulator = emulator
+        self.cpu_hz = cpu_hz if cpu_hz else emulator.instructions_per_frame * TIMER_HZ
+        # with poll_input set, each tick's instructions are split into
+        # input_slices parts and input is sampled between them
+        self.input_slices = max(1, input_slices)
+        self.poll_input = poll_input
+        self.frame_sink = frame_sink
+        self.time_accumulator = 0.0
+        self.instruction_accumulator = 0.0
+        self.last_time = None
+
+    @property
+    def instructions_per_tick(self) -> float:
+        return self.cpu_hz / TIMER_HZ
+
+    def reset(self):
+        self.time_accumulator = 0.0
+        self.instruction_accumulator = 0.0
+        self.last_time = None
+
+    def advance(self, now: float = None) -> int:
+        """Catch the emulator up to wall-clock time; returns the timer ticks run."""
+        now = time.perf_counter() if now is None else now
+        if self.last_time is None:
+            self.last_time = now
+        elapsed = min(now - self.last_time, MAX_CATCH_UP)
+        self.last_time = now
+
+        self.time_accumulator += elapsed
+        ticks = int(self.time_accumulator / TIMER_PERIOD)
+        if ticks:
+            self.time_accumulator -= ticks * TIMER_PERIOD
+            self.run_ticks(ticks)
+        return ticks
+
+    def run_ticks(self, ticks: int):
+        """Run ``ticks`` 60 Hz periods of instructions and timer updates back to back."""
+        emulator = self.emulator
+        profiler = emulator.profiler
+        frame_sink = self.frame_sink
+        per_tick = self.instructions_per_tick
+
+        for _ in range(ticks):
+            # carry the fractional instruction over so odd clock speeds stay exact
+            self.instruction_accumulator += per_tick
+            count = int(self.instruction_accumulator)
+            self.instruction_accumulator -= count
+            if profiler is not None:
+                started = time.perf_counter()
+                self.execute(count)
+                executed = time.perf_counter()
+                emulator.tick_timers()
+                profiler.add_time("execute", executed - started)
+                profiler.add_time("timers", time.perf_counter() - executed)
+            else:
+                self.execute(count)
+                emulator.tick_timers()
+
+            if frame_sink is not None and emulator.draw_flag:
+                frame_sink.push(emulator)
+
+    def execute(self, count: int):
+        if self.poll_input is None or self.input_slices == 1:
+            self.emulator.execute(count)
+        else:
+            self.execute_sliced(count)
+
+    def execute_sliced(self, count: int):
+        slices = self.input_slices
+        for index in range(slices):
+            emulator_count = count // slices + (1 if index < count % slices else 0)
+            self.emulator.execute(emulator_count)
+            if index < slices - 1:
+                self.poll_input()
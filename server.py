@@ -0,0 +1,451 @@
+"""Host many headless emulator sessions in one process behind a local socket.
+
+Clients speak newline-delimited JSON; every request may carry an ``id`` that
+is echoed in its response, so requests can be pipelined:
+
+    {"op": "create", "rom": "game.ch8"}            -> {"session": 1}
+    {"op": "create", "rom_base64": "...", "options": {"seed": 7}}
+    {"op": "key", "session": 1, "key": 5, "pressed": true}
+    {"op": "step", "session": 1, "frames": 60}     -> {"frame": 60, "cycles": 1800}
+    {"op": "framebuffer", "session": 1}            -> {"width": 64, "height": 32,
+                                                       "rows": {"3": "00f0..."}}
+    {"op": "close", "session": 1}
+
+``framebuffer`` only returns the rows (as hex) that changed since this
+connection last fetched that session; ``"full": true`` asks for every row.
+Errors come back as ``{"error": "..."}``. Sessions belong to the connection
+that created them and are closed when it disconnects.
+
+Step requests are queued and one scheduler task time-slices every session
+with frames left, a few frames per turn, so a long step on one session does
+not hold up the others. With ``--workers N`` the slices run in a process
+pool instead: the session's save state goes to a worker, which keeps its
+own ``Emulator`` per session so decode caches survive between slices.
+
+    python server.py --port 8765
+    python server.py --unix /tmp/chip8.sock --workers 4
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from constants import EXTENDED_MEMORY_SIZE
+from emulator import Emulator
+
+DEFAULT_PORT = 8765
+
+# longest request line accepted: a create carrying the largest ROM that fits
+# in extended memory as base64, with plenty of room for the rest of the JSON
+REQUEST_LIMIT = 2 * (EXTENDED_MEMORY_SIZE * 4 // 3)
+
+# frames one session runs per scheduler turn; a frame is about 30
+# instructions, so a turn stays well under a millisecond in process
+SLICE_FRAMES = 2
+# in a worker process a turn also pays for shipping the state both ways
+POOL_SLICE_FRAMES = 30
+
+# Emulator keyword arguments clients may set, and the JSON types they take
+EMULATOR_OPTIONS = {
+    "set_vx_to_vy": (bool,),
+    "translate_blocks": (bool,),
+    "skip_idle_loops": (bool,),
+    "extended_memory": (bool,),
+    "seed": (int, str, type(None)),
+}
+
+# emulators kept per worker process, most recently used last
+WORKER_SESSION_LIMIT = 512
+worker_sessions: "collections.OrderedDict[int, Emulator]" = collections.OrderedDict()
+
+
+class RequestError(Exception):
+    """A bad request; reported to the client instead of closing the connection."""
+
+
+def run_pooled_slice(
+    session_id: int, options: dict, state: bytes, rng_state, frames: int
+) -> Tuple[bytes, object]:
+    """Run ``frames`` frames of a session inside a worker process."""
+    emulator = worker_sessions.pop(session_id, None)
+    if emulator is None:
+        emulator = Emulator(**options)
+    worker_sessions[session_id] = emulator
+    while len(worker_sessions) > WORKER_SESSION_LIMIT:
+        worker_sessions.popitem(last=False)
+
+    # memory is usually unchanged since this worker last ran the session, in
+    # which case load_state keeps the decode caches
+    emulator.load_state(state)
+    emulator.rng.setstate(rng_state)
+    emulator.run_frames(frames)
+    return emulator.save_state(), emulator.rng.getstate()
+
+
+class Session:
+    def __init__(self, session_id: int, emulator: Emulator, options: dict) -> None:
+        self.id = session_id
+        self.emulator = emulator
+        self.options = options
+        # frames run and frames asked for so far
+        self.frame = 0
+        self.target_frame = 0
+        # (frame, future) of step requests still running
+        self.waiters: List[Tuple[int, asyncio.Future]] = []
+        # waiting in the ready queue / running in a worker process
+        self.queued = False
+        self.busy = False
+        self.closed = False
+
+    @property
+    def frames_left(self) -> int:
+        return self.target_frame - self.frame
+
+    def frames_ran(self, frames: int):
+        self.frame += frames
+        waiters = []
+        for frame, future in self.waiters:
+            if frame <= self.frame:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                waiters.append((frame, future))
+        self.waiters = waiters
+
+    def fail(self, error: Exception):
+        """Drop the outstanding steps; they report ``error``."""
+        for _, future in self.waiters:
+            if not future.done():
+                future.set_exception(RequestError(f"{type(error).__name__}: {error}"))
+        self.waiters = []
+        self.target_frame = self.frame
+
+
+class EmulatorServer:
+    """Owns the sessions and the scheduler task that runs them."""
+
+    def __init__(self, workers: int = 0) -> None:
+        self.sessions: Dict[int, Session] = {}
+        self.next_session_id = 1
+        # sessions with frames left, in the order they get their next turn
+        self.ready: Deque[Session] = collections.deque()
+        self.work = asyncio.Event()
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+        # two slices per worker in flight, so a worker is not idle while the
+        # result of its last slice is being unpacked
+        self.pool_slots = asyncio.Semaphore(2 * workers) if workers else None
+        self.pooled_tasks = set()
+        self.scheduler = None
+
+    def start(self):
+        self.scheduler = asyncio.get_running_loop().create_task(self.run_scheduler())
+
+    async def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def run_scheduler(self):
+        """Give every session with frames left a slice in turn, round-robin."""
+        while True:
+            if not self.ready:
+                self.work.clear()
+                await self.work.wait()
+                continue
+
+            session = self.ready.popleft()
+            session.queued = False
+            if session.closed or not session.frames_left:
+                continue
+
+            if self.pool is None:
+                self.run_slice(session)
+                self.schedule(session)
+                # let connections be served between slices
+                await asyncio.sleep(0)
+            else:
+                await self.pool_slots.acquire()
+                session.busy = True
+                task = asyncio.create_task(self.run_pooled(session))
+                self.pooled_tasks.add(task)
+                task.add_done_callback(self.pooled_tasks.discard)
+
+    def run_slice(self, session: Session):
+        frames = min(SLICE_FRAMES, session.frames_left)
+        try:
+            session.emulator.run_frames(frames)
+        except Exception as e:
+            session.fail(e)
+            return
+        session.frames_ran(frames)
+
+    async def run_pooled(self, session: Session):
+        emulator = session.emulator
+        frames = min(POOL_SLICE_FRAMES, session.frames_left)
+        try:
+            state, rng_state = await asyncio.get_running_loop().run_in_executor(
+                self.pool,
+                run_pooled_slice,
+                session.id,
+                session.options,
+                emulator.save_state(),
+                emulator.rng.getstate(),
+                frames,
+            )
+            # keys pressed while the slice was out are newer than its state
+            key_states = bytes(emulator.key_states)
+            emulator.load_state(state)
+            emulator.key_states[:] = key_states
+            emulator.rng.setstate(rng_state)
+            emulator.frame_count += frames
+            session.frames_ran(frames)
+        except Exception as e:
+            session.fail(e)
+        finally:
+            session.busy = False
+            self.pool_slots.release()
+            self.schedule(session)
+
+    def schedule(self, session: Session):
+        if session.frames_left and not (session.queued or session.busy or session.closed):
+            session.queued = True
+            self.ready.append(session)
+            self.work.set()
+
+    def session(self, request: dict) -> Session:
+        session_id = request.get("session")
+        session = self.sessions.get(session_id) if isinstance(session_id, int) else None
+        if session is None:
+            raise RequestError(f"No session {request.get('session')!r}.")
+        return session
+
+    def create(self, request: dict) -> dict:
+        options = request.get("options", {})
+        if not isinstance(options, dict):
+            raise RequestError("options must be an object.")
+        unknown = set(options) - set(EMULATOR_OPTIONS)
+        if unknown:
+            raise RequestError(f"Unknown options: {', '.join(sorted(unknown))}.")
+        for name, value in options.items():
+            if not isinstance(value, EMULATOR_OPTIONS[name]):
+                raise RequestError(f"Bad value for {name}: {value!r}.")
+
+        if "rom_base64" in request:
+            if not isinstance(request["rom_base64"], str):
+                raise RequestError("rom_base64 must be a string.")
+            program = base64.b64decode(request["rom_base64"])
+        elif "rom" in request:
+            if not isinstance(request["rom"], str):
+                raise RequestError("rom must be a path.")
+            try:
+                with open(request["rom"], "rb") as file:
+                    program = file.read()
+            except OSError as e:
+                raise RequestError(str(e))
+        else:
+            raise RequestError("create needs rom or rom_base64.")
+
+        emulator = Emulator(**options)
+        try:
+            emulator.load_rom(program)
+        except ValueError as e:
+            raise RequestError(str(e))
+
+        session = Session(self.next_session_id, emulator, options)
+        self.next_session_id += 1
+        self.sessions[session.id] = session
+        return {"session": session.id}
+
+    def key(self, request: dict) -> dict:
+        key = request.get("key")
+        if not isinstance(key, int) or not 0 <= key <= 0xF:
+            raise RequestError(f"Bad key {key!r}.")
+        self.session(request).emulator.set_key(key, bool(request.get("pressed")))
+        return {}
+
+    async def step(self, request: dict) -> dict:
+        session = self.session(request)
+        frames = request.get("frames", 1)
+        if not isinstance(frames, int) or frames < 0:
+            raise RequestError(f"Bad frame count {frames!r}.")
+
+        session.target_frame += frames
+        future = asyncio.get_running_loop().create_future()
+        session.waiters.append((session.target_frame, future))
+        session.frames_ran(0)
+        self.schedule(session)
+        await future
+        return {"frame": session.frame, "cycles": session.emulator.cycles}
+
+    def close(self, request: dict) -> dict:
+        self.close_session(self.session(request))
+        return {}
+
+    def close_session(self, session: Session):
+        session.closed = True
+        session.fail(RequestError("Session closed."))
+        self.sessions.pop(session.id, None)
+
+    async def handle(self, request: dict, connection: "Connection") -> dict:
+        op = request.get("op")
+        if op == "create":
+            response = self.create(request)
+            connection.created.add(response["session"])
+            return response
+        if op == "key":
+            return self.key(request)
+        if op == "step":
+            return await self.step(request)
+        if op == "framebuffer":
+            return connection.framebuffer_diff(self.session(request), request.get("full", False))
+        if op == "close":
+            response = self.close(request)
+            connection.presented.pop(request["session"], None)
+            connection.created.discard(request["session"])
+            return response
+        raise RequestError(f"Unknown op {op!r}.")
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(self, writer)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    # the last request may come without a newline
+                    line = e.partial
+                    if not line:
+                        break
+                except asyncio.LimitOverrunError:
+                    await skip_line(reader)
+                    await connection.send(
+                        {"error": f"Request longer than {REQUEST_LIMIT} bytes."}
+                    )
+                    continue
+                # requests run concurrently so a long step does not block the
+                # connection's other sessions; responses carry the request id
+                task = asyncio.create_task(connection.respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for session_id in connection.created:
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    self.close_session(session)
+            writer.close()
+
+
+async def skip_line(reader: asyncio.StreamReader):
+    """Drop the rest of a request line that went over the reader's limit."""
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+
+
+class Connection:
+    """Per-client state: what each session's screen looked like when last sent."""
+
+    def __init__(self, server: EmulatorServer, writer: asyncio.StreamWriter) -> None:
+        self.server = server
+        self.writer = writer
+        self.presented: Dict[int, Optional[List[int]]] = {}
+        # sessions this client created and has not closed yet
+        self.created: Set[int] = set()
+
+    async def respond(self, line: bytes):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("Requests are JSON objects.")
+            request_id = request.get("id")
+            response = await self.server.handle(request, self)
+        except (RequestError, ValueError) as e:
+            response = {"error": str(e)}
+        except Exception as e:
+            # never leave a pipelined client waiting on a request that failed
+            response = {"error": f"{type(e).__name__}: {e}"}
+        if request_id is not None:
+            response["id"] = request_id
+        await self.send(response)
+
+    async def send(self, response: dict):
+        try:
+            self.writer.write(json.dumps(response).encode() + b"\n")
+            await self.writer.drain()
+        except ConnectionError:
+            # the client went away; serve_connection closes its sessions
+            pass
+
+    def framebuffer_diff(self, session: Session, full: bool) -> dict:
+        emulator = session.emulator
+        rows = emulator.screen_rows
+        presented = self.presented.get(session.id)
+        if full or presented is None or len(presented) != len(rows):
+            changed = range(len(rows))
+        else:
+            changed = [y for y, row in enumerate(rows) if row != presented[y]]
+        self.presented[session.id] = list(rows)
+
+        digits = emulator.screen_width // 4
+        return {
+            "width": emulator.screen_width,
+            "height": emulator.screen_height,
+            "frame": session.frame,
+            "rows": {str(y): format(rows[y], f"0{digits}x") for y in changed},
+        }
+
+
+async def serve(host: str, port: int, unix_path: str = None, workers: int = 0):
+    server = EmulatorServer(workers=workers)
+    server.start()
+    if unix_path:
+        listener = await asyncio.start_unix_server(
+            server.serve_connection, path=unix_path, limit=REQUEST_LIMIT
+        )
+    else:
+        listener = await asyncio.start_server(
+            server.serve_connection, host, port, limit=REQUEST_LIMIT
+        )
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve headless CHIP-8 sessions over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="run sessions in this many worker processes"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import random
+
+import pytest
+
+from batch_emulator import STACK_DEPTH, BatchEmulator
+from block_translator import translations
+from emulator import Emulator
+
+ENGINES = {
+    "interpreter": {},
+    "translator": {"translate_blocks": True},
+    "no idle skip": {"skip_idle_loops": False},
+}
+
+
+def random_program(rng: random.Random, length: int = 96) -> bytes:
+    """A looping program of mostly well-formed instructions, including skips,
+    forward jumps and FX33/FX55 writes that can land on its own code."""
+    end = 0x200 + length * 2
+
+    def address(start=0x200):
+        return rng.randrange(start, end, 2)
+
+    def instruction(here):
+        x, y, nn = rng.randrange(16), rng.randrange(16), rng.randrange(256)
+        kind = rng.random()
+        if kind < 0.3:
+            return 0x8000 | x << 8 | y << 4 | rng.choice([0, 1, 2, 3, 4, 5, 6, 7, 0xE])
+        if kind < 0.45:
+            return rng.choice([0x6000, 0x7000, 0x3000, 0x4000]) | x << 8 | nn
+        if kind < 0.5:
+            return rng.choice([0x5000, 0x9000]) | x << 8 | y << 4
+        if kind < 0.55:
+            # load a valid key number first; EX9E/EXA1 index the keypad with VX
+            return [0x6000 | x << 8 | rng.randrange(16), 0xE000 | x << 8 | rng.choice([0x9E, 0xA1])]
+        if kind < 0.65:
+            return 0xA000 | address()
+        if kind < 0.75:
+            return 0xF000 | x << 8 | rng.choice([0x07, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65])
+        if kind < 0.85:
+            return 0xD000 | x << 8 | y << 4 | rng.randrange(16)
+        if kind < 0.9:
+            return 0xC000 | x << 8 | nn
+        return 0x1000 | address(here + 2)
+
+    words = []
+    while len(words) < length - 2:
+        word = instruction(0x200 + len(words) * 2)
+        words.extend(word if isinstance(word, list) else [word])
+    words.append(0x1200)
+    return b"".join(word.to_bytes(2, "big") for word in words)
+
+
+def run(program: bytes, options: dict, frames: int, keys: list):
+    emulator = Emulator(seed=1, **options)
+    emulator.load_rom(program)
+    states = []
+    for frame in range(frames):
+        for key in range(16):
+            emulator.set_key(key, key == keys[frame])
+        try:
+            emulator.run_frames(1)
+        except Exception as e:
+            states.append(type(e).__name__)
+            break
+        states.append(emulator.save_state())
+    return states
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_engines_agree_on_random_programs(seed):
+    rng = random.Random(seed)
+    program = random_program(rng)
+    frames = 300
+    keys = [rng.randrange(20) for _ in range(frames)]
+
+    expected = run(program, ENGINES["interpreter"], frames, keys)
+    for name, options in ENGINES.items():
+        assert run(program, options, frames, keys) == expected, name
+
+
+def test_translator_reuses_translations():
+    rng = random.Random(2)
+    program = random_program(rng)
+    keys = [rng.randrange(20) for _ in range(300)]
+    translations.clear()
+    first = run(program, ENGINES["translator"], 300, keys)
+    traced = sum(len(versions) for versions in translations.values())
+    assert traced
+
+    # a second session of the same program traces nothing new
+    assert run(program, ENGINES["translator"], 300, keys) == first
+    assert sum(len(versions) for versions in translations.values()) == traced
+
+
+def test_engines_agree_on_idle_loop():
+    # V0 = 5, delay = V0, then spin on FX07 until it runs out
+    program = bytes([0x60, 0x05, 0xF0, 0x15, 0xF1, 0x07, 0x31, 0x00, 0x12, 0x04, 0x12, 0x00])
+    keys = [16] * 120
+    expected = run(program, ENGINES["interpreter"], 120, keys)
+    for name, options in ENGINES.items():
+        assert run(program, options, 120, keys) == expected, name
+
+
+@pytest.mark.parametrize("head", [[0x1204], [0xF107, 0x3100, 0x1204]])
+def test_idle_loop_detection_in_extended_memory(head):
+    # 1NNN only reaches the first 4 KiB: 1204 at 0x1204 jumps to 0x204 and is
+    # not a loop, and neither is an FX07 wait at 0x1204 ending in it
+    program = bytearray(0x10000 - 0x200)
+
+    def put(address, words):
+        for word in words:
+            program[address - 0x200 : address - 0x200 + 2] = word.to_bytes(2, "big")
+            address += 2
+
+    # delay = 255, then run V0 += 1 from 0xFFE up to the loop head
+    put(0x200, [0x62FF, 0xF215, 0x1FFE])
+    put(0xFFE, [0x7001] * ((0x1204 - 0xFFE) // 2))
+    put(0x1204, head)
+
+    results = []
+    for skip_idle_loops in (True, False):
+        emulator = Emulator(extended_memory=True, skip_idle_loops=skip_idle_loops)
+        emulator.load_rom(bytes(program))
+        emulator.run_frames(40)
+        results.append(emulator.save_state())
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("set_vx_to_vy", [False, True])
+def test_batch_emulator_matches_emulators(set_vx_to_vy):
+    rng = random.Random(int(set_vx_to_vy))
+    count, frames = 24, 120
+    programs = [random_program(rng) for _ in range(count)]
+    batch = BatchEmulator(count, set_vx_to_vy=set_vx_to_vy, seeds=range(count))
+    emulators = []
+    for machine, program in enumerate(programs):
+        batch.load_rom(program, [machine])
+        emulator = Emulator(seed=machine, set_vx_to_vy=set_vx_to_vy)
+        emulator.load_rom(program)
+        emulators.append(emulator)
+
+    failed = [None] * count
+    for _ in range(frames):
+        for machine, emulator in enumerate(emulators):
+            key = rng.randrange(20)
+            for index in range(16):
+                batch.set_key(machine, index, index == key)
+                emulator.set_key(index, index == key)
+        batch.run_frames(1)
+        for machine, emulator in enumerate(emulators):
+            if failed[machine] is not None:
+                continue
+            if batch.errors[machine] == "IndexError: stack overflow":
+                # the documented STACK_DEPTH limit; Emulator's stack has none
+                failed[machine] = "stack overflow"
+                continue
+            try:
+                emulator.run_frames(1)
+            except Exception as e:
+                failed[machine] = type(e).__name__
+                assert batch.errors[machine] is not None
+                assert batch.errors[machine].startswith(failed[machine])
+                continue
+            assert batch.errors[machine] is None
+            assert batch.to_emulator(machine).save_state() == emulator.save_state()
+    # most programs have to survive the whole run for this to mean anything
+    assert failed.count(None) > count // 2
+
+
+def test_batch_emulator_stack_overflow():
+    # 2200 calls itself forever; Emulator's stack has no limit, the batch's
+    # stops the machine once STACK_DEPTH calls are on it
+    batch = BatchEmulator(2, seeds=range(2))
+    batch.load_rom(bytes.fromhex("2200"), [0])
+    batch.load_rom(bytes.fromhex("6001 1202"), [1])
+    batch.step(STACK_DEPTH + 5)
+
+    assert not batch.running[0] and batch.errors[0] == "IndexError: stack overflow"
+    assert batch.stack_pointer[0] == STACK_DEPTH
+    assert batch.running[1] and batch.errors[1] is None
+
+    emulator = Emulator()
+    emulator.load_rom(bytes.fromhex("2200"))
+    emulator.step(STACK_DEPTH)
+    assert batch.to_emulator(0).stack == emulator.stack
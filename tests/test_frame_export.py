@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from frame_export import GIF_CLEAR_CODE, GIF_END_CODE, GIF_MIN_CODE_SIZE, gif_lzw
+
+
+def lzw_decode(data: bytes) -> list:
+    """Plain GIF LZW decoder, written the way the format describes it."""
+    bits = int.from_bytes(data, "little")
+    position = 0
+    width = GIF_MIN_CODE_SIZE + 1
+    table, previous, output = None, None, []
+    while True:
+        code = bits >> position & ((1 << width) - 1)
+        position += width
+        if code == GIF_CLEAR_CODE:
+            table = [[value] for value in range(GIF_CLEAR_CODE)] + [None, None]
+            width, previous = GIF_MIN_CODE_SIZE + 1, None
+            continue
+        if code == GIF_END_CODE:
+            return output
+        entry = table[code] if code < len(table) else previous + previous[:1]
+        output += entry
+        if previous is not None:
+            table.append(previous + entry[:1])
+            if len(table) == 1 << width and width < 12:
+                width += 1
+        previous = entry
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 5), (32, 64), (64, 128), (256, 512)])
+def test_gif_lzw_round_trip(shape):
+    rng = np.random.default_rng(shape[0])
+    for density in (0.0, 0.1, 0.5):
+        pixels = (rng.random(shape) < density).astype(np.uint8)
+        assert lzw_decode(gif_lzw(pixels)) == pixels.reshape(-1).tolist()
+
+
+def test_gif_lzw_compresses_repeated_pixels():
+    # literal-only codes would take 9 bits for every 2 pixels, about 18 KB here
+    assert len(gif_lzw(np.zeros((128, 256), dtype=np.uint8))) < 1000
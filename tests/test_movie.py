@@ -0,0 +1,50 @@
+import contextlib
+import hashlib
+import io
+import json
+
+import pytest
+
+from emulator import Emulator
+from movie import Movie, main, play_movie
+
+# after its first four bytes, the program writes V1 = 0x42 as BCD at I, then
+# counts V1 up while key 5 is held, drawing its low digit every iteration
+LOOP = bytes.fromhex("6005 6142 F133 E0A1 7101 00E0 F129 D015 120A")
+PROGRAMS = {
+    # I = 0x300, jump over the rest of the four bytes
+    False: bytes([0xA3, 0x00, 0x12, 0x04]) + LOOP,
+    # F000 1000: I = 0x1000, past the end of 4 KiB memory
+    True: bytes([0xF0, 0x00, 0x10, 0x00]) + LOOP,
+}
+
+
+@pytest.mark.parametrize("extended_memory", [False, True])
+def test_movie_replays_recorded_session(tmp_path, extended_memory):
+    emulator = Emulator(extended_memory=extended_memory)
+    emulator.load_rom(PROGRAMS[extended_memory])
+    movie = emulator.start_recording(seed=9)
+    emulator.run_frames(10)
+    emulator.set_key(5, 1)
+    emulator.run_frames(7)
+    emulator.set_key(5, 0)
+    emulator.run_frames(10)
+    emulator.stop_recording()
+    path = tmp_path / "session.ch8m"
+    movie.save(str(path))
+
+    loaded = Movie.load(str(path))
+    assert loaded.events == [(10, 5, 1), (17, 5, 0)]
+    assert loaded.memory_size == len(emulator.memory)
+
+    replay = Emulator(extended_memory=extended_memory)
+    play_movie(replay, loaded)
+    assert replay.save_state() == emulator.save_state()
+
+    # the command line builds a machine of the recorded size by itself
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main([str(path)])
+    report = json.loads(output.getvalue())
+    assert report["frames"] == 27
+    assert report["framebuffer_sha1"] == hashlib.sha1(emulator.get_framebuffer()).hexdigest()
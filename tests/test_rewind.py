@@ -0,0 +1,84 @@
+from emulator import Emulator
+from rewind import RewindBuffer
+
+# counts V0 up, draws its digit and saves V0-V3 at I, which moves every loop
+PROGRAM = bytes.fromhex("6000 A300 7001 F029 D005 A300 F355 1204")
+
+
+def with_keys(state: bytes, key_states: bytes) -> bytes:
+    """``state`` with its keypad replaced, as a rewind leaves it."""
+    emulator = Emulator(seed=1)
+    emulator.load_state(state)
+    emulator.key_states[:] = key_states
+    return emulator.save_state()
+
+
+def record(frames: int, rewind: RewindBuffer):
+    emulator = Emulator(seed=1)
+    emulator.load_rom(PROGRAM)
+    states = []
+    for _ in range(frames):
+        emulator.run_frames(1)
+        rewind.push(emulator)
+        states.append(emulator.save_state())
+    return emulator, states
+
+
+def test_rewind_restores_each_earlier_frame():
+    # a short keyframe interval so rewinding crosses several keyframes
+    rewind = RewindBuffer(seconds=1, keyframe_interval=7)
+    emulator, states = record(40, rewind)
+
+    # the newest entry is the frame just played, then each one before it
+    for expected in reversed(states):
+        assert rewind.rewind(emulator)
+        assert emulator.save_state() == expected
+    assert not rewind.rewind(emulator)
+    assert len(rewind) == 0
+
+
+def test_rewind_keeps_only_capacity_frames():
+    rewind = RewindBuffer(seconds=0.5, keyframe_interval=10)
+    emulator, states = record(100, rewind)
+    assert len(rewind) == rewind.capacity == 30
+
+    assert rewind.rewind(emulator, frames=29)
+    assert emulator.save_state() == states[-29]
+    assert rewind.rewind(emulator)
+    assert emulator.save_state() == states[-30]
+    assert not rewind.rewind(emulator)
+
+
+def test_recording_resumes_after_rewind():
+    rewind = RewindBuffer(seconds=1, keyframe_interval=5)
+    emulator, states = record(20, rewind)
+    assert rewind.rewind(emulator, frames=8)
+    assert emulator.save_state() == states[12]
+
+    # the frames played after rewinding replace the rewound ones
+    emulator.set_key(3, 1)
+    replayed = []
+    for _ in range(12):
+        emulator.run_frames(1)
+        rewind.push(emulator)
+        replayed.append(emulator.save_state())
+    assert replayed[0] != states[13]
+    for expected in reversed(states[:12] + replayed):
+        assert rewind.rewind(emulator)
+        assert emulator.save_state() == with_keys(expected, emulator.key_states)
+
+
+def test_rewind_keeps_current_keys():
+    rewind = RewindBuffer(seconds=1)
+    emulator = Emulator(seed=1)
+    emulator.load_rom(PROGRAM)
+    emulator.set_key(5, 1)
+    emulator.run_frames(1)
+    rewind.push(emulator)
+    emulator.set_key(5, 0)
+    emulator.set_key(9, 1)
+    emulator.run_frames(1)
+
+    assert rewind.rewind(emulator)
+    # a key held in the snapshot but released since stays released
+    assert emulator.key_states[5] == 0 and emulator.key_states[9] == 1
@@ -0,0 +1,146 @@
+import asyncio
+import base64
+import json
+
+from emulator import Emulator
+from server import REQUEST_LIMIT, EmulatorServer
+
+# draws the 0 glyph at (0, 0), then loops forever
+ROM = bytes([0x60, 0x00, 0xA0, 0x50, 0xD0, 0x05, 0x12, 0x06])
+
+
+async def start_server():
+    server = EmulatorServer()
+    server.start()
+    listener = await asyncio.start_server(
+        server.serve_connection, "127.0.0.1", 0, limit=REQUEST_LIMIT
+    )
+    return server, listener, listener.sockets[0].getsockname()[1]
+
+
+async def connect(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    async def call(line):
+        if not isinstance(line, (bytes, str)):
+            line = json.dumps(line)
+        if isinstance(line, str):
+            line = line.encode()
+        writer.write(line + b"\n")
+        await writer.drain()
+        return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+    return call, writer
+
+
+def run_against_server(scenario):
+    async def main():
+        server, listener, port = await start_server()
+        call, writer = await connect(port)
+        try:
+            return await scenario(call)
+        finally:
+            writer.close()
+            listener.close()
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_create_step_framebuffer():
+    async def scenario(call):
+        rom = base64.b64encode(ROM).decode()
+        session = (await call({"op": "create", "rom_base64": rom, "options": {"seed": 3}}))["session"]
+        step = await call({"op": "step", "session": session, "frames": 10, "id": 7})
+        first = await call({"op": "framebuffer", "session": session})
+        again = await call({"op": "framebuffer", "session": session})
+        full = await call({"op": "framebuffer", "session": session, "full": True})
+        closed = await call({"op": "close", "session": session})
+        return step, first, again, full, closed
+
+    step, first, again, full, closed = run_against_server(scenario)
+
+    emulator = Emulator(seed=3)
+    emulator.load_rom(ROM)
+    emulator.run_frames(10)
+    assert step == {"frame": 10, "cycles": emulator.cycles, "id": 7}
+    assert (first["width"], first["height"]) == (64, 32)
+    assert first["rows"] == {str(y): format(row, "016x") for y, row in enumerate(emulator.screen_rows)}
+    # only changed rows are sent again, unless asked for all of them
+    assert again["rows"] == {}
+    assert full["rows"] == first["rows"]
+    assert closed == {}
+
+
+def test_bad_requests_get_error_responses():
+    async def scenario(call):
+        return [
+            await call(line)
+            for line in (
+                b"not json",
+                b"[1, 2]",
+                {"op": "create", "rom_base64": "", "options": {"seed": {}}, "id": 1},
+                {"op": "create", "rom_base64": "", "options": {"turbo": True}},
+                {"op": "create", "rom_base64": "", "options": []},
+                {"op": "create", "rom": 5},
+                {"op": "step", "session": [1], "id": 2},
+                {"op": "step", "session": 99},
+                {"op": "key", "session": 1, "key": 16},
+                {"op": "close", "session": {}},
+                {"op": "explode"},
+            )
+        ]
+
+    responses = run_against_server(scenario)
+    assert all("error" in response for response in responses)
+    assert responses[2]["id"] == 1
+    assert responses[6]["id"] == 2
+
+
+def test_connection_survives_bad_requests():
+    async def scenario(call):
+        await call({"op": "step", "session": [1]})
+        created = await call({"op": "create", "rom_base64": base64.b64encode(ROM).decode()})
+        return await call({"op": "step", "session": created["session"], "frames": 1})
+
+    assert run_against_server(scenario)["frame"] == 1
+
+
+def test_large_requests():
+    async def scenario(call):
+        # the largest ROM extended memory takes still fits in one request
+        rom = base64.b64encode(bytes(0x10000 - 0x200)).decode()
+        created = await call(
+            {"op": "create", "rom_base64": rom, "options": {"extended_memory": True}, "id": 1}
+        )
+        too_long = await call(b'{"op": "create", "rom_base64": "' + b"A" * REQUEST_LIMIT + b'"}')
+        after = await call({"op": "step", "session": created["session"], "frames": 1})
+        return created, too_long, after
+
+    created, too_long, after = run_against_server(scenario)
+    assert created == {"session": 1, "id": 1}
+    assert "error" in too_long
+    assert after["frame"] == 1
+
+
+def test_disconnect_closes_sessions():
+    async def main():
+        server, listener, port = await start_server()
+        try:
+            call, writer = await connect(port)
+            await call({"op": "create", "rom_base64": base64.b64encode(ROM).decode()})
+            other_call, other_writer = await connect(port)
+            kept = await other_call({"op": "create", "rom_base64": base64.b64encode(ROM).decode()})
+            writer.close()
+            for _ in range(100):
+                if len(server.sessions) == 1:
+                    break
+                await asyncio.sleep(0.01)
+            other_writer.close()
+            return list(server.sessions), kept["session"]
+        finally:
+            listener.close()
+            await server.stop()
+
+    sessions, kept = asyncio.run(main())
+    assert sessions == [kept]
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from emulator import Emulator
+
+# high resolution; the main loop calls a subroutine drawing the digit in V0
+# at (V0, V0), counts V0 up, loads it into the delay timer and saves V0-V3
+PROGRAM = bytes.fromhex("00FF 6000 2210 7001 F015 A300 F355 1204 F029 D005 00EE")
+
+
+def running_emulator(extended_memory=False, frames=25) -> Emulator:
+    emulator = Emulator(seed=1, extended_memory=extended_memory)
+    emulator.load_rom(PROGRAM)
+    emulator.run_frames(frames)
+    emulator.set_key(7, 1)
+    return emulator
+
+
+@pytest.mark.parametrize("extended_memory", [False, True])
+def test_save_load_round_trip(extended_memory):
+    emulator = running_emulator(extended_memory)
+    emulator.memory[-1] = 0x5A
+    state = emulator.save_state()
+
+    restored = Emulator(seed=1, extended_memory=extended_memory)
+    restored.load_state(state)
+    assert restored.save_state() == state
+    assert restored.high_resolution and restored.stack == emulator.stack
+
+    # both machines carry on identically from the restored state
+    emulator.run_frames(30)
+    restored.run_frames(30)
+    assert restored.save_state() == emulator.save_state()
+
+
+def test_save_load_through_files():
+    emulator = running_emulator()
+    file = io.BytesIO()
+    state = emulator.save_state(file)
+    assert file.getvalue() == state
+
+    file.seek(0)
+    restored = Emulator()
+    restored.load_state(file)
+    assert restored.save_state() == state
+
+
+def test_load_state_rejects_other_blobs():
+    state = running_emulator().save_state()
+    with pytest.raises(ValueError):
+        Emulator().load_state(b"XXXX" + state[4:])
+    with pytest.raises(ValueError):
+        Emulator(extended_memory=True).load_state(state)
@@ -0,0 +1,23 @@
+from emulator import Emulator
+
+# V0 = 99, delay = 7, wait for it on FX07 (an idle loop that keeps changing
+# V0), then V2 += 1 and jump to itself forever
+PROGRAM = bytes.fromhex("6099 6107 F115 F007 3000 1206 7201 120E")
+
+
+def test_idle_loop_skips_are_their_own_entries():
+    emulator = Emulator()
+    emulator.load_rom(PROGRAM)
+    trace = emulator.enable_tracing(1000)
+    emulator.run_frames(12)
+    entries = trace.entries()
+
+    waits = [entry for entry in entries if entry.pc == 0x206]
+    assert [entry.changes for entry in waits] == [{"V0": value} for value in range(7, -1, -1)]
+    assert all(entry.skipped for entry in waits[:-1]) and not waits[-1].skipped
+    # what the skipped iterations did is not credited to the instructions after them
+    after = [entry for entry in entries if entry.pc in (0x208, 0x20C)]
+    assert [entry.changes for entry in after] == [{}, {"V2": 1}]
+
+    assert trace.idle_instructions == sum(entry.skipped for entry in entries)
+    assert sum(entry.skipped or 1 for entry in entries) == emulator.cycles
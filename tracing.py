@@ -0,0 +1,141 @@
+from array import array
+from typing import Dict, List, NamedTuple
+
+from idle_loops import IdleLoop
+
+DEFAULT_TRACE_CAPACITY = 1 << 16
+
+
+class TraceEntry(NamedTuple):
+    # 1 for the first instruction traced, counting up; an idle-loop skip is one entry
+    number: int
+    pc: int
+    opcode: int
+    # register name ("V0".."VF", "I", "carry") -> value after the instruction
+    changes: Dict[str, int]
+    # for a fast-forwarded idle loop: the instructions it stands for
+    skipped: int = 0
+
+
+class TraceBuffer:
+    """Ring buffer of the last ``capacity`` instructions an ``Emulator`` ran.
+
+    Enabled with ``Emulator.enable_tracing()``; like the profiler it takes
+    over ``execute`` (bypassing the block translator) only while attached.
+    Per instruction it stores the PC, the opcode and the registers after it
+    into preallocated arrays; which registers changed is worked out when
+    ``entries`` reads the buffer, not while tracing. Idle loops that are
+    fast-forwarded are not traced one by one: the skip becomes a single entry
+    at the loop head carrying what the skipped iterations changed, and the
+    instructions are also counted in ``idle_instructions``.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_TRACE_CAPACITY) -> None:
+        self.capacity = capacity
+        # one spare slot keeps the registers from before the oldest entry
+        slots = capacity + 1
+        self.slots = slots
+        self.pcs = array("H", bytes(2 * slots))
+        self.opcodes = array("H", bytes(2 * slots))
+        self.indexes = array("H", bytes(2 * slots))
+        self.carries = bytearray(slots)
+        self.registers = bytearray(16 * slots)
+        # instructions recorded so far; slot 0 holds the registers at the start
+        self.count = 0
+        self.idle_instructions = 0
+        # entry number -> instructions skipped, for the idle-loop entries
+        self.skips: Dict[int, int] = {}
+
+    def start(self, emulator):
+        """Take the registers that the first traced instruction is compared with."""
+        self.count = 0
+        self.skips.clear()
+        self.store_registers(emulator, 0)
+
+    def store_registers(self, emulator, slot: int):
+        self.indexes[slot] = emulator.index_register
+        self.carries[slot] = emulator.carry_flag
+        self.registers[16 * slot : 16 * slot + 16] = emulator.variable_register
+
+    def execute(self, emulator, count: int):
+        memory = emulator.memory
+        cycle = emulator.cycle
+        registers = emulator.variable_register
+        slots = self.slots
+        pcs = self.pcs
+        opcodes = self.opcodes
+        indexes = self.indexes
+        carries = self.carries
+        trace_registers = self.registers
+        number = self.count
+
+        executed = 0
+        try:
+            for executed in range(count):
+                program_counter = emulator.program_counter
+                number += 1
+                slot = number % slots
+                pcs[slot] = program_counter
+                opcodes[slot] = (memory[program_counter] << 8) | memory[program_counter + 1]
+                cycle()
+                indexes[slot] = emulator.index_register
+                carries[slot] = emulator.carry_flag
+                trace_registers[16 * slot : 16 * slot + 16] = registers
+        except IdleLoop as loop:
+            # the loop head never ran; its slot becomes the entry for the
+            # whole skip, so the next instruction is compared with the
+            # registers the skip left behind
+            remaining = count - executed
+            self.idle_instructions += remaining
+            emulator.skip_idle_loop(loop, remaining)
+            self.store_registers(emulator, number % slots)
+            skips = self.skips
+            skips[number] = remaining
+            for old in [old for old in skips if old <= number - self.capacity]:
+                del skips[old]
+        finally:
+            self.count = number
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def entries(self, limit: int = None) -> List[TraceEntry]:
+        """The newest ``limit`` (default: all kept) instructions, oldest first."""
+        size = len(self) if limit is None else min(limit, len(self))
+        entries = []
+        for number in range(self.count - size + 1, self.count + 1):
+            slot = number % self.slots
+            previous = (number - 1) % self.slots
+            entries.append(
+                TraceEntry(
+                    number,
+                    self.pcs[slot],
+                    self.opcodes[slot],
+                    self.changes(previous, slot),
+                    self.skips.get(number, 0),
+                )
+            )
+        return entries
+
+    def changes(self, previous: int, slot: int) -> Dict[str, int]:
+        changes = {}
+        before = self.registers[16 * previous : 16 * previous + 16]
+        after = self.registers[16 * slot : 16 * slot + 16]
+        for register in range(16):
+            if before[register] != after[register]:
+                changes[f"V{register:X}"] = after[register]
+        if self.indexes[previous] != self.indexes[slot]:
+            changes["I"] = self.indexes[slot]
+        if self.carries[previous] != self.carries[slot]:
+            changes["carry"] = self.carries[slot]
+        return changes
+
+    def format(self, limit: int = None) -> str:
+        """One line per instruction: number, PC, opcode and the registers it changed."""
+        lines = []
+        for entry in self.entries(limit):
+            changed = " ".join(f"{name}={value:X}" for name, value in entry.changes.items())
+            if entry.skipped:
+                changed = f"{changed} (idle loop, {entry.skipped} instructions)".lstrip()
+            lines.append(f"{entry.number:>10} {entry.pc:04X} {entry.opcode:04X} {changed}")
+        return "\n".join(lines)
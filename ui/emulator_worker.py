@@ -1,22 +1,88 @@
 import pathlib
+import threading
+import time
+
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT
 from emulator import Emulator
+from scheduler import FrameScheduler, TIMER_PERIOD
+
 
 class EmulatorWorker(QThread):
+    """Runs one emulator session on its own thread.
+
+    Frames are published into a shared buffer guarded by a lock and
+    announced with ``frame_ready``; the GUI paints whatever is latest, so a
+    busy GUI just skips frames instead of queueing them up.
+    """
+
     error = pyqtSignal(Exception)
+    frame_ready = pyqtSignal()
+    sound_changed = pyqtSignal(bool)
 
-    def __init__(self, parent: QObject, rom_path: pathlib.Path) -> None:
+    def __init__(self, parent: QObject, rom_path: pathlib.Path, **emulator_options) -> None:
         super().__init__(parent)
         self.rom_path = rom_path
-        self.emulator = Emulator()
+        self.emulator = Emulator(**emulator_options)
+        self.scheduler = FrameScheduler(self.emulator)
+        self.running = False
+        self.frame_lock = threading.Lock()
+        self.frame = (SCREEN_WIDTH, SCREEN_HEIGHT, bytes(SCREEN_WIDTH * SCREEN_HEIGHT))
+        self.published_rows = None
 
     def stop_running(self) -> None:
-        self.emulator.stop()
-        self.terminate()
+        self.running = False
         self.wait()
 
+    def set_key(self, key: int, pressed: bool):
+        # a single bytearray store, safe to call from the GUI thread
+        self.emulator.set_key(key, pressed)
+
+    def latest_frame(self):
+        """Return (width, height, pixels) of the newest frame, one 0/1 byte per pixel."""
+        with self.frame_lock:
+            return self.frame
+
+    def publish_frame(self):
+        rows = self.emulator.screen_rows
+        if rows == self.published_rows:
+            return
+
+        self.published_rows = list(rows)
+        emulator = self.emulator
+        frame = (emulator.screen_width, emulator.screen_height, emulator.get_framebuffer())
+        with self.frame_lock:
+            self.frame = frame
+        self.frame_ready.emit()
+
     def run(self) -> None:
+        emulator = self.emulator
+        self.running = True
+        sounding = False
         try:
-            self.emulator.run(self.rom_path)
+            emulator.load_program(str(self.rom_path))
+            self.scheduler.reset()
+
+            while self.running:
+                started = time.perf_counter()
+                self.scheduler.advance(started)
+
+                if emulator.draw_flag:
+                    self.publish_frame()
+                    emulator.draw_flag = False
+
+                if (emulator.sound_timer > 0) != sounding:
+                    sounding = not sounding
+                    self.sound_changed.emit(sounding)
+
+                # sleep out the rest of this 60 Hz period
+                remaining = TIMER_PERIOD - (time.perf_counter() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
         except Exception as e:
             self.error.emit(e)
+        finally:
+            self.running = False
+            if sounding:
+                self.sound_changed.emit(False)
@@ -1,9 +1,10 @@
 import configparser
 import pathlib
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Iterable, List
 
-from ui.emulator_worker import EmulatorWorker
-from PyQt6.QtCore import QFileInfo
+from roms import RomEntry, RomIndex
+from ui.rom_scanner import RomScanner
+from PyQt6.QtCore import QFileInfo, Qt, QTimer
 from PyQt6.QtGui import QAction, QCloseEvent, QKeyEvent, QKeySequence
 from PyQt6.QtWidgets import (
     QApplication,
@@ -16,8 +17,13 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
+if TYPE_CHECKING:
+    from ui.screen_widget import ScreenWidget
+
 ROMS_FOLDER_CONFIG_KEY = "current_rom_folder"
 PREVIOUS_FILE_DIR_KEY = "prev_file_dir"
+RECURSIVE_SCAN_KEY = "recursive_scan"
+ROM_INDEX_PATH = "rom_index.sqlite3"
 
 
 def exit_application():
@@ -28,13 +34,20 @@ def exit_application():
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
-        self.game_thread = None
-        self.emulator = None
+        # open emulator windows, each running on its own thread
+        self.sessions: List["ScreenWidget"] = []
         self.list_widget = None
         self.main_layout = None
         self.central_widget = None
         self.config = configparser.ConfigParser()
-        self.roms: Dict[str, pathlib.Path] = {}
+        # list items by ROM path, filled from the index and then the scanner
+        self.roms: Dict[str, QListWidgetItem] = {}
+        # latest index entry of each listed ROM
+        self.rom_entries: Dict[str, RomEntry] = {}
+        # paths listed for each content hash, to flag duplicates
+        self.rom_hashes: Dict[str, List[str]] = {}
+        self.rom_index = RomIndex(ROM_INDEX_PATH)
+        self.scanner = None
 
         self.check_config()
 
@@ -42,6 +55,7 @@ class MainWindow(QMainWindow):
             key=ROMS_FOLDER_CONFIG_KEY, default=str(pathlib.Path.cwd().absolute())
         )
         self.previous_dir = self.load_config(key=PREVIOUS_FILE_DIR_KEY, default="/")
+        self.recursive_scan = self.load_config(key=RECURSIVE_SCAN_KEY, default="yes") == "yes"
 
         self.init_ui()
 
@@ -91,6 +105,12 @@ class MainWindow(QMainWindow):
         set_rom_folder_action.setShortcut("Ctrl+L")
         set_rom_folder_action.triggered.connect(self.get_roms_folder)
         file_menu.addAction(set_rom_folder_action)
+
+        recursive_scan_action = QAction("Include Subfolders", self)
+        recursive_scan_action.setCheckable(True)
+        recursive_scan_action.setChecked(self.recursive_scan)
+        recursive_scan_action.toggled.connect(self.set_recursive_scan)
+        file_menu.addAction(recursive_scan_action)
         file_menu.addSeparator()
 
         quit_action = QAction("Close Application", self)
@@ -102,9 +122,10 @@ class MainWindow(QMainWindow):
 
         self.list_widget = QListWidget()
         self.list_widget.setAlternatingRowColors(True)
+        self.list_widget.setSortingEnabled(True)
         self.list_widget.itemClicked.connect(self.on_list_item_clicked)
-        self.load_roms(self.roms_folder)
-        self.add_roms_to_list()
+        # fill the list once the window is on screen
+        QTimer.singleShot(0, lambda: self.load_roms(self.roms_folder))
 
         self.main_layout.addWidget(self.list_widget)
 
@@ -112,6 +133,8 @@ class MainWindow(QMainWindow):
         file_name, _ = QFileDialog.getOpenFileName(
             self, "Open File", self.previous_dir, "CHIP-8 ROMS (*.ch8)"
         )
+        if not file_name:
+            return
         self.previous_dir = QFileInfo(file_name).absolutePath()
         self.save_config(key=PREVIOUS_FILE_DIR_KEY, value=self.previous_dir)
 
@@ -122,49 +145,141 @@ class MainWindow(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "Select ROM Folder")
 
         if folder_path:
-            self.roms.clear()
-            self.list_widget.clear()
             self.roms_folder = folder_path
             self.save_config(key=ROMS_FOLDER_CONFIG_KEY, value=folder_path)
             self.load_roms(folder_path)
         else:
             QMessageBox.warning(self, "No Folder Selected", "No folder was selected")
 
-        self.add_roms_to_list()
+    def set_recursive_scan(self, recursive: bool):
+        self.recursive_scan = recursive
+        self.save_config(key=RECURSIVE_SCAN_KEY, value="yes" if recursive else "no")
+        self.load_roms(self.roms_folder)
 
     def load_roms(self, folder_path: str):
-        folder = pathlib.Path(folder_path)
-        content = folder.iterdir()
-
-        for item in content:
-            if not item.is_dir():
-                if item.suffix == ".ch8":
-                    self.roms[f"{item.name}"] = item
+        """Show the indexed ROMs of ``folder_path`` at once, then rescan it in the background."""
+        self.stop_scanner()
+        self.roms.clear()
+        self.rom_entries.clear()
+        self.rom_hashes.clear()
+        self.list_widget.clear()
+
+        folder = pathlib.Path(folder_path).absolute()
+        self.add_roms_to_list(
+            entry
+            for entry in self.rom_index.entries(folder)
+            if self.recursive_scan or pathlib.Path(entry.path).parent == folder
+        )
 
-    def add_roms_to_list(self):
-        for rom in self.roms.keys():
-            list_item = QListWidgetItem()
-            list_item.setText(rom)
-            self.list_widget.addItem(list_item)
+        self.scanner = RomScanner(
+            parent=self,
+            index_path=ROM_INDEX_PATH,
+            folder_path=str(folder),
+            recursive=self.recursive_scan,
+        )
+        self.scanner.batch_found.connect(self.add_roms_to_list)
+        self.scanner.scan_finished.connect(self.on_scan_finished)
+        self.scanner.error.connect(lambda x: print(x))
+        self.scanner.start()
+
+    def stop_scanner(self):
+        if self.scanner is not None:
+            self.scanner.stop_running()
+            self.scanner = None
+
+    def add_roms_to_list(self, entries: Iterable[RomEntry]):
+        # re-sorting after every insert is quadratic, sort each batch once
+        self.list_widget.setSortingEnabled(False)
+        # paths whose duplicate status may have changed
+        affected = set()
+        for entry in entries:
+            if entry.path not in self.roms:
+                list_item = QListWidgetItem()
+                list_item.setData(Qt.ItemDataRole.UserRole, entry.path)
+                self.roms[entry.path] = list_item
+                self.list_widget.addItem(list_item)
+
+            previous = self.rom_entries.get(entry.path)
+            if previous is not None and previous.sha1 != entry.sha1:
+                # the file was rewritten; it leaves its old group of copies
+                old_copies = self.rom_hashes[previous.sha1]
+                old_copies.remove(entry.path)
+                affected.update(old_copies)
+            self.rom_entries[entry.path] = entry
+
+            copies = self.rom_hashes.setdefault(entry.sha1, [])
+            if entry.path not in copies:
+                copies.append(entry.path)
+            affected.update(copies)
+
+        for path in affected:
+            self.label_rom(path)
+        self.list_widget.setSortingEnabled(True)
+
+    def label_rom(self, path: str):
+        """Set a ROM's text and tooltip, flagging it while another listed file has its contents."""
+        entry = self.rom_entries[path]
+        list_item = self.roms[path]
+        copies = self.rom_hashes[entry.sha1]
+        if len(copies) > 1:
+            others = "\n".join(copy for copy in copies if copy != path)
+            list_item.setText(f"{pathlib.Path(path).name} (duplicate)")
+            list_item.setToolTip(f"{path}\nSame contents as:\n{others}")
+        else:
+            list_item.setText(entry.name)
+            list_item.setToolTip(self.describe_rom(entry))
+
+    @staticmethod
+    def describe_rom(entry: RomEntry) -> str:
+        lines = [entry.path, f"{entry.size} bytes, sha1 {entry.sha1}"]
+        if entry.quirks:
+            lines.append(f"Quirks: {entry.quirks}")
+        if entry.runs:
+            lines.append(f"Played {entry.runs} times, {entry.last_frames} frames last time")
+        return "\n".join(lines)
+
+    def on_scan_finished(self, seen: set):
+        # drop ROMs that were indexed but are gone from disk
+        for path in [path for path in self.roms if path not in seen]:
+            list_item = self.roms.pop(path)
+            self.list_widget.takeItem(self.list_widget.row(list_item))
+            del self.rom_entries[path]
+
+        # regroup what is left and relabel every item, so copies whose twin
+        # was deleted or changed lose their duplicate marker
+        self.rom_hashes.clear()
+        for path, entry in self.rom_entries.items():
+            self.rom_hashes.setdefault(entry.sha1, []).append(path)
+        self.list_widget.setSortingEnabled(False)
+        for path in self.rom_entries:
+            self.label_rom(path)
+        self.list_widget.setSortingEnabled(True)
 
     def on_list_item_clicked(self, item: QListWidgetItem):
-        file = self.roms[item.text()]
+        file = pathlib.Path(item.data(Qt.ItemDataRole.UserRole))
 
         self.run_rom(file.absolute())
 
     def run_rom(self, rom_path: pathlib.Path):
-        """try:
-            self.emulator = Emulator()
-            self.game_thread = threading.Thread(target=self.emulator.run(rom_path))
-            self.game_thread.start()
-        except Exception as e:
-            print(e)"""
-        self.emulator_worker = EmulatorWorker(parent=self, rom_path=rom_path)
-        self.emulator_worker.error.connect(lambda x: print(x))
-        self.emulator_worker.run()
+        # the emulator core, numpy and audio are only needed once a ROM runs,
+        # keep them out of the import chain before the first window
+        from ui.screen_widget import ScreenWidget
+
+        session = ScreenWidget(rom_path)
+        session.closed.connect(self.on_session_closed)
+        self.sessions.append(session)
+        session.show()
+
+    def on_session_closed(self, session: "ScreenWidget"):
+        if session in self.sessions:
+            self.sessions.remove(session)
+        worker = session.worker
+        self.rom_index.record_run(worker.rom_path.absolute(), worker.emulator.frame_count)
 
     def closeEvent(self, event: QCloseEvent | None) -> None:
-        if self.emulator_worker:
-            self.emulator_worker.stop_running()
-        
+        for session in list(self.sessions):
+            session.close()
+        self.stop_scanner()
+        self.rom_index.close()
+
         event.accept()
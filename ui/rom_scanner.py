@@ -0,0 +1,41 @@
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from roms import RomIndex
+
+
+class RomScanner(QThread):
+    """Updates the ROM index for one folder in the background.
+
+    Entries are streamed out in batches through ``batch_found`` as the walk
+    goes; ``scan_finished`` carries every path seen, once the walk completes.
+    """
+
+    batch_found = pyqtSignal(list)
+    scan_finished = pyqtSignal(set)
+    error = pyqtSignal(Exception)
+
+    def __init__(self, parent: QObject, index_path: str, folder_path: str, recursive: bool) -> None:
+        super().__init__(parent)
+        self.index_path = index_path
+        self.folder_path = folder_path
+        self.recursive = recursive
+
+    def stop_running(self) -> None:
+        self.requestInterruption()
+        self.wait()
+
+    def run(self) -> None:
+        # SQLite connections are per thread, so the scan gets its own
+        index = RomIndex(self.index_path)
+        seen = set()
+        try:
+            for batch in index.scan(self.folder_path, recursive=self.recursive):
+                if self.isInterruptionRequested():
+                    return
+                seen.update(entry.path for entry in batch)
+                self.batch_found.emit(batch)
+            self.scan_finished.emit(seen)
+        except Exception as e:
+            self.error.emit(e)
+        finally:
+            index.close()
@@ -0,0 +1,74 @@
+import pathlib
+
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtGui import QCloseEvent, QImage, QKeyEvent, QPainter, QPaintEvent, qRgb
+from PyQt6.QtWidgets import QWidget
+
+from audio import Beeper
+from constants import DEFAULT_KEYMAP, SCREEN_WIDTH, SCREEN_HEIGHT
+from ui.emulator_worker import EmulatorWorker
+
+PALETTE = [qRgb(0, 0, 0), qRgb(255, 255, 255)]
+SCALE_FACTOR = 10
+
+
+def qt_keymap(keymap):
+    """Turn a key-name keymap into a Qt key code -> CHIP-8 key lookup table."""
+    # Qt key codes of digits and letters are their upper-case code points
+    return {ord(name.upper()): key for name, key in keymap.items()}
+
+
+class ScreenWidget(QWidget):
+    """Window showing one emulator session; owns the worker thread running it."""
+
+    closed = pyqtSignal(QWidget)
+
+    def __init__(self, rom_path: pathlib.Path, keymap=None, **emulator_options) -> None:
+        super().__init__()
+        self.keymap = qt_keymap(keymap or DEFAULT_KEYMAP)
+        self.beeper = Beeper()
+        self.image = None
+
+        self.setWindowTitle(rom_path.name)
+        self.resize(SCREEN_WIDTH * SCALE_FACTOR, SCREEN_HEIGHT * SCALE_FACTOR)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+        self.worker = EmulatorWorker(parent=self, rom_path=rom_path, **emulator_options)
+        self.worker.error.connect(lambda x: print(x))
+        self.worker.frame_ready.connect(self.update)
+        self.worker.sound_changed.connect(self.beeper.set_playing)
+        self.worker.start()
+
+    def paintEvent(self, event: QPaintEvent | None) -> None:
+        width, height, pixels = self.worker.latest_frame()
+        # the QImage only wraps the bytes, keep them alive while it is used
+        self.image = QImage(pixels, width, height, width, QImage.Format.Format_Indexed8)
+        self.image.setColorTable(PALETTE)
+
+        painter = QPainter(self)
+        painter.drawImage(self.rect(), self.image)
+        painter.end()
+
+    def keyPressEvent(self, event: QKeyEvent | None) -> None:
+        self.handle_key(event, True)
+
+    def keyReleaseEvent(self, event: QKeyEvent | None) -> None:
+        self.handle_key(event, False)
+
+    def handle_key(self, event: QKeyEvent, pressed: bool):
+        key = self.keymap.get(event.key())
+        if key is None:
+            event.ignore()
+            return
+        if not event.isAutoRepeat():
+            self.worker.set_key(key, pressed)
+
+    def stop(self):
+        self.worker.stop_running()
+        self.beeper.stop()
+
+    def closeEvent(self, event: QCloseEvent | None) -> None:
+        self.stop()
+        self.closed.emit(self)
+        event.accept()